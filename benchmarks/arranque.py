@@ -0,0 +1,148 @@
+"""
+Benchmark de arranque: tiempo de importación de main.py y de los módulos de src.
+
+Cada medición se hace en un intérprete nuevo (python -X importtime), así que
+refleja lo que paga una ejecución programada en cada invocación. Además del
+tiempo se comprueba qué dependencias pesadas (matplotlib, seaborn, sklearn...)
+ha cargado cada módulo: solo deberían aparecer en las etapas que las usan.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/arranque.py
+    python benchmarks/arranque.py --repeticiones 10 --salida benchmarks/resultados/arranque.json
+    python benchmarks/arranque.py --referencia benchmarks/resultados/arranque.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+RAIZ = Path(__file__).resolve().parents[1]
+
+MODULOS = [
+    'main',
+    'src.carga_datos',
+    'src.limpieza_datos',
+    'src.exploracion',
+    'src.transformacion_datos',
+    'src.pipeline_incremental',
+    'src.DefiniciónProblemas.DiseñoGráficos',
+]
+
+DEPENDENCIAS_PESADAS = ['pandas', 'matplotlib', 'matplotlib.pyplot', 'matplotlib.widgets',
+                        'seaborn', 'sklearn', 'joblib', 'pyarrow']
+
+# Código que se ejecuta en el subproceso: importa el módulo y lista las pesadas cargadas
+_SONDA = (
+    "import json, sys; import {modulo}; "
+    "print(json.dumps([m for m in {pesadas!r} if m in sys.modules]))"
+)
+
+
+def _tiempo_importtime(salida_error, modulo):
+    """Tiempo acumulado (µs) del módulo según la salida de -X importtime."""
+    for linea in salida_error.splitlines():
+        partes = [p.strip() for p in linea.split('|')]
+        if len(partes) == 3 and partes[2] == modulo:
+            return int(partes[1])
+    return None
+
+
+def medir_modulo(modulo, repeticiones=5):
+    """
+    Importa 'modulo' en 'repeticiones' intérpretes nuevos.
+
+    Devuelve un diccionario con el mínimo y la mediana del tiempo de importación
+    (ms, según -X importtime), el tiempo total del proceso y las dependencias
+    pesadas cargadas.
+    """
+    codigo = _SONDA.format(modulo=modulo, pesadas=DEPENDENCIAS_PESADAS)
+    tiempos_import, tiempos_proceso, cargadas = [], [], []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', codigo],
+            cwd=RAIZ, capture_output=True, text=True,
+            env={**os.environ, 'MPLBACKEND': 'Agg'},
+        )
+        tiempos_proceso.append((time.perf_counter() - inicio) * 1000)
+        if resultado.returncode != 0:
+            raise RuntimeError(f"Fallo al importar {modulo}:\n{resultado.stderr[-2000:]}")
+        microsegundos = _tiempo_importtime(resultado.stderr, modulo)
+        if microsegundos is not None:
+            tiempos_import.append(microsegundos / 1000)
+        cargadas = json.loads(resultado.stdout.strip().splitlines()[-1])
+
+    def resumen(valores):
+        valores = sorted(valores)
+        return {'min': round(valores[0], 1), 'mediana': round(valores[len(valores) // 2], 1)}
+
+    return {
+        'import_ms': resumen(tiempos_import) if tiempos_import else None,
+        'proceso_ms': resumen(tiempos_proceso),
+        'dependencias_pesadas': cargadas,
+    }
+
+
+def ejecutar(modulos=MODULOS, repeticiones=5):
+    resultados = {}
+    for modulo in modulos:
+        print(f"⏱️  {modulo}...")
+        resultados[modulo] = medir_modulo(modulo, repeticiones)
+    return {
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'repeticiones': repeticiones,
+        'modulos': resultados,
+    }
+
+
+def comparar(actual, referencia):
+    """Imprime la variación de la mediana de importación respecto a una ejecución anterior."""
+    print("\n📊 Comparación con la referencia (mediana de importación):")
+    for modulo, datos in actual['modulos'].items():
+        previo = referencia.get('modulos', {}).get(modulo)
+        if not previo or not previo.get('import_ms') or not datos['import_ms']:
+            continue
+        antes, ahora = previo['import_ms']['mediana'], datos['import_ms']['mediana']
+        variacion = (ahora - antes) / antes * 100 if antes else 0.0
+        print(f"  - {modulo}: {antes:.1f} ms → {ahora:.1f} ms ({variacion:+.1f}%)")
+
+
+def imprimir(resultado):
+    print("\n" + "=" * 70)
+    print("⏱️  TIEMPO DE IMPORTACIÓN (mediana, ms)")
+    print("=" * 70)
+    for modulo, datos in resultado['modulos'].items():
+        import_ms = datos['import_ms']['mediana'] if datos['import_ms'] else float('nan')
+        pesadas = ', '.join(datos['dependencias_pesadas']) or '-'
+        print(f"  {modulo:<42} {import_ms:>8.1f}   [{pesadas}]")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark del tiempo de importación")
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--modulos', nargs='+', default=MODULOS)
+    parser.add_argument('--salida', default=None, help="Ruta del JSON de resultados")
+    parser.add_argument('--referencia', default=None, help="JSON de una ejecución anterior para comparar")
+    args = parser.parse_args(argv)
+
+    resultado = ejecutar(args.modulos, args.repeticiones)
+    imprimir(resultado)
+
+    if args.referencia and Path(args.referencia).exists():
+        comparar(resultado, json.loads(Path(args.referencia).read_text(encoding='utf-8')))
+
+    if args.salida:
+        ruta = Path(args.salida)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        ruta.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+        print(f"\n💾 Resultados guardados en '{ruta}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""
+Generador de datasets sintéticos con la forma de data/avocado.csv.
+
+Cada réplica del dataset real es un "mercado" nuevo con las mismas fechas,
+regiones y tipos: los volúmenes de cada serie región × tipo se multiplican por
+un factor log-normal propio de la réplica y por un ruido por fila, y el precio
+recibe un ruido multiplicativo pequeño. Todas las columnas de volumen de una
+fila se escalan por el mismo factor, así que se conservan las identidades
+Total Bags = Small + Large + XLarge y las correlaciones entre columnas.
+
+El CSV se escribe réplica a réplica, de modo que generar la escala 1000×
+(~18 millones de filas) no necesita tenerla entera en memoria.
+"""
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+RUTA_ORIGINAL = Path(__file__).resolve().parents[1] / 'data' / 'avocado.csv'
+DIR_DATOS = Path(__file__).resolve().parent / 'datos'
+
+COLUMNAS_VOLUMEN = ['Total Volume', '4046', '4225', '4770', 'Total Bags',
+                    'Small Bags', 'Large Bags', 'XLarge Bags']
+
+# Dispersión del factor de volumen por réplica-serie, por fila y del precio
+SIGMA_SERIE = 0.3
+SIGMA_FILA = 0.1
+SIGMA_PRECIO = 0.05
+PRECIO_MINIMO = 0.2
+
+REPLICAS_POR_ESCRITURA = 10
+
+
+def _replica(base, codigos_serie, n_series, rng):
+    """Una réplica ruidosa del dataset base (sin la columna de índice)."""
+    n = len(base)
+    factor = (np.exp(rng.normal(0, SIGMA_SERIE, n_series))[codigos_serie]
+              * np.exp(rng.normal(0, SIGMA_FILA, n)))
+    replica = base.copy()
+    replica[COLUMNAS_VOLUMEN] = base[COLUMNAS_VOLUMEN].to_numpy() * factor[:, None]
+    precio = base['AveragePrice'].to_numpy() * np.exp(rng.normal(0, SIGMA_PRECIO, n))
+    replica['AveragePrice'] = np.maximum(precio, PRECIO_MINIMO).round(2)
+    replica[COLUMNAS_VOLUMEN] = replica[COLUMNAS_VOLUMEN].round(2)
+    return replica
+
+
+def generar_dataset(escala, ruta=None, semilla=42, ruta_original=RUTA_ORIGINAL, sobrescribir=False):
+    """
+    Escribe un CSV con 'escala' réplicas del dataset original y devuelve su ruta.
+
+    Parámetros:
+    - escala: Número de réplicas (1 = copia exacta del original)
+    - ruta: CSV de salida (por defecto benchmarks/datos/avocado_x{escala}.csv)
+    - semilla: Semilla del generador; misma semilla, mismo fichero
+    - sobrescribir: Si es False y el fichero ya existe, se reutiliza
+    """
+    ruta = Path(ruta) if ruta else DIR_DATOS / f'avocado_x{escala}.csv'
+    if ruta.exists() and not sobrescribir:
+        return ruta
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    base = pd.read_csv(ruta_original).drop(columns=['Unnamed: 0'], errors='ignore')
+    codigos_serie, series = pd.factorize(pd.MultiIndex.from_frame(base[['region', 'type']]))
+    rng = np.random.default_rng(semilla)
+
+    temporal = ruta.with_suffix('.tmp')
+    with open(temporal, 'w', encoding='utf-8', newline='') as f:
+        indice = 0
+        for inicio in range(0, escala, REPLICAS_POR_ESCRITURA):
+            replicas = [base if r == 0 else _replica(base, codigos_serie, len(series), rng)
+                        for r in range(inicio, min(escala, inicio + REPLICAS_POR_ESCRITURA))]
+            bloque = pd.concat(replicas, ignore_index=True)
+            # Misma columna de índice sin nombre que el CSV original
+            bloque.index = pd.RangeIndex(indice, indice + len(bloque))
+            bloque.to_csv(f, header=(inicio == 0), index=True)
+            indice += len(bloque)
+    temporal.replace(ruta)
+    return ruta
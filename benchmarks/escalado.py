@@ -0,0 +1,294 @@
+"""
+Benchmark de escalado de cada etapa del pipeline sobre datasets sintéticos.
+
+Genera (o reutiliza) datasets con la forma de avocado.csv a varias escalas
+(ver datos_sinteticos.py) y mide, para cada etapa, el tiempo de reloj, el
+tiempo de CPU, el pico de memoria de Python (tracemalloc), el pico de RSS del
+proceso y las filas de entrada y salida. Los resultados se guardan en JSON
+con el commit actual, para compararlos entre versiones.
+
+Uso (desde la raíz del proyecto):
+    python benchmarks/escalado.py                       # escalas 1, 10 y 100
+    python benchmarks/escalado.py --escalas 1000 --etapas cargar_datos pipeline_limpieza
+    python benchmarks/escalado.py --referencia benchmarks/resultados/<commit>.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+RAIZ = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(RAIZ))
+
+from benchmarks.datos_sinteticos import generar_dataset  # noqa: E402
+
+DIR_RESULTADOS = Path(__file__).resolve().parent / 'resultados'
+ESCALAS = [1, 10, 100]
+
+
+# ==============================================================================
+# I. MEDICIÓN
+# ==============================================================================
+def _filas(valor):
+    if hasattr(valor, 'shape'):
+        return int(valor.shape[0])
+    if isinstance(valor, tuple) and valor and hasattr(valor[0], 'shape'):
+        return int(valor[0].shape[0])
+    return None
+
+
+def _rss_pico_mb():
+    try:
+        import resource
+    except ImportError:
+        # Windows no tiene el módulo resource: el pico de RSS queda sin medir
+        return None
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024, 1)
+
+
+def medir(funcion, entrada=None, repeticiones=1, memoria=True):
+    """
+    Ejecuta funcion(entrada) 'repeticiones' veces y devuelve (resultado, métricas).
+
+    El tiempo es el mínimo de las repeticiones; tracemalloc (que ralentiza la
+    ejecución) solo se activa en la última, si memoria=True.
+    """
+    segundos, cpu = [], []
+    pico_memoria = None
+    for repeticion in range(repeticiones):
+        trazar = memoria and repeticion == repeticiones - 1
+        if trazar:
+            tracemalloc.start()
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        # La salida por consola de las funciones del proyecto no forma parte de la medida
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            resultado = funcion(entrada)
+        segundos.append(time.perf_counter() - inicio)
+        cpu.append(time.process_time() - inicio_cpu)
+        if trazar:
+            pico_memoria = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+            tracemalloc.stop()
+
+    metricas = {
+        'segundos': round(min(segundos), 4),
+        'cpu_segundos': round(min(cpu), 4),
+        'pico_memoria_mb': None if pico_memoria is None else round(pico_memoria, 2),
+        'rss_pico_mb': _rss_pico_mb(),
+        'filas_entrada': _filas(entrada),
+        'filas_salida': _filas(resultado),
+    }
+    return resultado, metricas
+
+
+# ==============================================================================
+# II. ETAPAS
+# ==============================================================================
+def _etapas_carga(ruta_csv):
+    from src.carga_datos import cargar_datos
+
+    # La caché se calienta fuera de la medida para cronometrar solo la lectura
+    with contextlib.redirect_stdout(io.StringIO()):
+        cargar_datos(usar_cache=True, ruta=ruta_csv)
+    return {
+        'cargar_datos': lambda _: cargar_datos(usar_cache=False, ruta=ruta_csv),
+        'cargar_datos_cache': lambda _: cargar_datos(usar_cache=True, ruta=ruta_csv),
+    }
+
+
+def _graficar(grafico, agregados):
+    from src.DefiniciónProblemas.DiseñoGráficos import renderizar_grafico
+
+    def ejecutar(df):
+        fig, _, _ = renderizar_grafico(df, grafico, guardar=False, agregados=agregados)
+        fig.canvas.draw()
+        return df
+    return ejecutar
+
+
+def ejecutar_escala(escala, etapas=None, repeticiones=1, memoria=True, modo_grande=False):
+    """Mide las etapas pedidas (None = todas) sobre el dataset de la escala indicada."""
+    from src.limpieza_datos import preparar_datos_inicial, eliminar_outliers, PipelineLimpieza
+    from src.transformacion_datos import transformar_preparar_datos, preparar_para_ml
+    from src.exploracion import deteccion_patrones
+
+    def pedida(nombre):
+        return etapas is None or any(nombre.startswith(e) for e in etapas)
+
+    graficos_pedidos = etapas is None or any(
+        e.startswith('grafico') or 'grafico'.startswith(e) or e == 'agregados_graficos' for e in etapas
+    )
+
+    print(f"\n🧪 Escala ×{escala}: generando datos...")
+    ruta_csv = generar_dataset(escala)
+    resultados = {}
+
+    def registrar(nombre, funcion, entrada=None):
+        print(f"  ⏱️  {nombre}...")
+        resultado, metricas = medir(funcion, entrada, repeticiones, memoria)
+        resultados[nombre] = metricas
+        return resultado
+
+    df = None
+    cargas = _etapas_carga(ruta_csv)
+    for nombre, funcion in cargas.items():
+        if pedida(nombre):
+            df = registrar(nombre, funcion)
+    if df is None:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = cargas['cargar_datos_cache'](None)
+
+    if pedida('preparar_datos_inicial'):
+        registrar('preparar_datos_inicial', preparar_datos_inicial, df)
+    if pedida('eliminar_outliers'):
+        registrar('eliminar_outliers', eliminar_outliers, df)
+
+    limpiar = lambda d: PipelineLimpieza(medir_memoria=False).ejecutar(d)  # noqa: E731
+    if pedida('pipeline_limpieza'):
+        df_limpio = registrar('pipeline_limpieza', limpiar, df)
+    else:
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_limpio = limpiar(df)
+
+    if pedida('backend_pandas') or pedida('backend_arrow'):
+        import pyarrow as pa
+        from src.backend_ejecucion import obtener_backend
+
+        # Carga + limpieza desde el CSV con cada backend; el perezoso solo cuenta los lotes
+        if pedida('backend_pandas'):
+            registrar('backend_pandas', lambda _: obtener_backend('pandas').limpiar(ruta_csv))
+        if pedida('backend_arrow'):
+            filas = registrar('backend_arrow', lambda _: sum(
+                len(lote) for lote in obtener_backend('arrow').limpiar_por_lotes(ruta_csv)))
+            # tracemalloc no ve la memoria de Arrow: se añade el pico de su pool (del proceso)
+            resultados['backend_arrow'].update(
+                filas_salida=filas, pico_arrow_mb=round(pa.default_memory_pool().max_memory() / 1024 ** 2, 2)
+            )
+
+    if pedida('transformar_preparar_datos') or pedida('preparar_para_ml'):
+        with contextlib.redirect_stdout(io.StringIO()):
+            df_transformado = transformar_preparar_datos(df_limpio)[0]
+        if pedida('transformar_preparar_datos'):
+            registrar('transformar_preparar_datos', lambda d: transformar_preparar_datos(d)[0], df_limpio)
+        if pedida('preparar_para_ml'):
+            registrar('preparar_para_ml', preparar_para_ml, df_transformado)
+
+    if pedida('deteccion_patrones'):
+        import matplotlib.pyplot as plt
+
+        def detectar(modo):
+            def ejecutar(d):
+                deteccion_patrones(d, modo=modo)
+                plt.close('all')
+                return d
+            return ejecutar
+        registrar('deteccion_patrones', detectar('medias'), df_limpio)
+        if pedida('deteccion_patrones_semanal'):
+            registrar('deteccion_patrones_semanal', detectar('semanal'), df_limpio)
+
+    if graficos_pedidos:
+        from src.DefiniciónProblemas.DiseñoGráficos import AgregadosGraficos, LISTA_GRAFICOS
+
+        agregados = AgregadosGraficos(df_limpio, modo_grande=modo_grande)
+        if pedida('agregados_graficos'):
+            registrar('agregados_graficos', lambda d: agregados.calcular_todo() and d, df_limpio)
+        else:
+            agregados.calcular_todo()
+        for indice, funcion in enumerate(LISTA_GRAFICOS):
+            if pedida(funcion.__name__):
+                registrar(funcion.__name__, _graficar(indice, agregados), df_limpio)
+
+    return {'filas': int(len(df)), 'ruta': str(ruta_csv.relative_to(RAIZ)), 'etapas': resultados}
+
+
+# ==============================================================================
+# III. RESULTADOS
+# ==============================================================================
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, referencia):
+    """Imprime el cociente de tiempos actual / referencia por escala y etapa."""
+    print(f"\n📊 Comparación con {referencia.get('commit')} (tiempo actual / referencia):")
+    for escala, datos in actual['escalas'].items():
+        previas = referencia.get('escalas', {}).get(escala, {}).get('etapas', {})
+        for nombre, metricas in datos['etapas'].items():
+            previo = previas.get(nombre)
+            if previo and previo['segundos']:
+                cociente = metricas['segundos'] / previo['segundos']
+                aviso = ' ⚠️' if cociente > 1.2 else ''
+                print(f"  - {escala} {nombre}: {previo['segundos']:.3f}s → "
+                      f"{metricas['segundos']:.3f}s (×{cociente:.2f}){aviso}")
+
+
+def imprimir(resultado):
+    print("\n" + "=" * 70)
+    print("⏱️  RESULTADOS DEL BENCHMARK DE ESCALADO")
+    print("=" * 70)
+    for escala, datos in resultado['escalas'].items():
+        print(f"\n{escala} ({datos['filas']} filas)")
+        for nombre, m in datos['etapas'].items():
+            memoria = '' if m['pico_memoria_mb'] is None else f"  {m['pico_memoria_mb']:>9.1f} MB"
+            print(f"  {nombre:<28} {m['segundos']:>9.3f} s{memoria}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de escalado por etapa con datos sintéticos")
+    parser.add_argument('--escalas', nargs='+', type=int, default=ESCALAS,
+                        help="Réplicas del dataset original (p. ej. 1 10 100 1000)")
+    parser.add_argument('--etapas', nargs='+', default=None,
+                        help="Etapas a medir (prefijos admitidos, p. ej. 'grafico'); por defecto todas")
+    parser.add_argument('--repeticiones', type=int, default=1)
+    parser.add_argument('--sin-memoria', action='store_true', help="No activar tracemalloc")
+    parser.add_argument('--modo-grande', action='store_true', help="Gráficos con datos reducidos")
+    parser.add_argument('--salida', default=None,
+                        help="JSON de resultados (por defecto benchmarks/resultados/<commit>.json)")
+    parser.add_argument('--referencia', default=None, help="JSON de otra ejecución para comparar")
+    args = parser.parse_args(argv)
+
+    commit = commit_actual()
+    resultado = {
+        'commit': commit,
+        'fecha': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'cpus': os.cpu_count(),
+        'repeticiones': args.repeticiones,
+        'escalas': {},
+    }
+    for escala in args.escalas:
+        resultado['escalas'][f'x{escala}'] = ejecutar_escala(
+            escala, args.etapas, args.repeticiones, not args.sin_memoria, args.modo_grande
+        )
+
+    imprimir(resultado)
+    if args.referencia and Path(args.referencia).exists():
+        comparar(resultado, json.loads(Path(args.referencia).read_text(encoding='utf-8')))
+
+    ruta = Path(args.salida) if args.salida else DIR_RESULTADOS / f'{commit or "sin_commit"}.json'
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_text(json.dumps(resultado, indent=2, ensure_ascii=False), encoding='utf-8')
+    print(f"\n💾 Resultados guardados en '{ruta}'")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
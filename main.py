@@ -1,83 +1,336 @@
-from src.carga_datos import cargar_datos
-from src.exploracion import explorar_datos
-from src.limpieza_datos import preparar_datos_inicial, detectar_outliers, eliminar_outliers, tratar_valores_nulos
-from src.DefiniciónProblemas.DiseñoGráficos import iniciar_navegador
-from src.transformacion_datos import transformar_preparar_datos, preparar_para_ml
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
 
+from src.instrumentacion import (
+    configurar_instrumentacion, etapa, SinkMemoria, SinkJsonLineas, SinkPrometheus
+)
 
-def main():
-    print("\n" + "="*70)
-    print("🥑 ANÁLISIS DE DATOS - AGUACATES")
-    print("="*70)
-    
+# Las importaciones de cada etapa se hacen dentro de su función: una etapa que
+# no se ejecuta no carga pandas, matplotlib, seaborn ni sklearn.
+
+ETAPAS = ['load', 'explore', 'clean', 'charts', 'transform']
+
+
+def crear_parser():
+    parser = argparse.ArgumentParser(
+        description="🥑 Análisis de datos de aguacates: carga, exploración, limpieza, gráficos y transformación."
+    )
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS,
+                        help="Etapas a ejecutar (por defecto todas)")
+    parser.add_argument('--headless', action='store_true',
+                        help="Sin ventanas: backend Agg, sin gráficos de outliers y gráficos guardados en paralelo")
+    parser.add_argument('--entrada', default=None,
+                        help="CSV de entrada (por defecto data/avocado.csv)")
+    parser.add_argument('--salida', default='data/avocado_limpio',
+                        help="Salida limpia: directorio del dataset Parquet particionado o fichero .csv")
+    parser.add_argument('--particionar-region', action='store_true',
+                        help="Añade la región como nivel de partición (year/type/region)")
+    parser.add_argument('--graficos-dir', default=None,
+                        help="Carpeta de gráficos en modo headless (por defecto graficos/)")
+    parser.add_argument('--pipeline', default='data/pipeline_transformacion.joblib',
+                        help="Ruta donde guardar el pipeline de transformación ajustado")
+    parser.add_argument('--backend', choices=['pandas', 'arrow'], default='pandas',
+                        help="Backend de carga y limpieza: pandas (en memoria) o arrow (perezoso, por lotes)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Carga y limpia solo las semanas nuevas (pipeline_incremental)")
+    parser.add_argument('--modo-grande', action='store_true',
+                        help="Gráficos con datos reducidos (KDE binned, LTTB, muestras)")
+    parser.add_argument('--informe-exploracion', default=None,
+                        help="Guarda el perfil de la etapa explore en esta ruta (.json o .html)")
+    parser.add_argument('--json', dest='ruta_json', default=None,
+                        help="Escribe en esta ruta un resumen JSON con formas y tiempos ('-' = stdout; el progreso pasa a stderr)")
+    parser.add_argument('--metricas-jsonl', default=None,
+                        help="Añade a este fichero una línea JSON por etapa y función instrumentada")
+    parser.add_argument('--metricas-prometheus', default=None,
+                        help="Fichero de métricas en formato Prometheus (textfile collector)")
+    parser.add_argument('--perfiles', default=None,
+                        help="Carpeta donde guardar un perfil cProfile (.prof) por etapa")
+    return parser
+
+
+class RegistroEtapas:
+    """Acumula tiempos y formas de cada etapa para el resumen JSON."""
+
+    def __init__(self):
+        self.etapas = {}
+
+    def medir(self, nombre, funcion, *args, **kwargs):
+        inicio = time.perf_counter()
+        entrada = args[0] if args and hasattr(args[0], 'shape') else None
+        with etapa(nombre, None if entrada is None else entrada.shape[0]) as metrica:
+            resultado = funcion(*args, **kwargs)
+            if hasattr(resultado, 'shape'):
+                metrica['filas_salida'] = resultado.shape[0]
+        self.etapas[nombre] = {'segundos': round(time.perf_counter() - inicio, 4)}
+        return resultado
+
+    def forma(self, nombre, **formas):
+        self.etapas.setdefault(nombre, {}).update(
+            {clave: list(valor) for clave, valor in formas.items() if valor is not None}
+        )
+
+
+# ==============================================================================
+# ETAPAS
+# ==============================================================================
+def etapa_cargar(args):
+    from src.carga_datos import cargar_datos
 
     print("\n📂 Paso 1: Cargando datos...")
-    df = cargar_datos()
+    df = cargar_datos(ruta=args.entrada)
+    if df is not None and not df.empty:
+        print(f"✓ Datos cargados: {df.shape[0]} filas × {df.shape[1]} columnas")
+    return df
+
 
-    if df is None or df.empty:
-        print("❌ ERROR: No se pudo cargar el DataFrame. Terminando proceso.")
-        return
-    
-    print(f"✓ Datos cargados: {df.shape[0]} filas × {df.shape[1]} columnas")
+def etapa_explorar(df, args):
+    from src.exploracion import explorar_datos
 
-    
     print("\n🔍 Paso 2: Exploración inicial de datos...")
-    explorar_datos(df)
+    explorar_datos(df, ruta_informe=args.informe_exploracion, modo_grande=args.modo_grande)
+
+
+def etapa_limpiar(df, args):
+    from src.carga_datos import escribir_cache_limpio
+    from src.dataset_particionado import guardar_dataset_limpio
+    from src.limpieza_datos import detectar_outliers, PipelineLimpieza
 
-    
     print("\n🧹 Paso 3: Limpieza de datos...")
-    
-   
-    df = preparar_datos_inicial(df)
-    
-    print("\n Detectando y tratando Outliers...")
-    detectar_outliers(df)
-
-    df = eliminar_outliers(df, columnas=['AveragePrice', 'Total Volume'])
-
-    print("\n Tratando valores nulos...")
-    df = tratar_valores_nulos(df)  
-    
+
+    # El DataFrame cargado solo lo usa main, así que se limpia en el sitio
+    limpieza = PipelineLimpieza(columnas_outliers=['AveragePrice', 'Total Volume'], inplace=True)
+    df = limpieza.preparar(df)
+
+    if args.headless:
+        print("\n Modo headless: se omiten los gráficos interactivos de outliers")
+    else:
+        print("\n Detectando y tratando Outliers...")
+        detectar_outliers(df)
+
+    print("\n Eliminando outliers y valores nulos...")
+    df = limpieza.filtrar(df)
+    limpieza.imprimir_informe()
+
     print(f"\n✅ Limpieza completada: {df.shape[0]} filas × {df.shape[1]} columnas")
-    
-    # Guardar datos limpios
-    df.to_csv('data/avocado_limpio.csv', index=False)
-    print("💾 Archivo 'data/avocado_limpio.csv' guardado correctamente")
+
+    # Guardar datos limpios (particionados por año y tipo salvo que la salida sea .csv)
+    ruta = guardar_dataset_limpio(df, args.salida, por_region=args.particionar_region)
+    print(f"💾 Archivo '{ruta}' guardado correctamente")
+    if escribir_cache_limpio(df, ruta):
+        print("💾 Caché columnar del dataset limpio actualizada")
+    return df
+
+
+def etapa_limpiar_perezoso(args):
+    from src.backend_ejecucion import obtener_backend
+    from src.dataset_particionado import guardar_dataset_limpio
+
+    print("\n🧹 Pasos 1-3: Carga y limpieza perezosa (backend arrow, por lotes)...")
+    backend = obtener_backend('arrow')
+    lotes = backend.limpiar_por_lotes(args.entrada)
+    # Los lotes se escriben según llegan: el dataset nunca está completo en memoria
+    ruta = guardar_dataset_limpio(lotes, args.salida, por_region=args.particionar_region)
+    for col, (inferior, superior) in backend.limites.items():
+        print(f"  - {col}: límites IQR [{inferior:.2f}, {superior:.2f}]")
+    print(f"💾 Archivo '{ruta}' guardado correctamente")
+
+
+def etapa_incremental(args):
+    from src.pipeline_incremental import ejecutar_incremental, correlacion_estado
+
+    print("\n📂🧹 Pasos 1-3: Carga y limpieza incremental...")
+    df, estado = ejecutar_incremental(args.entrada, ruta_limpio=args.salida)
+    # Los heatmaps usan la correlación acumulada en el estado en lugar de recorrer el histórico
+    correlacion = correlacion_estado(estado) if estado and 'correlacion' in estado else None
+    return df, correlacion
+
+
+def etapa_cargar_limpios(args):
+    from src.carga_datos import cargar_datos_limpios
+
+    print(f"\n📂 Cargando dataset limpio ('{args.salida}')...")
+    df = cargar_datos_limpios(args.salida)
+    print(f"✓ Datos limpios cargados: {df.shape[0]} filas × {df.shape[1]} columnas")
+    return df
 
 
+def etapa_graficos(df, args, correlacion=None):
+    from src.DefiniciónProblemas.DiseñoGráficos import iniciar_navegador, renderizar_graficos_paralelo
+
+    if args.headless:
+        print("\n📊 Paso 4: Guardando gráficos (headless)...")
+        return renderizar_graficos_paralelo(df, args.graficos_dir, modo_grande=args.modo_grande,
+                                            correlacion=correlacion)
+
     print("\n📊 Paso 4: Lanzando Visor de Gráficos Interactivo...")
-    
+
     try:
-        iniciar_navegador(df)
+        iniciar_navegador(df, modo_grande=args.modo_grande, correlacion=correlacion)
         print("\n✅ Visor cerrado.")
     except Exception as e:
         print(f"❌ Error al lanzar el visor: {e}")
 
+
+def etapa_transformar(df, args):
+    from src.transformacion_datos import (transformar_preparar_datos, preparar_para_ml, indices_division,
+                                          PipelineTransformacion)
+
     print("\n🔧 Paso 5: Transformación de datos para Machine Learning...")
-    
-    try:
-        df_transformed, scaler_std, scaler_minmax, le_type = transformar_preparar_datos(df)
-        
-        X_train, X_test, y_train, y_test = preparar_para_ml(df_transformed)
-        
-        print("\n🎯 Dataset listo para Machine Learning:")
-        print(f"  - X_train: {X_train.shape}")
-        print(f"  - X_test: {X_test.shape}")
-        print(f"  - y_train: {y_train.shape}")
-        print(f"  - y_test: {y_test.shape}")
-        
-    except Exception as e:
-        print(f"⚠️  Error en transformación: {e}")
+
+    pipeline = None
+    if args.incremental:
+        # Pipeline del estado incremental (escaladores actualizados con partial_fit): solo se transforma
+        from src.pipeline_incremental import cargar_estado
+        _, pipeline = cargar_estado(args.entrada)
+        if pipeline is not None:
+            print("✓ Pipeline del estado incremental reutilizado (sin reajustar)")
+    if pipeline is None:
+        # La estacionalidad del volumen se ajusta solo con las filas de entrenamiento
+        idx_train, _ = indices_division(df)
+        pipeline = PipelineTransformacion().fit(df, idx_train=idx_train)
+    # El pipeline ajustado se guarda para transformar lotes nuevos sin reajustar
+    pipeline.guardar(args.pipeline)
+    df_transformed, scaler_std, scaler_minmax, le_type = transformar_preparar_datos(df, pipeline=pipeline)
+
+    X_train, X_test, y_train, y_test = preparar_para_ml(df_transformed)
+
+    print("\n🎯 Dataset listo para Machine Learning:")
+    print(f"  - X_train: {X_train.shape}")
+    print(f"  - X_test: {X_test.shape}")
+    print(f"  - y_train: {y_train.shape}")
+    print(f"  - y_test: {y_test.shape}")
+    return X_train, X_test, y_train, y_test
+
+
+# ==============================================================================
+# PROGRAMA PRINCIPAL
+# ==============================================================================
+def configurar_metricas(args):
+    """Activa la instrumentación por etapa si se pidió algún destino de métricas."""
+    sinks = []
+    if args.metricas_jsonl:
+        sinks.append(SinkJsonLineas(args.metricas_jsonl))
+    if args.metricas_prometheus:
+        sinks.append(SinkPrometheus(args.metricas_prometheus))
+    if not sinks and not args.perfiles:
+        return None
+    memoria = SinkMemoria()
+    configurar_instrumentacion(sinks + [memoria], dir_perfiles=args.perfiles)
+    return memoria
+
+
+def main(argv=None):
+    args = crear_parser().parse_args(argv)
+    registro = RegistroEtapas()
+    metricas = configurar_metricas(args)
+
+    if args.headless:
+        # Debe fijarse antes de que cualquier etapa importe matplotlib
+        os.environ['MPLBACKEND'] = 'Agg'
+
+    if args.ruta_json == '-':
+        # stdout queda reservado para el resumen JSON: el progreso va a stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            codigo = ejecutar_etapas(args, registro)
+    else:
+        codigo = ejecutar_etapas(args, registro)
+    if codigo:
+        return codigo
+
+    if args.ruta_json:
+        contenido = {'etapas': registro.etapas}
+        if metricas is not None:
+            contenido['instrumentacion'] = metricas.registros
+        resumen = json.dumps(contenido, indent=2, ensure_ascii=False)
+        if args.ruta_json == '-':
+            print(resumen)
+        else:
+            with open(args.ruta_json, 'w', encoding='utf-8') as f:
+                f.write(resumen)
+    return 0
+
+
+def ejecutar_etapas(args, registro):
+    """Ejecuta las etapas pedidas registrando tiempos y formas; devuelve el código de salida."""
+    etapas = set(args.etapas)
+
+    print("\n" + "="*70)
+    print("🥑 ANÁLISIS DE DATOS - AGUACATES")
+    print("="*70)
+
+    df = None
+    correlacion = None
+    limpio = False
+    sin_datos_nuevos = False
+    if args.incremental and etapas & {'load', 'clean'}:
+        nuevas, correlacion = registro.medir('incremental', etapa_incremental, args)
+        registro.forma('incremental', filas_columnas=nuevas.shape)
+        if nuevas.empty:
+            print("✓ Sin datos nuevos: se omiten el resto de etapas")
+            sin_datos_nuevos = True
+        elif 'explore' in etapas:
+            # Sin releer el histórico solo se exploran las semanas recién limpiadas
+            print(f"\n🔍 Modo incremental: la exploración cubre solo las {len(nuevas)} filas nuevas (ya limpias)")
+            registro.medir('explore', etapa_explorar, nuevas, args)
+        # 'nuevas' solo contiene las semanas nuevas: charts y transform leen
+        # después el dataset limpio completo (histórico + filas recién anexadas)
+    elif args.backend == 'arrow' and 'clean' in etapas:
+        # La limpieza perezosa lee el CSV por lotes; solo explore necesita cargarlo entero
+        if 'explore' in etapas:
+            df = registro.medir('load', etapa_cargar, args)
+            if df is not None and not df.empty:
+                registro.medir('explore', etapa_explorar, df, args)
+            df = None
+        registro.medir('clean', etapa_limpiar_perezoso, args)
+    elif etapas & {'load', 'explore', 'clean'}:
+        df = registro.medir('load', etapa_cargar, args)
+        if df is None or df.empty:
+            print("❌ ERROR: No se pudo cargar el DataFrame. Terminando proceso.")
+            return 1
+        registro.forma('load', filas_columnas=df.shape)
+
+    if df is not None and 'explore' in etapas:
+        registro.medir('explore', etapa_explorar, df, args)
+
+    if df is not None and 'clean' in etapas and not limpio:
+        df = registro.medir('clean', etapa_limpiar, df, args)
+        registro.forma('clean', filas_columnas=df.shape)
+        limpio = True
+
+    if etapas & {'charts', 'transform'} and not limpio and not sin_datos_nuevos:
+        # Sin etapa de limpieza se parte del dataset limpio ya exportado
+        df = registro.medir('load_limpios', etapa_cargar_limpios, args)
+        registro.forma('load_limpios', filas_columnas=df.shape)
+
+    if df is not None and 'charts' in etapas:
+        tiempos = registro.medir('charts', etapa_graficos, df, args, correlacion)
+        if tiempos:
+            registro.etapas['charts']['graficos'] = tiempos
+
+    if df is not None and 'transform' in etapas:
+        try:
+            X_train, X_test, y_train, y_test = registro.medir('transform', etapa_transformar, df, args)
+            registro.forma('transform', X_train=X_train.shape, X_test=X_test.shape,
+                           y_train=y_train.shape, y_test=y_test.shape)
+        except Exception as e:
+            print(f"⚠️  Error en transformación: {e}")
+            registro.etapas['transform'] = {'error': str(e)}
 
     print("\n" + "="*70)
     print("✅ PROCESO COMPLETADO EXITOSAMENTE")
     print("="*70)
-    print(f"📊 Variables originales: {df.shape[1] - 2} columnas")
-    print(f"📊 Variables creadas: total_bags, total_volume")
-    print(f"📁 Archivo generado: data/avocado_limpio.csv")
+    if (limpio or args.incremental) and df is not None:
+        print(f"📊 Variables originales: {df.shape[1] - 2} columnas")
+        print(f"📊 Variables creadas: total_bags, total_volume")
+        print(f"📁 Archivo generado: {args.salida}")
     print("\n🚀 ¡Dataset listo para análisis y modelado!")
     print("="*70 + "\n")
+    return 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
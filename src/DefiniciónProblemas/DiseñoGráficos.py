@@ -1,27 +1,72 @@
+import hashlib
+import inspect
+import json
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
 import seaborn as sns
+from functools import cached_property, lru_cache
 from pathlib import Path
-from matplotlib.widgets import Button
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from src.cache_datos import huella_dataframe
+from src.consultas_datos import indice_consultas
+from src.correlaciones import correlaciones, sin_derivadas
+from src.estacionalidad import descomposicion_estacional
+from src.reduccion_datos import (
+    histograma_binned, kde_binned, lttb, muestra_estratificada, PUNTOS_SERIE, FILAS_POR_ESTRATO
+)
+from src.instrumentacion import (
+    instrumentar, configurar_instrumentacion, desactivar_instrumentacion, instrumentacion_activa, SinkMemoria
+)
 
 # ==============================================================================
 # I. CLASE NAVEGADOR (VISOR INTERACTIVO)
 # ==============================================================================
 class GraficosNavegador:
-    def __init__(self, df, lista_funciones, guardar_automatico=True):
+    """
+    Visor interactivo con caché LRU de gráficos ya renderizados.
+
+    Cada gráfico se dibuja una vez sobre una figura Agg y se guarda su imagen
+    (buffer RGBA) bajo la clave (gráfico, huella de los datos); al volver a
+    él solo se muestra la imagen. Los gráficos anterior y siguiente se
+    pre-renderizan en segundo plano, pero su PNG solo se escribe cuando el
+    gráfico se muestra de verdad, y nunca si ya existe para los mismos datos,
+    código y tamaño (ver huella_grafico). Con tamano_cache=0 se dibuja
+    directamente en la figura como antes.
+    """
+
+    def __init__(self, df, lista_funciones, guardar_automatico=True, tamano_cache=8, prerenderizar=True,
+                 modo_grande=False, correlacion=None):
         self.df = df
         self.funciones = lista_funciones
         self.indice = 0
         self.total = len(lista_funciones)
         self.fig = plt.figure(figsize=(14, 8))
         self.guardar_automatico = guardar_automatico
+        self.agregados = AgregadosGraficos(df, modo_grande=modo_grande, correlacion=correlacion)
+
+        self.tamano_cache = tamano_cache
+        self.huella = huella_dataframe(df) if tamano_cache else None
+        self._cache = OrderedDict()
+        self._pendientes = {}
+        self._cerrojo = threading.Lock()
+        self._hilo = ThreadPoolExecutor(max_workers=1) if (tamano_cache and prerenderizar) else None
         
         # Crear carpeta de gráficos si se va a guardar
         if self.guardar_automatico:
             self.graficos_dir = crear_carpeta_graficos()
         else:
             self.graficos_dir = None
+        self._huellas_guardadas = leer_huellas_guardadas(self.graficos_dir) if self.graficos_dir else {}
         
         # Iniciar visualización
         self.actualizar_grafico()
@@ -34,18 +79,119 @@ class GraficosNavegador:
         self.indice = (self.indice + 1) % self.total
         self.actualizar_grafico()
 
+    # ------------------------------------------------------------------
+    # Caché de imágenes renderizadas
+    # ------------------------------------------------------------------
+    def _renderizar(self, indice, guardar=True):
+        """
+        Dibuja el gráfico en una figura Agg propia. Devuelve (imagen RGBA, figura):
+        la figura solo se devuelve si su PNG está pendiente de guardar (guardar=False).
+        """
+        funcion = self.funciones[indice]
+        ancho, alto = self.fig.get_size_inches()
+        figsize, dpi = (ancho, alto * 0.88), self.fig.dpi
+        fig, _, _ = renderizar_grafico(self.df, funcion, guardar=False, figsize=figsize,
+                                       agregados=self.agregados, dpi=dpi)
+        fig.canvas.draw()
+        imagen = np.asarray(fig.canvas.buffer_rgba()).copy()
+
+        huella = huella_grafico(funcion, self.huella, self.agregados.modo_grande, figsize, dpi)
+        # Sin etiqueta el gráfico no dibujó nada guardable (p. ej. faltan columnas)
+        if not fig.get_label() or not self._png_pendiente(funcion.__name__, huella):
+            return imagen, None
+        if not guardar:
+            return imagen, (fig, huella)
+        self._guardar_png(funcion.__name__, fig, huella)
+        return imagen, None
+
+    def _png_pendiente(self, nombre, huella):
+        if not (self.guardar_automatico and self.graficos_dir):
+            return False
+        with self._cerrojo:
+            guardado = self._huellas_guardadas.get(nombre, {})
+        if huella is None or guardado.get('huella') != huella:
+            return True
+        archivo = guardado.get('archivo')
+        return not (archivo and (self.graficos_dir / archivo).exists())
+
+    def _guardar_png(self, nombre, fig, huella):
+        # _guardar anota en la etiqueta de la figura el nombre de su PNG
+        ruta = _guardar_figura(fig, self.graficos_dir, fig.get_label())
+        if huella is not None:
+            with self._cerrojo:
+                self._huellas_guardadas[nombre] = {'huella': huella, 'archivo': ruta.name}
+                escribir_huellas_guardadas(self.graficos_dir, self._huellas_guardadas)
+
+    def _obtener_imagen(self, indice):
+        clave = (indice, self.huella)
+        with self._cerrojo:
+            entrada = self._cache.get(clave)
+            if entrada is not None:
+                self._cache.move_to_end(clave)
+            pendiente = self._pendientes.get(clave)
+
+        if entrada is None:
+            entrada = pendiente.result() if pendiente is not None else self._renderizar(indice)
+        imagen, sin_guardar = entrada
+        if sin_guardar is not None:
+            # Pre-renderizado en segundo plano: se guarda ahora que se muestra
+            self._guardar_png(self.funciones[indice].__name__, *sin_guardar)
+        self._almacenar(clave, (imagen, None))
+        return imagen
+
+    def _almacenar(self, clave, entrada):
+        with self._cerrojo:
+            self._cache[clave] = entrada
+            self._cache.move_to_end(clave)
+            self._pendientes.pop(clave, None)
+            while len(self._cache) > self.tamano_cache:
+                self._cache.popitem(last=False)
+
+    def _prerenderizar_vecinos(self):
+        if self._hilo is None:
+            return
+        for indice in ((self.indice + 1) % self.total, (self.indice - 1) % self.total):
+            clave = (indice, self.huella)
+            with self._cerrojo:
+                if clave in self._cache or clave in self._pendientes:
+                    continue
+                futuro = self._hilo.submit(self._renderizar, indice, False)
+                self._pendientes[clave] = futuro
+            futuro.add_done_callback(lambda f, clave=clave: self._al_terminar(clave, f))
+
+    def _al_terminar(self, clave, futuro):
+        if futuro.exception() is None:
+            with self._cerrojo:
+                # Si ya se mostró (y guardó) mientras tanto, no se pisa la entrada
+                mostrado = clave in self._cache
+            if not mostrado:
+                self._almacenar(clave, futuro.result())
+        else:
+            # Se descarta para que el gráfico se vuelva a intentar al mostrarlo
+            with self._cerrojo:
+                self._pendientes.pop(clave, None)
+
+    # ------------------------------------------------------------------
+    # Visualización
+    # ------------------------------------------------------------------
     def actualizar_grafico(self):
         # 1. Limpiar la figura completa para borrar el gráfico anterior
         self.fig.clear()
         
-        # 2. Ejecutar la función de gráfico actual
+        # 2. Mostrar el gráfico actual (desde la caché o ejecutando su función)
         try:
-            # Ahora pasamos guardar=True y graficos_dir para que se guarde
-            self.funciones[self.indice](
-                self.df, 
-                graficos_dir=self.graficos_dir, 
-                guardar=self.guardar_automatico
-            )
+            if self.tamano_cache:
+                ax = self.fig.add_axes([0, 0.12, 1, 0.88])
+                ax.imshow(self._obtener_imagen(self.indice))
+                ax.set_axis_off()
+            else:
+                # Ahora pasamos guardar=True y graficos_dir para que se guarde
+                self.funciones[self.indice](
+                    self.df, 
+                    graficos_dir=self.graficos_dir, 
+                    guardar=self.guardar_automatico,
+                    agregados=self.agregados
+                )
         except Exception as e:
             plt.text(0.5, 0.5, f"Error mostrando gráfico: {e}", ha='center')
 
@@ -60,7 +206,8 @@ class GraficosNavegador:
         plt.figtext(0.5, 0.05, status_text, 
                     ha='center', fontsize=12, fontweight='bold')
 
-        # 5. Re-crear los botones
+        # 5. Re-crear los botones (los widgets solo hacen falta en el visor interactivo)
+        from matplotlib.widgets import Button
         ax_prev = plt.axes([0.3, 0.02, 0.15, 0.05])
         ax_next = plt.axes([0.55, 0.02, 0.15, 0.05])
         
@@ -74,6 +221,9 @@ class GraficosNavegador:
         # Refrescar
         plt.draw()
 
+        # 6. Adelantar el renderizado de los gráficos vecinos
+        self._prerenderizar_vecinos()
+
 # ==============================================================================
 # II. FUNCIONES DE UTILIDAD
 # ==============================================================================
@@ -83,173 +233,510 @@ def crear_carpeta_graficos():
     graficos_dir.mkdir(exist_ok=True)
     return graficos_dir
 
+ARCHIVO_HUELLAS = '.huellas.json'
+
+def leer_huellas_guardadas(graficos_dir):
+    """Devuelve {función: {'huella', 'archivo'}} de los PNG ya guardados en graficos_dir."""
+    try:
+        return json.loads((Path(graficos_dir) / ARCHIVO_HUELLAS).read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return {}
+
+# Módulos de los que depende lo que dibujan los gráficos, además del suyo propio
+MODULOS_GRAFICOS = ('src.consultas_datos', 'src.correlaciones', 'src.estacionalidad', 'src.reduccion_datos')
+
+@lru_cache(maxsize=None)
+def _version_modulo(nombre):
+    """Código fuente de un módulo ya importado (o su nombre si no está disponible)."""
+    try:
+        return inspect.getsource(sys.modules[nombre])
+    except (KeyError, OSError, TypeError):
+        return nombre
+
+def huella_grafico(funcion, huella_datos, modo_grande=False, figsize=None, dpi=None):
+    """
+    Huella de un PNG guardado: datos, modo_grande (cambia lo que dibujan los
+    gráficos 1, 4, 5 y 12), tamaño y resolución de la figura y versión del
+    código. La versión es el código fuente del módulo del gráfico (funciones
+    auxiliares y AgregadosGraficos incluidos) y de MODULOS_GRAFICOS, así que
+    cualquier cambio en ellos invalida los PNG. None si no hay huella de los datos.
+    """
+    if huella_datos is None:
+        return None
+    original = inspect.unwrap(funcion)
+    sha = hashlib.sha256()
+    partes = [huella_datos, str(bool(modo_grande)), repr(figsize), repr(dpi), original.__qualname__]
+    partes += [_version_modulo(m) for m in (original.__module__,) + MODULOS_GRAFICOS]
+    for parte in partes:
+        sha.update(parte.encode('utf-8'))
+    return sha.hexdigest()
+
+def escribir_huellas_guardadas(graficos_dir, huellas):
+    (Path(graficos_dir) / ARCHIVO_HUELLAS).write_text(json.dumps(huellas, indent=2), encoding='utf-8')
+
 # ==============================================================================
-# III. GRÁFICOS DEL 1 AL 13
+# II.b AGREGADOS COMPARTIDOS POR LOS GRÁFICOS
 # ==============================================================================
+class AgregadosGraficos:
+    """
+    Agregaciones que necesitan los gráficos, calculadas una sola vez por DataFrame.
 
-def grafico_1(df, graficos_dir=None, guardar=False):
-    sns.histplot(df['AveragePrice'], kde=True, bins=30, color='skyblue')
-    plt.title('1. Distribución del Precio Promedio (AveragePrice)', fontsize=14, fontweight='bold')
-    plt.xlabel('Precio Promedio ($)')
-    plt.ylabel('Frecuencia')
-    plt.grid(True, alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '01_histograma_precio.png', dpi=300, bbox_inches='tight')
+    Cada agregado se calcula la primera vez que se pide y queda en caché, de
+    modo que el navegador y el renderizado por lotes no repiten groupby ni
+    matrices de correlación al volver a un gráfico.
 
-def grafico_2(df, graficos_dir=None, guardar=False):
-    sns.boxplot(y=df['Total Volume'], color='salmon')
-    plt.title('2. Boxplot de Volumen Total (Detección de Outliers)', fontsize=14, fontweight='bold')
-    plt.ylabel('Volumen Total')
-    plt.grid(True, alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '02_boxplot_volumen.png', dpi=300, bbox_inches='tight')
-
-def grafico_3(df, graficos_dir=None, guardar=False):
-    sns.boxplot(x='type', y='AveragePrice', data=df, palette={'conventional': 'orange', 'organic': 'green'})
-    plt.title('3. AveragePrice por Tipo de Aguacate', fontsize=14, fontweight='bold')
-    plt.xlabel('Tipo')
-    plt.ylabel('Precio Promedio')
-    plt.grid(axis='y', alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '03_boxplot_precio_por_tipo.png', dpi=300, bbox_inches='tight')
-
-def grafico_4(df, graficos_dir=None, guardar=False):
-    df_time = df.groupby('Date')['AveragePrice'].mean().reset_index()
-    sns.lineplot(x='Date', y='AveragePrice', data=df_time, color='purple', linewidth=2)
-    plt.title('4. Tendencia del Precio Promedio a lo largo del Tiempo', fontsize=14, fontweight='bold')
-    plt.xticks(rotation=45)
-    plt.grid(True, alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '04_linea_precio_temporal.png', dpi=300, bbox_inches='tight')
-
-def grafico_5(df, graficos_dir=None, guardar=False):
-    df_vol_tipo = df.groupby(['Date', 'type'])['Total Volume'].sum().reset_index()
-    for tipo in df_vol_tipo['type'].unique():
-        subset = df_vol_tipo[df_vol_tipo['type'] == tipo]
-        plt.plot(subset['Date'], subset['Total Volume'], label=tipo, linewidth=2)
-    plt.title('5. Evolución del Volumen Total por Tipo', fontsize=14, fontweight='bold')
-    plt.legend()
-    plt.xticks(rotation=45)
-    plt.grid(True, alpha=0.3)
+    Con modo_grande=True los gráficos 1, 4, 5 y 12 usan datos reducidos
+    (histograma y KDE sobre bins, series LTTB y muestra estratificada) y
+    anotan en la figura el error máximo de cada reducción.
+
+    'correlacion' es una matriz de correlación ya calculada (p. ej.
+    correlacion_estado() del modo incremental); los heatmaps la usan en lugar
+    de recorrer el DataFrame.
+    """
+
+    def __init__(self, df, modo_grande=False, correlacion=None):
+        self.df = df
+        self.modo_grande = modo_grande
+        if correlacion is not None:
+            self.__dict__['correlacion_numerica'] = correlacion
+
+    @cached_property
+    def precio_por_fecha(self):
+        return self.df.groupby('Date')['AveragePrice'].mean().reset_index()
+
+    @cached_property
+    def volumen_por_fecha_tipo(self):
+        """Volumen total por (type, Date), con el índice ordenado del rollup semanal."""
+        return indice_consultas(self.df).rollup(('type',))['Total Volume']
+
+    @cached_property
+    def sumas_columnas(self):
+        columnas = [c for c in ['Small Bags', 'Large Bags', 'XLarge Bags', '4046', '4225', '4770']
+                    if c in self.df.columns]
+        return self.df[columnas].sum()
+
+    @cached_property
+    def precio_medio_region(self):
+        return self.df.groupby('region', observed=True)['AveragePrice'].mean().sort_values(ascending=False)
+
+    @cached_property
+    def conteo_region(self):
+        return self.df['region'].value_counts()
+
+    @cached_property
+    def iqr_region(self):
+        cuartiles = self.df.groupby('region', observed=True)['AveragePrice'].quantile([0.25, 0.75]).unstack()
+        iqr = (cuartiles[0.75] - cuartiles[0.25]).rename('IQR')
+        iqr.index = iqr.index.astype(str)
+        return iqr.reset_index().sort_values(by='IQR', ascending=False)
+
+    @cached_property
+    def correlacion_numerica(self):
+        """Matriz de correlación de todas las columnas numéricas (los heatmaps usan subconjuntos)."""
+        return correlaciones(self.df).matriz()
+
+    @cached_property
+    def descomposicion(self):
+        """Tendencia y estacionalidad de todas las series región × tipo (gráficos 4 y 14)."""
+        return descomposicion_estacional(self.df)
+
+    @cached_property
+    def tendencia_precio(self):
+        """Tendencia media del precio por fecha (media de las tendencias de cada serie)."""
+        return self.descomposicion.media('tendencia', 'AveragePrice')
+
+    @cached_property
+    def histograma_precio(self):
+        """Histograma (30 bins) y KDE binned de AveragePrice para el modo grande."""
+        conteos, bordes = histograma_binned(self.df['AveragePrice'], bins=30)
+        rejilla, densidad, error = kde_binned(self.df['AveragePrice'])
+        return conteos, bordes, rejilla, densidad, error
+
+    @cached_property
+    def muestra_anio_tipo(self):
+        """Muestra estratificada por año y tipo para los violines del modo grande."""
+        return muestra_estratificada(self.df[['year', 'type', 'AveragePrice']], ['year', 'type'])
+
+    def correlacion(self, columnas):
+        columnas = [col for col in columnas if col in self.correlacion_numerica.columns]
+        return self.correlacion_numerica.loc[columnas, columnas]
+
+    def calcular_todo(self):
+        """Fuerza el cálculo de todos los agregados (p. ej. antes de repartirlos a procesos)."""
+        for nombre in ['precio_por_fecha', 'volumen_por_fecha_tipo', 'sumas_columnas',
+                       'precio_medio_region', 'conteo_region', 'iqr_region', 'correlacion_numerica',
+                       'descomposicion', 'tendencia_precio']:
+            getattr(self, nombre)
+        if self.modo_grande:
+            self.histograma_precio
+            self.muestra_anio_tipo
+        return self
+
+    def __getstate__(self):
+        # El DataFrame ya viaja aparte a cada proceso; solo se envían los agregados
+        estado = self.__dict__.copy()
+        estado['df'] = None
+        return estado
+
+def _agregados(df, agregados):
+    return agregados if agregados is not None else AgregadosGraficos(df)
+
+# ==============================================================================
+# III. GRÁFICOS DEL 1 AL 14
+# ==============================================================================
+
+def _ejes(ax):
+    """Devuelve los ejes sobre los que dibujar: los indicados o los actuales de pyplot."""
+    return ax if ax is not None else plt.gca()
+
+def _anotar_error(ax, texto):
+    """Indica en la esquina del gráfico que se ha dibujado con datos reducidos."""
+    ax.text(0.99, 0.01, f'Modo datos grandes: {texto}', transform=ax.transAxes,
+            ha='right', va='bottom', fontsize=8, color='dimgray')
+
+def _serie_reducida(ax, x, y, agregados, **kwargs):
+    """Dibuja una serie temporal, reducida con LTTB en modo grande. Devuelve el error máximo."""
+    error = 0.0
+    if agregados is not None and agregados.modo_grande and len(y) > PUNTOS_SERIE:
+        indices, error = lttb(x, y, PUNTOS_SERIE)
+        x, y = np.asarray(x)[indices], np.asarray(y)[indices]
+    ax.plot(x, y, **kwargs)
+    return error
+
+def _guardar_figura(fig, graficos_dir, nombre):
+    ruta = Path(graficos_dir) / nombre
+    fig.savefig(ruta, dpi=300, bbox_inches='tight')
+    return ruta
+
+def _guardar(ax, graficos_dir, nombre, guardar):
+    """
+    Guarda la figura de ax a 300 DPI y devuelve la ruta escrita (o None).
+
+    El nombre del PNG queda en la etiqueta de la figura para guardarla después
+    (el visor solo escribe los gráficos que se llegan a mostrar).
+    """
+    ax.figure.set_label(nombre)
     if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '05_volumen_por_tipo.png', dpi=300, bbox_inches='tight')
+        return _guardar_figura(ax.figure, graficos_dir, nombre)
+
+@instrumentar()
+def grafico_1(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    if agregados is not None and agregados.modo_grande:
+        conteos, bordes, rejilla, densidad, error = agregados.histograma_precio
+        ancho = np.diff(bordes)
+        ax.bar(bordes[:-1], conteos, width=ancho, align='edge', color='skyblue', edgecolor='white')
+        # Densidad escalada a frecuencias, como hace histplot(kde=True)
+        escala = conteos.sum() * ancho.mean()
+        ax.plot(rejilla, densidad * escala, color='skyblue', linewidth=2)
+        _anotar_error(ax, f'KDE binned, error ≤ {error * escala:.3g} obs.')
+    else:
+        sns.histplot(df['AveragePrice'], kde=True, bins=30, color='skyblue', ax=ax)
+    ax.set_title('1. Distribución del Precio Promedio (AveragePrice)', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Precio Promedio ($)')
+    ax.set_ylabel('Frecuencia')
+    ax.grid(True, alpha=0.3)
+    return _guardar(ax, graficos_dir, '01_histograma_precio.png', guardar)
+
+@instrumentar()
+def grafico_2(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    sns.boxplot(y=df['Total Volume'], color='salmon', ax=ax)
+    ax.set_title('2. Boxplot de Volumen Total (Detección de Outliers)', fontsize=14, fontweight='bold')
+    ax.set_ylabel('Volumen Total')
+    ax.grid(True, alpha=0.3)
+    return _guardar(ax, graficos_dir, '02_boxplot_volumen.png', guardar)
+
+@instrumentar()
+def grafico_3(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    sns.boxplot(x='type', y='AveragePrice', data=df, palette={'conventional': 'orange', 'organic': 'green'}, ax=ax)
+    ax.set_title('3. AveragePrice por Tipo de Aguacate', fontsize=14, fontweight='bold')
+    ax.set_xlabel('Tipo')
+    ax.set_ylabel('Precio Promedio')
+    ax.grid(axis='y', alpha=0.3)
+    return _guardar(ax, graficos_dir, '03_boxplot_precio_por_tipo.png', guardar)
 
-def grafico_6(df, graficos_dir=None, guardar=False):
+@instrumentar()
+def grafico_4(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    agregados = _agregados(df, agregados)
+    df_time = agregados.precio_por_fecha
+    if agregados.modo_grande:
+        error = _serie_reducida(ax, df_time['Date'], df_time['AveragePrice'], agregados,
+                                color='purple', linewidth=2)
+        _anotar_error(ax, f'LTTB ({PUNTOS_SERIE} puntos), error ≤ {error:.3g} $')
+    else:
+        sns.lineplot(x='Date', y='AveragePrice', data=df_time, color='purple', linewidth=2, ax=ax)
+    if 'region' in df.columns and 'type' in df.columns:
+        tendencia = agregados.tendencia_precio
+        ax.plot(tendencia.index, tendencia.to_numpy(), color='black', linestyle='--', linewidth=1.5,
+                label='Tendencia (media móvil 52 semanas)')
+        ax.legend()
+    ax.set_title('4. Tendencia del Precio Promedio a lo largo del Tiempo', fontsize=14, fontweight='bold')
+    ax.tick_params(axis='x', rotation=45)
+    ax.grid(True, alpha=0.3)
+    return _guardar(ax, graficos_dir, '04_linea_precio_temporal.png', guardar)
+
+@instrumentar()
+def grafico_5(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    vol_tipo = _agregados(df, agregados).volumen_por_fecha_tipo
+    errores = []
+    for tipo in vol_tipo.index.unique('type'):
+        subset = vol_tipo.xs(tipo, level='type')
+        errores.append(_serie_reducida(ax, subset.index, subset.to_numpy(), agregados,
+                                       label=tipo, linewidth=2))
+    if agregados is not None and agregados.modo_grande:
+        _anotar_error(ax, f'LTTB ({PUNTOS_SERIE} puntos), error ≤ {max(errores, default=0):.3g}')
+    ax.set_title('5. Evolución del Volumen Total por Tipo', fontsize=14, fontweight='bold')
+    ax.legend()
+    ax.tick_params(axis='x', rotation=45)
+    ax.grid(True, alpha=0.3)
+    return _guardar(ax, graficos_dir, '05_volumen_por_tipo.png', guardar)
+
+@instrumentar()
+def grafico_6(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
     bags_cols = ['Small Bags', 'Large Bags', 'XLarge Bags']
-    bags_data = df[bags_cols].sum()
-    plt.bar(bags_data.index, bags_data.values)
-    plt.title('6. Distribución Total de Tipos de Bolsas', fontsize=14, fontweight='bold')
-    plt.grid(axis='y', alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '06_distribucion_bolsas.png', dpi=300, bbox_inches='tight')
+    bags_data = _agregados(df, agregados).sumas_columnas[bags_cols]
+    ax.bar(bags_data.index, bags_data.values)
+    ax.set_title('6. Distribución Total de Tipos de Bolsas', fontsize=14, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3)
+    return _guardar(ax, graficos_dir, '06_distribucion_bolsas.png', guardar)
 
-def grafico_7(df, graficos_dir=None, guardar=False):
-    numeric_cols = df.select_dtypes(include=[np.number]).columns
-    corr = df[numeric_cols].corr()
-    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt='.2f')
-    plt.title('7. Matriz de Correlación General', fontsize=14, fontweight='bold')
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '07_heatmap_correlacion_general.png', dpi=300, bbox_inches='tight')
+@instrumentar()
+def grafico_7(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    agregados = _agregados(df, agregados)
+    # total_bags y total_volume repiten Total Bags y Total Volume
+    corr = agregados.correlacion(sin_derivadas(agregados.correlacion_numerica.columns))
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt='.2f', ax=ax)
+    ax.set_title('7. Matriz de Correlación General', fontsize=14, fontweight='bold')
+    return _guardar(ax, graficos_dir, '07_heatmap_correlacion_general.png', guardar)
 
-def grafico_8(df, graficos_dir=None, guardar=False):
-    top_regions = df.groupby('region')['AveragePrice'].mean().sort_values(ascending=False).head(15)
-    sns.barplot(x=top_regions.values, y=top_regions.index)
-    plt.title('8. Top 15 Regiones con Mayor Precio Promedio', fontsize=14, fontweight='bold')
-    plt.grid(axis='x', alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '08_top_regiones_precio.png', dpi=300, bbox_inches='tight')
+@instrumentar()
+def grafico_8(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    top_regions = _agregados(df, agregados).precio_medio_region.head(15)
+    sns.barplot(x=top_regions.values, y=top_regions.index.astype(str), ax=ax)
+    ax.set_title('8. Top 15 Regiones con Mayor Precio Promedio', fontsize=14, fontweight='bold')
+    ax.grid(axis='x', alpha=0.3)
+    return _guardar(ax, graficos_dir, '08_top_regiones_precio.png', guardar)
 
-def grafico_9(df, graficos_dir=None, guardar=False):
+@instrumentar()
+def grafico_9(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
     plu_cols = ['4046', '4225', '4770']
-    plu_data = df[plu_cols].sum()
-    plt.bar(plu_cols, plu_data.values)
-    plt.title('9. Distribución Total de Códigos PLU', fontsize=14, fontweight='bold')
-    plt.grid(axis='y', alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '09_distribucion_plu.png', dpi=300, bbox_inches='tight')
+    plu_data = _agregados(df, agregados).sumas_columnas[plu_cols]
+    ax.bar(plu_cols, plu_data.values)
+    ax.set_title('9. Distribución Total de Códigos PLU', fontsize=14, fontweight='bold')
+    ax.grid(axis='y', alpha=0.3)
+    return _guardar(ax, graficos_dir, '09_distribucion_plu.png', guardar)
 
-def grafico_10(df, graficos_dir=None, guardar=False):
-    sns.countplot(y='region', data=df, order=df['region'].value_counts().index)
-    plt.title('10. Conteo de Observaciones por Región', fontsize=14, fontweight='bold')
-    plt.tick_params(axis='y', labelsize=8) 
-    plt.grid(axis='x', alpha=0.3)
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '10_conteo_regiones.png', dpi=300, bbox_inches='tight')
+@instrumentar()
+def grafico_10(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
+    conteo = _agregados(df, agregados).conteo_region
+    sns.barplot(x=conteo.values, y=conteo.index.astype(str), ax=ax)
+    ax.set_xlabel('count')
+    ax.set_ylabel('region')
+    ax.set_title('10. Conteo de Observaciones por Región', fontsize=14, fontweight='bold')
+    ax.tick_params(axis='y', labelsize=8) 
+    ax.grid(axis='x', alpha=0.3)
+    return _guardar(ax, graficos_dir, '10_conteo_regiones.png', guardar)
 
-def grafico_11(df, graficos_dir=None, guardar=False):
+@instrumentar()
+def grafico_11(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    ax = _ejes(ax)
     correlation_cols = ['AveragePrice', 'Total Volume', '4046', '4225', '4770', 
                         'Total Bags', 'Small Bags', 'Large Bags', 'XLarge Bags', 'year']
-    cols = [col for col in correlation_cols if col in df.columns]
-    corr_matrix = df[cols].corr()
-    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', linewidths=.5)
-    plt.title('11. Heatmap Avanzado', fontsize=14, fontweight='bold')
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '11_heatmap_avanzado.png', dpi=300, bbox_inches='tight')
+    corr_matrix = _agregados(df, agregados).correlacion(correlation_cols)
+    sns.heatmap(corr_matrix, annot=True, cmap='coolwarm', linewidths=.5, ax=ax)
+    ax.set_title('11. Heatmap Avanzado', fontsize=14, fontweight='bold')
+    return _guardar(ax, graficos_dir, '11_heatmap_avanzado.png', guardar)
 
-def grafico_12(df, graficos_dir=None, guardar=False):
+@instrumentar()
+def grafico_12(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
     if 'year' not in df.columns or 'type' not in df.columns: return
-    df['year_str'] = df['year'].astype(str)
-    sns.violinplot(x='year_str', y='AveragePrice', hue='type', data=df, split=True)
-    plt.title('12. Volatilidad de Precios por Año y Tipo', fontsize=14, fontweight='bold')
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '12_violin_plot.png', dpi=300, bbox_inches='tight')
+    ax = _ejes(ax)
+    datos = df
+    if agregados is not None and agregados.modo_grande:
+        datos, error = agregados.muestra_anio_tipo
+        _anotar_error(ax, f'muestra de ≤{FILAS_POR_ESTRATO} filas por año y tipo, '
+                          f'error de la distribución ≤ {error:.3f} (DKW, 95%)')
+    # No se añade 'year_str' al DataFrame: los gráficos no deben modificar los datos compartidos
+    sns.violinplot(x=datos['year'].astype(str), y='AveragePrice', hue='type', data=datos, split=True, ax=ax)
+    ax.set_xlabel('year')
+    ax.set_title('12. Volatilidad de Precios por Año y Tipo', fontsize=14, fontweight='bold')
+    return _guardar(ax, graficos_dir, '12_violin_plot.png', guardar)
 
-def grafico_13(df, graficos_dir=None, guardar=False):
+@instrumentar()
+def grafico_13(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
     if 'region' not in df.columns: return
-    region_stats = df.groupby('region')['AveragePrice'].agg(
-        IQR=lambda x: x.quantile(0.75) - x.quantile(0.25)
-    ).reset_index().sort_values(by='IQR', ascending=False)
-    sns.barplot(x='IQR', y='region', data=region_stats.head(20))
-    plt.title('13. Top 20 Regiones por IQR del Precio', fontsize=14, fontweight='bold')
-    if guardar and graficos_dir:
-        plt.savefig(graficos_dir / '13_iqr_regional.png', dpi=300, bbox_inches='tight')
+    ax = _ejes(ax)
+    region_stats = _agregados(df, agregados).iqr_region
+    sns.barplot(x='IQR', y='region', data=region_stats.head(20), ax=ax)
+    ax.set_title('13. Top 20 Regiones por IQR del Precio', fontsize=14, fontweight='bold')
+    return _guardar(ax, graficos_dir, '13_iqr_regional.png', guardar)
+
+@instrumentar()
+def grafico_14(df, graficos_dir=None, guardar=False, ax=None, agregados=None):
+    if 'region' not in df.columns or 'type' not in df.columns: return
+    ax = _ejes(ax)
+    perfil = _agregados(df, agregados).descomposicion.perfil_estacional('AveragePrice')
+    ax.set_title('14. Estacionalidad del Precio por Tipo (desviación sobre la tendencia)',
+                 fontsize=14, fontweight='bold')
+    if perfil.isna().all().all():
+        ax.text(0.5, 0.5, 'Datos insuficientes para la estacionalidad (se necesita al menos un año)',
+                transform=ax.transAxes, ha='center', va='center', fontsize=12, color='gray')
+        return _guardar(ax, graficos_dir, '14_estacionalidad_precio.png', guardar)
+    for tipo in perfil.columns:
+        ax.plot(perfil.index, perfil[tipo].to_numpy(), linewidth=2, label=tipo)
+    ax.axhline(0, color='gray', linewidth=1)
+    ax.xaxis.set_major_locator(mdates.MonthLocator())
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%b'))
+    ax.set_ylabel('Índice estacional ($)')
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    return _guardar(ax, graficos_dir, '14_estacionalidad_precio.png', guardar)
+
+LISTA_GRAFICOS = [
+    grafico_1, grafico_2, grafico_3, grafico_4, grafico_5,
+    grafico_6, grafico_7, grafico_8, grafico_9, grafico_10,
+    grafico_11, grafico_12, grafico_13, grafico_14
+]
+
+# ==============================================================================
+# IV. RENDERIZADO SIN INTERFAZ (AGG) EN PARALELO
+# ==============================================================================
+_DF_PROCESO = None
+_AGREGADOS_PROCESO = None
+_SINK_PROCESO = None
+
+def _fijar_datos_proceso(df, agregados):
+    global _DF_PROCESO, _AGREGADOS_PROCESO
+    _DF_PROCESO = df
+    agregados.df = df
+    _AGREGADOS_PROCESO = agregados
+
+def _inicializar_proceso(df, agregados, medir_memoria=None):
+    """Recibe el DataFrame y sus agregados una sola vez por proceso en lugar de una vez por gráfico."""
+    global _SINK_PROCESO
+    # Los procesos hijos no escriben en los sinks del padre: si el padre mide
+    # (medir_memoria no es None), guardan los registros de cada gráfico en
+    # memoria y los devuelven con el resultado para que el padre los emita
+    if medir_memoria is None:
+        desactivar_instrumentacion()
+        _SINK_PROCESO = None
+    else:
+        _SINK_PROCESO = SinkMemoria()
+        configurar_instrumentacion([_SINK_PROCESO], medir_memoria=medir_memoria)
+    _fijar_datos_proceso(df, agregados)
+
+def renderizar_grafico(df, grafico, graficos_dir=None, guardar=True, figsize=(14, 8), agregados=None, dpi=None):
+    """
+    Dibuja un gráfico (su índice 0-13 o la función) sobre una Figure propia con
+    lienzo Agg, sin tocar el estado global de pyplot.
+
+    Devuelve (figura, segundos, ruta_guardada).
+    """
+    funcion = LISTA_GRAFICOS[grafico] if isinstance(grafico, int) else grafico
+    inicio = time.perf_counter()
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    ruta = funcion(df, graficos_dir=graficos_dir, guardar=guardar, ax=ax, agregados=agregados)
+    return fig, time.perf_counter() - inicio, ruta
+
+def _renderizar_en_proceso(indice, graficos_dir):
+    try:
+        _, segundos, _ = renderizar_grafico(_DF_PROCESO, indice, graficos_dir, agregados=_AGREGADOS_PROCESO)
+        resultado = indice, segundos, None
+    except Exception as e:
+        resultado = indice, None, str(e)
+    registros = []
+    if _SINK_PROCESO is not None:
+        registros, _SINK_PROCESO.registros = _SINK_PROCESO.registros, []
+    return resultado + (registros,)
+
+def renderizar_graficos_paralelo(df, graficos_dir=None, procesos=None, modo_grande=False, correlacion=None):
+    """
+    Guarda los 14 gráficos repartidos en un pool de procesos sin interfaz gráfica.
+
+    Parámetros:
+    - df: DataFrame con los datos
+    - graficos_dir: Carpeta de destino (por defecto 'graficos/')
+    - procesos: Número de procesos (None = núcleos disponibles, 1 = en este proceso)
+    - modo_grande: Si es True dibuja con datos reducidos (ver AgregadosGraficos)
+    - correlacion: Matriz de correlación ya calculada para los heatmaps (ver AgregadosGraficos)
+
+    Devuelve un diccionario {nombre_funcion: segundos} con el tiempo de cada gráfico
+    (None si falló).
+    """
+    graficos_dir = Path(graficos_dir) if graficos_dir else crear_carpeta_graficos()
+    graficos_dir.mkdir(exist_ok=True)
+    indices = range(len(LISTA_GRAFICOS))
+    # Los agregados se calculan una vez aquí y se comparten con todos los procesos
+    agregados = AgregadosGraficos(df, modo_grande=modo_grande, correlacion=correlacion).calcular_todo()
+
+    instrumentacion = instrumentacion_activa()
+    if procesos == 1:
+        # En este proceso los gráficos se miden directamente con la instrumentación activa
+        _fijar_datos_proceso(df, agregados)
+        resultados = [_renderizar_en_proceso(i, graficos_dir) for i in indices]
+    else:
+        medir_memoria = None if instrumentacion is None else instrumentacion.medir_memoria
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                 initargs=(df, agregados, medir_memoria)) as pool:
+            resultados = list(pool.map(_renderizar_en_proceso, indices, [graficos_dir] * len(indices)))
+
+    tiempos = {}
+    for indice, segundos, error, registros in resultados:
+        if instrumentacion is not None:
+            instrumentacion.emitir_externos(registros)
+        if error is None:
+            print(f"  ✓ Gráfico {indice + 1}/{len(LISTA_GRAFICOS)} guardado ({segundos:.2f} s)")
+        else:
+            print(f"  ✗ Error en gráfico {indice + 1}: {error}")
+        tiempos[LISTA_GRAFICOS[indice].__name__] = segundos
+    return tiempos
 
 # ==============================================================================
 # FUNCIÓN PARA INICIAR EL VISOR
 # ==============================================================================
-def iniciar_navegador(df, guardar_graficos=True):
+def iniciar_navegador(df, guardar_graficos=True, modo_grande=False, correlacion=None):
     """
     Inicia el navegador interactivo de gráficos.
     
     Parámetros:
     - df: DataFrame con los datos
     - guardar_graficos: Si es True, guarda cada gráfico en la carpeta 'graficos'
+    - modo_grande: Si es True, los gráficos pesados usan datos reducidos
+    - correlacion: Matriz de correlación ya calculada para los heatmaps
     """
-    lista_graficos = [
-        grafico_1, grafico_2, grafico_3, grafico_4, grafico_5,
-        grafico_6, grafico_7, grafico_8, grafico_9, grafico_10,
-        grafico_11, grafico_12, grafico_13
-    ]
+    lista_graficos = LISTA_GRAFICOS
     
     if guardar_graficos:
         print("📁 Los gráficos se guardarán automáticamente en la carpeta 'graficos/'")
     
-    visor = GraficosNavegador(df, lista_graficos, guardar_automatico=guardar_graficos)
+    visor = GraficosNavegador(df, lista_graficos, guardar_automatico=guardar_graficos, modo_grande=modo_grande,
+                              correlacion=correlacion)
     plt.show()
 
 # ==============================================================================
 # FUNCIÓN ALTERNATIVA: GUARDAR TODOS LOS GRÁFICOS SIN VISOR
 # ==============================================================================
-def guardar_todos_los_graficos(df):
+def guardar_todos_los_graficos(df, procesos=None, modo_grande=False):
     """
     Guarda todos los gráficos directamente en la carpeta 'graficos' sin mostrar el visor.
+
+    Se renderizan con Agg en un pool de procesos; devuelve los tiempos por gráfico.
     """
     print("\n📊 Generando y guardando todos los gráficos...")
     graficos_dir = crear_carpeta_graficos()
     
-    lista_graficos = [
-        grafico_1, grafico_2, grafico_3, grafico_4, grafico_5,
-        grafico_6, grafico_7, grafico_8, grafico_9, grafico_10,
-        grafico_11, grafico_12, grafico_13
-    ]
-    
-    for i, func_grafico in enumerate(lista_graficos, 1):
-        plt.figure(figsize=(14, 8))
-        try:
-            func_grafico(df, graficos_dir=graficos_dir, guardar=True)
-            print(f"  ✓ Gráfico {i}/13 guardado")
-        except Exception as e:
-            print(f"  ✗ Error en gráfico {i}: {e}")
-        plt.close()
+    tiempos = renderizar_graficos_paralelo(df, graficos_dir, procesos=procesos, modo_grande=modo_grande)
     
-    print(f"\n✅ Todos los gráficos guardados en: {graficos_dir.absolute()}")
\ No newline at end of file
+    print(f"\n✅ Todos los gráficos guardados en: {graficos_dir.absolute()}")
+    return tiempos
\ No newline at end of file
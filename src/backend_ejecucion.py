@@ -0,0 +1,307 @@
+import numpy as np
+import pandas as pd
+
+from src.carga_datos import cargar_datos, obtener_ruta_csv
+from src.dataset_particionado import es_dataset_particionado, leer_manifiesto, expresion_filtros
+
+# pyarrow se importa dentro de las funciones: el backend pandas no lo necesita
+
+COLUMNAS_OUTLIERS = ['AveragePrice', 'Total Volume']
+COLUMNAS_BOLSAS = ["Small Bags", "Large Bags", "XLarge Bags"]
+COLUMNAS_PLU = ["4046", "4225", "4770"]
+
+# Filas por lote del escáner de pyarrow
+FILAS_LOTE = 128 * 1024
+
+
+# ==============================================================================
+# I. PLAN PEREZOSO SOBRE PYARROW.DATASET
+# ==============================================================================
+class PlanPerezoso:
+    """
+    Plan de consulta perezoso sobre un pyarrow.dataset (CSV o Parquet).
+
+    Cada operación devuelve un plan nuevo sin leer nada: las columnas del
+    resultado son expresiones de pyarrow.compute sobre las columnas físicas y
+    los filtros se acumulan en una única expresión. Solo lotes(), recoger() y
+    cuantiles() ejecutan el plan, y el escáner de pyarrow:
+    - lee únicamente las columnas físicas que aparecen en alguna expresión
+      (proyección empujada al lector),
+    - aplica el filtro durante el escaneo; en Parquet descarta además
+      particiones y grupos de filas por sus estadísticas (predicado empujado),
+    - reparte fragmentos y lotes entre varios hilos.
+
+    Se crea con PlanPerezoso.desde_ruta() y se encadena:
+
+        plan = PlanPerezoso.desde_ruta('data/avocado.csv')
+        plan = plan.filtrar_por({'year': 2017}).seleccionar(['Date', 'region', 'AveragePrice'])
+        for lote in plan.lotes():
+            ...
+    """
+
+    def __init__(self, dataset, columnas=None, filtro=None):
+        import pyarrow.dataset as ds
+
+        self.dataset = dataset
+        if columnas is None:
+            # Las columnas sin nombre del CSV se llaman como en pandas ('Unnamed: 0')
+            columnas = {nombre or f'Unnamed: {i}': ds.field(nombre)
+                        for i, nombre in enumerate(dataset.schema.names)}
+        self.columnas = dict(columnas)
+        self.filtro = filtro
+
+    @classmethod
+    def desde_ruta(cls, ruta=None):
+        """Plan sobre un CSV, un dataset particionado de dataset_particionado o un Parquet."""
+        import pyarrow as pa
+        import pyarrow.dataset as ds
+
+        ruta = obtener_ruta_csv(ruta)
+        if es_dataset_particionado(ruta):
+            ficheros = [str(ruta / f['ruta']) for f in leer_manifiesto(ruta)['ficheros']]
+            dataset = ds.dataset(ficheros, format='parquet', partition_base_dir=str(ruta),
+                                 partitioning=ds.partitioning(flavor='hive'))
+        elif ruta.suffix == '.csv':
+            dataset = ds.dataset(ruta, format='csv')
+        else:
+            dataset = ds.dataset(ruta, format='parquet', partitioning='hive')
+
+        plan = cls(dataset)
+        # El lector CSV infiere las fechas como date32; pandas las carga como datetime64[us]
+        if 'Date' in plan.columnas and pa.types.is_date(dataset.schema.field('Date').type):
+            plan = plan.con_columna('Date', plan['Date'].cast(pa.timestamp('us')))
+        return plan
+
+    def __getitem__(self, nombre):
+        return self.columnas[nombre]
+
+    def __contains__(self, nombre):
+        return nombre in self.columnas
+
+    def _nuevo(self, columnas=None, filtro=None):
+        return PlanPerezoso(self.dataset, self.columnas if columnas is None else columnas,
+                            self.filtro if filtro is None else filtro)
+
+    # ------------------------------------------------------------------
+    # Operaciones (perezosas)
+    # ------------------------------------------------------------------
+    def seleccionar(self, columnas):
+        return self._nuevo({col: self.columnas[col] for col in columnas})
+
+    def sin_columnas(self, columnas):
+        return self._nuevo({col: e for col, e in self.columnas.items() if col not in columnas})
+
+    def con_columna(self, nombre, expresion):
+        """Añade o sustituye una columna (expresión sobre las columnas actuales del plan)."""
+        return self._nuevo({**self.columnas, nombre: expresion})
+
+    def filtrar(self, expresion):
+        return self._nuevo(filtro=expresion if self.filtro is None else self.filtro & expresion)
+
+    def filtrar_por(self, filtros):
+        """Filtros con el formato de leer_dataset_particionado (valor, lista o tupla (desde, hasta))."""
+        fechas = {col for col in filtros if col == 'Date'}
+        return self.filtrar(expresion_filtros(filtros, fechas, campos=self.columnas))
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+    def _escaner(self, columnas=None, filas_lote=FILAS_LOTE):
+        columnas = self.columnas if columnas is None else {col: self.columnas[col] for col in columnas}
+        return self.dataset.scanner(columns=columnas, filter=self.filtro, batch_size=filas_lote,
+                                    use_threads=True)
+
+    def lotes(self, filas_lote=FILAS_LOTE):
+        """Ejecuta el plan y genera DataFrames de como mucho 'filas_lote' filas, en orden."""
+        for lote in self._escaner(filas_lote=filas_lote).to_batches():
+            if lote.num_rows:
+                yield lote.to_pandas()
+
+    def recoger(self):
+        """Ejecuta el plan y devuelve el resultado completo como DataFrame."""
+        return self._escaner().to_table().to_pandas()
+
+    def contar(self):
+        return self._escaner(columnas=[]).count_rows()
+
+    def cuantiles(self, columnas, q):
+        """
+        Cuantiles exactos (interpolación lineal, como pandas) de las columnas
+        indicadas; el escaneo solo lee esas columnas y las del filtro.
+        """
+        tabla = self._escaner(columnas=columnas).to_table()
+        resultado = {}
+        for col in columnas:
+            valores = tabla[col].drop_null().to_numpy()
+            if len(valores) == 0:
+                resultado[col] = np.full(len(q), np.nan)
+            else:
+                # Mismo cálculo que DataFrame.quantile (np.percentile sobre los valores no nulos)
+                resultado[col] = np.percentile(valores, np.asarray(q) * 100)
+        return resultado
+
+    def explicar(self):
+        """Descripción legible del plan: columnas de salida y filtro empujado al escáner."""
+        lineas = [f"Fuente: {type(self.dataset).__name__} ({len(self.dataset.files)} ficheros)"]
+        lineas += [f"  {nombre} = {expresion}" for nombre, expresion in self.columnas.items()]
+        lineas.append(f"Filtro: {self.filtro}")
+        return '\n'.join(lineas)
+
+
+# ==============================================================================
+# II. BACKENDS DEL FLUJO CARGA → LIMPIEZA → OUTLIERS
+# ==============================================================================
+def mascara_filtros(df, filtros):
+    """Equivalente en pandas de los filtros de leer_dataset_particionado."""
+    mascara = np.ones(len(df), dtype=bool)
+    for col, condicion in (filtros or {}).items():
+        serie = df[col]
+        normalizar = pd.Timestamp if col == 'Date' else (lambda v: v)
+        if isinstance(condicion, tuple):
+            desde, hasta = condicion
+            if desde is not None:
+                mascara &= (serie >= normalizar(desde)).to_numpy()
+            if hasta is not None:
+                mascara &= (serie <= normalizar(hasta)).to_numpy()
+        else:
+            valores = condicion if isinstance(condicion, (list, set)) else [condicion]
+            mascara &= serie.isin([normalizar(v) for v in valores]).to_numpy()
+    return mascara
+
+
+class BackendPandas:
+    """
+    Backend por defecto: carga el CSV completo en memoria y lo limpia con
+    PipelineLimpieza (límites IQR globales), como main.py.
+    """
+
+    nombre = 'pandas'
+
+    def __init__(self):
+        self.limites = {}
+
+    def limpiar(self, ruta=None, filtros=None, columnas_outliers=None):
+        from src.limpieza_datos import PipelineLimpieza
+
+        df = cargar_datos(ruta=ruta)
+        if filtros:
+            df = df[mascara_filtros(df, filtros)]
+        limpieza = PipelineLimpieza(columnas_outliers or COLUMNAS_OUTLIERS, medir_memoria=False)
+        df = limpieza.ejecutar(df)
+        self.limites = limpieza.limites
+        return df
+
+    def limpiar_por_lotes(self, ruta=None, filtros=None, columnas_outliers=None):
+        yield self.limpiar(ruta, filtros, columnas_outliers)
+
+
+class BackendArrow:
+    """
+    Backend perezoso y fuera de memoria sobre pyarrow.dataset.
+
+    Construye el mismo flujo que PipelineLimpieza como un PlanPerezoso:
+    preparación (total_bags, total_volume) como expresiones, una primera
+    pasada que solo lee las columnas de outliers para calcular los cuartiles
+    exactos y un filtro final (límites IQR y nulos) que se aplica durante el
+    escaneo. El resultado se consume por lotes, sin tener nunca el dataset
+    completo en memoria, y coincide con el de BackendPandas.
+
+    Parámetros:
+    - filas_lote: Filas máximas por lote del resultado
+    """
+
+    nombre = 'arrow'
+
+    def __init__(self, filas_lote=FILAS_LOTE):
+        self.filas_lote = filas_lote
+        self.limites = {}
+
+    def plan_limpieza(self, ruta=None, filtros=None, columnas_outliers=None):
+        """Devuelve el PlanPerezoso del dataset limpio (solo ejecuta la pasada de cuartiles)."""
+        import pyarrow as pa
+        import pyarrow.compute as pc
+
+        plan = PlanPerezoso.desde_ruta(ruta)
+        if filtros:
+            plan = plan.filtrar_por(filtros)
+
+        # Preparación: mismas operaciones y en el mismo orden que PipelineLimpieza._preparar
+        plan = plan.sin_columnas(['Unnamed: 0'])
+        cero = pa.scalar(0.0)
+        for col in COLUMNAS_BOLSAS:
+            if col not in plan:
+                plan = plan.con_columna(col, pa.scalar(0))
+        for col in COLUMNAS_PLU:
+            plan = plan.con_columna(col, pc.coalesce(plan[col], cero))
+        total_bags = plan["Small Bags"] + plan["Large Bags"] + plan["XLarge Bags"]
+        plan = plan.con_columna("total_bags", pc.coalesce(total_bags, cero))
+        plan = plan.con_columna(
+            "total_volume", plan["4046"] + plan["4225"] + plan["4770"] + plan["total_bags"]
+        )
+
+        # Límites IQR globales (primera pasada, solo las columnas de outliers)
+        columnas = [col for col in (columnas_outliers or COLUMNAS_OUTLIERS) if col in plan]
+        cuartiles = plan.cuantiles(columnas, [0.25, 0.75])
+        self.limites = {}
+        for col in columnas:
+            q1, q3 = cuartiles[col]
+            iqr = q3 - q1
+            self.limites[col] = (q1 - 1.5 * iqr, q3 + 1.5 * iqr)
+
+        # Nulos y outliers en un único filtro aplicado durante el escaneo
+        condicion = None
+        for expresion in plan.columnas.values():
+            parte = expresion.is_valid()
+            condicion = parte if condicion is None else condicion & parte
+        for col, (inferior, superior) in self.limites.items():
+            condicion = condicion & (plan[col] >= inferior) & (plan[col] <= superior)
+        return plan.filtrar(condicion)
+
+    def limpiar(self, ruta=None, filtros=None, columnas_outliers=None):
+        return self.plan_limpieza(ruta, filtros, columnas_outliers).recoger()
+
+    def limpiar_por_lotes(self, ruta=None, filtros=None, columnas_outliers=None):
+        return self.plan_limpieza(ruta, filtros, columnas_outliers).lotes(self.filas_lote)
+
+
+BACKENDS = {'pandas': BackendPandas, 'arrow': BackendArrow}
+
+
+def obtener_backend(nombre='pandas', **opciones):
+    """Instancia el backend 'pandas' o 'arrow' con las opciones indicadas."""
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend desconocido '{nombre}': usa uno de {list(BACKENDS)}")
+    return BACKENDS[nombre](**opciones)
+
+
+# ==============================================================================
+# III. COMPARACIÓN ENTRE BACKENDS
+# ==============================================================================
+def comparar_backends(ruta=None, filtros=None, columnas_outliers=None, filas_lote=FILAS_LOTE):
+    """
+    Ejecuta la limpieza con ambos backends y comprueba que el resultado es idéntico.
+
+    El backend perezoso se consume por lotes y se concatena, de modo que se
+    verifica también la ejecución fuera de memoria. Devuelve un diccionario
+    con las filas de cada backend, si los límites IQR y los datos coinciden y,
+    si no, la primera diferencia encontrada.
+    """
+    pandas_, arrow = BackendPandas(), BackendArrow(filas_lote)
+    esperado = pandas_.limpiar(ruta, filtros, columnas_outliers).reset_index(drop=True)
+    lotes = list(arrow.limpiar_por_lotes(ruta, filtros, columnas_outliers))
+    obtenido = pd.concat(lotes, ignore_index=True) if lotes else esperado.iloc[:0]
+
+    resultado = {
+        'filas_pandas': len(esperado),
+        'filas_arrow': len(obtenido),
+        'lotes_arrow': len(lotes),
+        'limites_iguales': pandas_.limites == arrow.limites,
+        'iguales': True,
+        'diferencia': None,
+    }
+    try:
+        pd.testing.assert_frame_equal(esperado, obtenido, check_exact=True)
+    except AssertionError as e:
+        resultado['iguales'] = False
+        resultado['diferencia'] = str(e)
+    return resultado
@@ -0,0 +1,124 @@
+import hashlib
+import json
+from pathlib import Path
+
+import pandas as pd
+
+# Subcarpeta, junto al fichero de origen, donde se guardan las cachés (Feather/Arrow)
+DIR_CACHE = '.cache'
+
+TAMANO_LECTURA_HASH = 1 << 20
+
+
+def _pyarrow_disponible():
+    try:
+        import pyarrow.feather  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def huella_fichero(ruta, calcular_hash=True):
+    """
+    Devuelve la huella de un fichero: tamaño, mtime y (opcionalmente) su hash sha256.
+    """
+    ruta = Path(ruta)
+    stat = ruta.stat()
+    huella = {'tamano': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    if calcular_hash:
+        sha = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for trozo in iter(lambda: f.read(TAMANO_LECTURA_HASH), b''):
+                sha.update(trozo)
+        huella['sha256'] = sha.hexdigest()
+    return huella
+
+
+def huella_dataframe(df):
+    """
+    Huella del contenido de un DataFrame (valores, índice y nombres de columna).
+
+    Sirve como clave de caché para resultados derivados de un DataFrame en memoria.
+    """
+    sha = hashlib.sha256()
+    sha.update(json.dumps([str(col) for col in df.columns]).encode('utf-8'))
+    sha.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return sha.hexdigest()
+
+
+def _rutas_cache(ruta_origen, nombre, dir_cache):
+    ruta_origen = Path(ruta_origen)
+    nombre = nombre or ruta_origen.stem
+    dir_cache = ruta_origen.parent / dir_cache
+    return dir_cache / f'{nombre}.feather', dir_cache / f'{nombre}.json'
+
+
+def cache_vigente(ruta_origen, nombre=None, dir_cache=DIR_CACHE):
+    """
+    Indica si la caché de 'nombre' corresponde a la versión actual de ruta_origen.
+
+    Si tamaño y mtime coinciden se da por válida sin leer el fichero. Si solo
+    cambia el mtime (p. ej. un 'touch') se compara el hash del contenido y,
+    si coincide, se actualiza la huella guardada.
+    """
+    ruta_datos, ruta_meta = _rutas_cache(ruta_origen, nombre, dir_cache)
+    if not ruta_datos.exists() or not ruta_meta.exists():
+        return False
+
+    try:
+        guardada = json.loads(ruta_meta.read_text(encoding='utf-8'))
+    except (OSError, ValueError):
+        return False
+
+    actual = huella_fichero(ruta_origen, calcular_hash=False)
+    if actual['tamano'] != guardada.get('tamano'):
+        return False
+    if actual['mtime_ns'] == guardada.get('mtime_ns'):
+        return True
+
+    actual = huella_fichero(ruta_origen)
+    if actual['sha256'] != guardada.get('sha256'):
+        return False
+    ruta_meta.write_text(json.dumps(actual), encoding='utf-8')
+    return True
+
+
+def leer_cache(ruta_origen, nombre=None, dir_cache=DIR_CACHE):
+    """
+    Lee la caché columnar mapeando el fichero en memoria.
+
+    Devuelve None si no hay caché, si está obsoleta o si pyarrow no está instalado.
+    """
+    if not _pyarrow_disponible() or not cache_vigente(ruta_origen, nombre, dir_cache):
+        return None
+
+    from pyarrow import feather
+
+    ruta_datos, _ = _rutas_cache(ruta_origen, nombre, dir_cache)
+    tabla = feather.read_table(ruta_datos, memory_map=True)
+    return tabla.to_pandas(split_blocks=True)
+
+
+def escribir_cache(df, ruta_origen, nombre=None, dir_cache=DIR_CACHE):
+    """
+    Guarda df en formato Feather sin comprimir (mapeable en memoria) junto con
+    la huella de ruta_origen. Devuelve la ruta escrita o None si no hay pyarrow.
+    """
+    if not _pyarrow_disponible():
+        return None
+
+    from pyarrow import feather
+
+    ruta_datos, ruta_meta = _rutas_cache(ruta_origen, nombre, dir_cache)
+    ruta_datos.parent.mkdir(parents=True, exist_ok=True)
+
+    # Feather exige un índice por defecto
+    if not isinstance(df.index, pd.RangeIndex) or df.index.start != 0 or df.index.step != 1:
+        df = df.reset_index(drop=True)
+
+    # Se escribe primero en un temporal para no dejar cachés a medias
+    ruta_tmp = ruta_datos.with_suffix('.feather.tmp')
+    feather.write_feather(df, ruta_tmp, compression='uncompressed')
+    ruta_tmp.replace(ruta_datos)
+    ruta_meta.write_text(json.dumps(huella_fichero(ruta_origen)), encoding='utf-8')
+    return ruta_datos
@@ -1,14 +1,63 @@
+import io
 from pathlib import Path
 import pandas as pd
 
-def cargar_datos():
-    try:
-        
-        df = pd.read_csv('data/avocado.csv')
-    except FileNotFoundError:
-        
-        csv_path = Path(__file__).resolve().parent.parent / 'data' / 'avocado.csv'
-        df = pd.read_csv(csv_path)
+from src.cache_datos import leer_cache, escribir_cache
+from src.instrumentacion import instrumentar
+
+# Tamaño de bloque por defecto para la carga por bloques (filas por bloque)
+TAMANO_BLOQUE = 100_000
+
+FORMATO_FECHA = "%Y-%m-%d"
+
+# Nombre de la caché columnar del dataset limpio
+NOMBRE_CACHE_LIMPIO = 'avocado_limpio'
+
+# Salida limpia por defecto: dataset Parquet particionado (ver dataset_particionado)
+RUTA_LIMPIO = 'data/avocado_limpio'
+
+# Esquema explícito aplicado al parsear el CSV (evita re-tipar en pasadas extra)
+ESQUEMA_TIPOS = {
+    "AveragePrice": "float32",
+    "Total Volume": "float32",
+    "4046": "float32",
+    "4225": "float32",
+    "4770": "float32",
+    "Total Bags": "float32",
+    "Small Bags": "float32",
+    "Large Bags": "float32",
+    "XLarge Bags": "float32",
+    "type": pd.CategoricalDtype(["conventional", "organic"]),
+    "region": "category",
+    "year": "int16",
+}
+
+
+def obtener_ruta_csv(ruta=None):
+    """Devuelve la ruta del CSV: la indicada, la relativa al cwd o la del repositorio."""
+    if ruta is not None:
+        return Path(ruta)
+    ruta_local = Path('data/avocado.csv')
+    if ruta_local.exists():
+        return ruta_local
+    return Path(__file__).resolve().parent.parent / 'data' / 'avocado.csv'
+
+
+@instrumentar()
+def cargar_datos(usar_cache=True, ruta=None):
+    """
+    Carga data/avocado.csv (u otro CSV con 'ruta') con los tipos corregidos.
+
+    Con usar_cache=True se lee la caché columnar (Feather) si el CSV no ha
+    cambiado desde la última carga y, si no, se parsea y se regenera la caché.
+    """
+    csv_path = obtener_ruta_csv(ruta)
+    if usar_cache:
+        df = leer_cache(csv_path)
+        if df is not None:
+            return df
+
+    df = pd.read_csv(csv_path)
     
     columnas_numericas = [
         "AveragePrice", "Total Volume", "4046", "4225", "4770",
@@ -20,8 +69,133 @@ def cargar_datos():
 
     if "Date" in df.columns:
         df["Date"] = pd.to_datetime(df["Date"], errors='coerce')
-    
+
+    if usar_cache:
+        escribir_cache(df, csv_path)
+
     return df
 
 
+def _origen_cache_limpio(ruta_limpio):
+    """
+    Fichero cuya huella identifica la versión de un dataset limpio: el
+    manifiesto si está particionado (se reescribe en cada escritura o anexado)
+    o el propio CSV. None si no existe.
+    """
+    from src.dataset_particionado import es_dataset_particionado, ARCHIVO_MANIFIESTO
+
+    ruta = Path(ruta_limpio)
+    if es_dataset_particionado(ruta):
+        return ruta / ARCHIVO_MANIFIESTO
+    if not ruta.exists() and ruta.with_suffix('.csv').exists():
+        ruta = ruta.with_suffix('.csv')
+    return ruta if ruta.is_file() else None
+
+
+def escribir_cache_limpio(df, ruta_limpio=RUTA_LIMPIO):
+    """Guarda la caché columnar de df asociada a la versión actual de ruta_limpio."""
+    origen = _origen_cache_limpio(ruta_limpio)
+    return None if origen is None else escribir_cache(df, origen, nombre=NOMBRE_CACHE_LIMPIO)
+
+
+def cargar_datos_limpios(ruta_limpio=RUTA_LIMPIO, columnas=None, filtros=None):
+    """
+    Carga el dataset limpio exportado por main.py.
+
+    Sin columnas ni filtros se usa la caché columnar si corresponde a la
+    versión actual de ruta_limpio (huella de su manifiesto o de su CSV, así
+    que cualquier reescritura o anexado la invalida). Si ruta_limpio es un
+    dataset particionado, solo se leen las particiones y columnas necesarias
+    (ver leer_dataset_particionado para el formato de 'filtros'); si es un
+    CSV, se lee entero.
+    """
+    origen = _origen_cache_limpio(ruta_limpio)
+    if columnas is None and not filtros and origen is not None:
+        df = leer_cache(origen, nombre=NOMBRE_CACHE_LIMPIO)
+        if df is not None:
+            return df
+
+    from src.dataset_particionado import es_dataset_particionado, leer_dataset_particionado
+
+    ruta_limpio = Path(ruta_limpio)
+    if es_dataset_particionado(ruta_limpio):
+        return leer_dataset_particionado(ruta_limpio, columnas, filtros)
+    if origen is not None:
+        ruta_limpio = origen
+    df = pd.read_csv(ruta_limpio, parse_dates=['Date'], usecols=columnas)
+    if filtros:
+        raise ValueError("Los filtros solo se admiten sobre un dataset particionado")
+    return df
+
+
+def cargar_datos_por_bloques(ruta=None, tamano_bloque=TAMANO_BLOQUE, columnas=None, esquema=None,
+                             desde_byte=None, hasta_byte=None):
+    """
+    Carga el CSV en bloques de tamaño acotado aplicando el esquema al parsear.
+
+    Parámetros:
+    - ruta: Ruta del CSV (por defecto data/avocado.csv)
+    - tamano_bloque: Número máximo de filas por bloque
+    - columnas: Subconjunto de columnas a leer (None = todas)
+    - esquema: Tipos que sustituyen a los de ESQUEMA_TIPOS (p. ej. float64 si
+      hace falta la precisión completa)
+    - desde_byte, hasta_byte: Rango de bytes (inicio de una fila y fin de otra)
+      que se parsea en lugar del fichero completo; las columnas se toman de la
+      cabecera. Sirve para leer solo las filas añadidas al final del CSV
+
+    Devuelve un generador de DataFrames ya tipados (float32, category, int16 y
+    Date como datetime), de modo que nunca conviven en memoria el texto crudo
+    y su copia re-tipada del fichero completo.
+    """
+    ruta = obtener_ruta_csv(ruta)
+    nombres = cabecera = pd.read_csv(ruta, nrows=0).columns
+    if columnas is not None:
+        columnas = [col for col in cabecera if col in columnas]
+        cabecera = pd.Index(columnas)
+
+    tipos = {**ESQUEMA_TIPOS, **(esquema or {})}
+    tipos = {col: tipo for col, tipo in tipos.items() if col in cabecera}
+
+    if desde_byte is None:
+        lector = pd.read_csv(ruta, usecols=columnas, dtype=tipos, chunksize=tamano_bloque)
+    else:
+        with open(ruta, 'rb') as f:
+            f.seek(desde_byte)
+            contenido = f.read(None if hasta_byte is None else hasta_byte - desde_byte)
+        if not contenido.strip():
+            return
+        lector = pd.read_csv(io.BytesIO(contenido), header=None, names=list(nombres), usecols=columnas,
+                             dtype=tipos, chunksize=tamano_bloque)
+    with lector:
+        for bloque in lector:
+            if "Date" in bloque.columns:
+                bloque["Date"] = pd.to_datetime(bloque["Date"], format=FORMATO_FECHA, errors='coerce')
+            yield bloque
+
+
+def concatenar_bloques(bloques):
+    """
+    Une bloques tipados conservando las columnas categóricas.
+
+    Las categorías de 'region' se infieren por bloque, así que se unifican
+    con union_categoricals en lugar de dejar que pd.concat las degrade a object.
+    """
+    bloques = list(bloques)
+    if not bloques:
+        return pd.DataFrame()
+
+    categoricas = [col for col in bloques[0].columns
+                   if isinstance(bloques[0][col].dtype, pd.CategoricalDtype)]
+    unidas = {
+        col: pd.api.types.union_categoricals([b[col] for b in bloques])
+        for col in categoricas
+    }
+    df = pd.concat(bloques, ignore_index=True)
+    for col, valores in unidas.items():
+        df[col] = pd.Categorical(valores)
+    return df
+
 
+def cargar_datos_tipados(ruta=None, tamano_bloque=TAMANO_BLOQUE, columnas=None):
+    """Carga el CSV completo aplicando el esquema bloque a bloque."""
+    return concatenar_bloques(cargar_datos_por_bloques(ruta, tamano_bloque, columnas))
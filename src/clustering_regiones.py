@@ -0,0 +1,256 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.cache_datos import DIR_CACHE
+from src.carga_datos import obtener_ruta_csv
+
+# sklearn y joblib se importan dentro de las funciones que los usan
+
+COLUMNAS_PERFIL = ['AveragePrice', 'Total Volume']
+CANDIDATOS_K = range(2, 9)
+
+# Filas de la muestra sobre la que se puntúa cada K (la silueta es O(n²))
+FILAS_MUESTRA_K = 5000
+# A partir de estas filas la PCA se ajusta por lotes (IncrementalPCA)
+UMBRAL_PCA_INCREMENTAL = 200_000
+TAMANO_LOTE = 4096
+COMPONENTES_PCA = 10
+
+SUBCARPETA_MODELOS = 'modelos'
+
+
+# ==============================================================================
+# I. VECTORES DE CARACTERÍSTICAS POR SERIE
+# ==============================================================================
+def _array_semanal(df, columnas, claves):
+    """
+    Array denso (series, semanas, columnas) con la media semanal de cada serie.
+
+    Los volúmenes pasan a escala log1p; los huecos se rellenan con la semana
+    anterior (o la siguiente al principio de la serie).
+    """
+    medias = df.groupby(claves + ['Date'], observed=True)[columnas].mean()
+    tabla = medias.unstack('Date').sort_index(axis=1)
+    semanas = tabla.columns.get_level_values('Date').unique()
+
+    bloques = []
+    for col in columnas:
+        bloque = tabla[col].ffill(axis=1).bfill(axis=1).to_numpy(dtype=np.float64)
+        bloques.append(np.log1p(bloque) if 'Volume' in col or 'Bags' in col else bloque)
+    return np.stack(bloques, axis=-1), tabla.index, semanas
+
+
+def perfiles_region(df, columnas=COLUMNAS_PERFIL, por_tipo=False):
+    """
+    Un vector por región (o por región × tipo): la serie semanal completa de
+    cada columna, concatenada. Devuelve (X, indice).
+    """
+    claves = ['region'] + (['type'] if por_tipo else [])
+    array, indice, _ = _array_semanal(df, columnas, claves)
+    return array.transpose(0, 2, 1).reshape(len(indice), -1), indice
+
+
+def perfiles_semanales(df, columnas=COLUMNAS_PERFIL, ventana=8):
+    """
+    Un vector por región × tipo × semana con las últimas 'ventana' semanas de
+    cada columna (ventana deslizante sobre el array denso, sin bucles por serie).
+
+    Devuelve (X, claves) con claves = DataFrame (region, type, Date) de la
+    semana en la que termina cada ventana.
+    """
+    array, indice, semanas = _array_semanal(df, columnas, ['region', 'type'])
+    n_series, n_semanas, n_columnas = array.shape
+    if n_semanas < ventana:
+        raise ValueError(f"Hay {n_semanas} semanas, menos que la ventana ({ventana})")
+
+    # (series, posiciones, columnas, ventana) -> (series · posiciones, columnas · ventana)
+    ventanas = np.lib.stride_tricks.sliding_window_view(array, ventana, axis=1)
+    n_posiciones = ventanas.shape[1]
+    X = ventanas.reshape(n_series * n_posiciones, n_columnas * ventana)
+
+    claves = indice.to_frame(index=False).loc[np.repeat(np.arange(n_series), n_posiciones)]
+    claves = claves.reset_index(drop=True)
+    claves['Date'] = np.tile(np.asarray(semanas[ventana - 1:]), n_series)
+    return X, claves
+
+
+# ==============================================================================
+# II. ELECCIÓN DE K EN PARALELO
+# ==============================================================================
+_MUESTRA_PROCESO = None
+
+
+def _inicializar_proceso(muestra):
+    """Recibe la muestra una sola vez por proceso en lugar de una vez por K."""
+    global _MUESTRA_PROCESO
+    _MUESTRA_PROCESO = muestra
+
+
+def _evaluar_k(k, semilla, muestra=None):
+    from sklearn.cluster import MiniBatchKMeans
+    from sklearn.metrics import silhouette_score
+
+    muestra = _MUESTRA_PROCESO if muestra is None else muestra
+    modelo = MiniBatchKMeans(n_clusters=k, batch_size=TAMANO_LOTE, n_init=3, random_state=semilla)
+    etiquetas = modelo.fit_predict(muestra)
+    silueta = silhouette_score(muestra, etiquetas) if len(set(etiquetas)) > 1 else -1.0
+    return k, float(modelo.inertia_), float(silueta)
+
+
+def _codo(puntuaciones):
+    """K del codo de la curva de inercia: máxima segunda diferencia de la inercia normalizada."""
+    inercia = puntuaciones['inercia'].to_numpy()
+    if len(inercia) < 3:
+        return int(puntuaciones.index[0])
+    normalizada = (inercia - inercia.min()) / (np.ptp(inercia) or 1.0)
+    segunda = normalizada[:-2] - 2 * normalizada[1:-1] + normalizada[2:]
+    return int(puntuaciones.index[1 + int(np.argmax(segunda))])
+
+
+def elegir_k(X, candidatos=CANDIDATOS_K, criterio='silueta', filas_muestra=FILAS_MUESTRA_K,
+             procesos=None, semilla=42):
+    """
+    Elige el número de clusters puntuando cada candidato sobre una muestra.
+
+    Parámetros:
+    - X: Matriz (filas, características) ya escalada
+    - candidatos: Valores de K a probar
+    - criterio: 'silueta' (máxima silueta) o 'inercia' (codo de la curva)
+    - filas_muestra: Tamaño de la muestra aleatoria sobre la que se puntúa
+    - procesos: Procesos del pool (None = núcleos disponibles, 1 = en este proceso)
+
+    Devuelve (k, puntuaciones) con puntuaciones = DataFrame indexado por K.
+    """
+    if criterio not in ('silueta', 'inercia'):
+        raise ValueError("criterio debe ser 'silueta' o 'inercia'")
+
+    rng = np.random.default_rng(semilla)
+    muestra = X if len(X) <= filas_muestra else X[rng.choice(len(X), filas_muestra, replace=False)]
+    candidatos = [k for k in candidatos if 2 <= k < len(muestra)]
+    if not candidatos:
+        raise ValueError(f"No hay valores de K válidos para {len(muestra)} filas")
+
+    procesos = min(procesos or os.cpu_count() or 1, len(candidatos))
+    if procesos == 1:
+        resultados = [_evaluar_k(k, semilla, muestra) for k in candidatos]
+    else:
+        with ProcessPoolExecutor(max_workers=procesos, initializer=_inicializar_proceso,
+                                 initargs=(muestra,)) as pool:
+            resultados = list(pool.map(_evaluar_k, candidatos, [semilla] * len(candidatos)))
+
+    puntuaciones = pd.DataFrame(resultados, columns=['k', 'inercia', 'silueta']).set_index('k')
+    k = int(puntuaciones['silueta'].idxmax()) if criterio == 'silueta' else _codo(puntuaciones)
+    return k, puntuaciones
+
+
+# ==============================================================================
+# III. MODELO: ESCALADO + PCA + MINIBATCHKMEANS
+# ==============================================================================
+class ClusteringRegiones:
+    """
+    Escalado, reducción con PCA y MiniBatchKMeans con K automático.
+
+    La PCA es aleatorizada (svd_solver='randomized') y, con más de
+    UMBRAL_PCA_INCREMENTAL filas, incremental por lotes. Los dos primeros
+    componentes sirven además para la visualización 2D.
+
+    Parámetros:
+    - n_clusters: K fijo; None lo elige elegir_k() entre 'candidatos_k'
+    - componentes: Componentes de la PCA (como mucho el número de características)
+    - criterio: Criterio de elegir_k ('silueta' o 'inercia')
+    - procesos: Procesos para evaluar los candidatos de K
+    """
+
+    def __init__(self, n_clusters=None, componentes=COMPONENTES_PCA, candidatos_k=CANDIDATOS_K,
+                 criterio='silueta', procesos=None, semilla=42):
+        self.n_clusters = n_clusters
+        self.componentes = componentes
+        self.candidatos_k = candidatos_k
+        self.criterio = criterio
+        self.procesos = procesos
+        self.semilla = semilla
+        self.puntuaciones_k = None
+
+    def _crear_pca(self, n_filas, n_caracteristicas):
+        from sklearn.decomposition import PCA, IncrementalPCA
+
+        componentes = min(self.componentes, n_caracteristicas, n_filas)
+        if n_filas > UMBRAL_PCA_INCREMENTAL:
+            return IncrementalPCA(n_components=componentes, batch_size=max(TAMANO_LOTE, componentes))
+        # Con pocas características la SVD completa es exacta y igual de rápida
+        solver = 'randomized' if componentes < min(n_filas, n_caracteristicas) else 'full'
+        return PCA(n_components=componentes, svd_solver=solver, random_state=self.semilla)
+
+    def fit(self, X):
+        from sklearn.preprocessing import StandardScaler
+        from sklearn.cluster import MiniBatchKMeans
+
+        X = np.asarray(X, dtype=np.float64)
+        self.scaler = StandardScaler().fit(X)
+        X_escalado = self.scaler.transform(X)
+        self.pca = self._crear_pca(*X_escalado.shape).fit(X_escalado)
+        X_reducido = self.pca.transform(X_escalado)
+
+        k = self.n_clusters
+        if k is None:
+            k, self.puntuaciones_k = elegir_k(X_reducido, self.candidatos_k, self.criterio,
+                                              procesos=self.procesos, semilla=self.semilla)
+        self.kmeans = MiniBatchKMeans(n_clusters=k, batch_size=TAMANO_LOTE, n_init=3,
+                                      random_state=self.semilla).fit(X_reducido)
+        self.k_ = k
+        self.etiquetas_ = self.kmeans.labels_
+        return self
+
+    def transform(self, X):
+        """Proyección en los componentes de la PCA."""
+        return self.pca.transform(self.scaler.transform(np.asarray(X, dtype=np.float64)))
+
+    def predict(self, X):
+        return self.kmeans.predict(self.transform(X))
+
+    @property
+    def varianza_explicada(self):
+        return self.pca.explained_variance_ratio_
+
+
+# ==============================================================================
+# IV. CACHÉ DE MODELOS AJUSTADOS
+# ==============================================================================
+def _dir_modelos(dir_cache=None):
+    if dir_cache is not None:
+        return Path(dir_cache)
+    return obtener_ruta_csv().parent / DIR_CACHE / SUBCARPETA_MODELOS
+
+
+def ajustar_clustering(X, dir_cache=None, usar_cache=True, **parametros):
+    """
+    Devuelve un ClusteringRegiones ajustado sobre X, reutilizando el guardado
+    en disco si ya se ajustó con los mismos datos y parámetros.
+
+    La clave es el sha256 de X y de los parámetros; los modelos se guardan con
+    joblib en data/.cache/modelos/ (o en 'dir_cache').
+    """
+    import joblib
+
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    # El número de procesos no cambia el modelo resultante
+    clave = {k: str(v) for k, v in sorted(parametros.items()) if k != 'procesos'}
+    sha = hashlib.sha256()
+    sha.update(json.dumps([X.shape, clave]).encode('utf-8'))
+    sha.update(X.tobytes())
+    ruta = _dir_modelos(dir_cache) / f'clustering_{sha.hexdigest()[:16]}.joblib'
+
+    if usar_cache and ruta.exists():
+        return joblib.load(ruta)
+
+    modelo = ClusteringRegiones(**parametros).fit(X)
+    if usar_cache:
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(modelo, ruta)
+    return modelo
@@ -0,0 +1,208 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from src.carga_datos import cargar_datos_limpios, RUTA_LIMPIO
+
+CLAVES_CONSULTA = ['region', 'type']
+COLUMNA_FECHA = 'Date'
+COLUMNAS_SUMA = ['AveragePrice', 'Total Volume', 'Total Bags', 'Small Bags', 'Large Bags',
+                 'XLarge Bags', '4046', '4225', '4770']
+
+# Periodos admitidos por rollup() y su frecuencia de pandas
+FRECUENCIAS = {'semana': None, 'mes': 'M', 'anio': 'Y'}
+
+# Índices ya construidos, por DataFrame (id -> (referencia débil, índice))
+_INDICES = {}
+
+
+# ==============================================================================
+# I. ÍNDICE ORDENADO POR (REGIÓN, TIPO, FECHA)
+# ==============================================================================
+class IndiceConsultas:
+    """
+    Capa de consultas sobre el dataset limpio ordenado por (region, type, Date).
+
+    Al construirlo, los datos se ordenan una vez y cada serie región × tipo
+    queda como un rango contiguo de filas con las fechas ordenadas: una
+    consulta se resuelve con un diccionario (región, tipo) → rango y una
+    búsqueda binaria sobre las fechas, sin recorrer el DataFrame con máscaras.
+
+    Las columnas de COLUMNAS_SUMA se precalculan además como sumas acumuladas
+    por serie, así que la suma o la media de cualquier rango de fechas cuesta
+    dos búsquedas binarias y una resta.
+
+    Parámetros:
+    - df: Dataset limpio (no debe modificarse después de indexarlo)
+    - columnas_suma: Columnas con sumas acumuladas (por defecto las de COLUMNAS_SUMA presentes)
+    """
+
+    def __init__(self, df, columnas_suma=None):
+        claves = CLAVES_CONSULTA + [COLUMNA_FECHA]
+        faltan = [c for c in claves if c not in df.columns]
+        if faltan:
+            raise KeyError(f"Faltan las columnas {faltan} para indexar")
+
+        # Orden estable por los códigos de región y tipo y, dentro de cada serie, por fecha
+        categorias = [pd.Categorical(df[c]) for c in CLAVES_CONSULTA]
+        fechas = df[COLUMNA_FECHA].to_numpy().astype('datetime64[ns]').view('int64')
+        orden = np.lexsort([fechas] + [c.codes for c in reversed(categorias)])
+        self.datos = df.iloc[orden]
+        self._fechas = fechas[orden]
+
+        codigos = np.column_stack([c.codes[orden] for c in categorias])
+        cambios = np.flatnonzero(np.any(codigos[1:] != codigos[:-1], axis=1)) + 1
+        inicios = np.concatenate([[0], cambios]).astype(np.int64)
+        fines = np.append(inicios[1:], len(orden))
+        nombres = zip(*[c.categories[codigos[inicios, i]] for i, c in enumerate(categorias)])
+        # (región, tipo) -> (inicio, fin, número de serie)
+        self.rangos = {
+            clave: (int(inicio), int(fin), posicion)
+            for posicion, (clave, inicio, fin) in enumerate(zip(nombres, inicios, fines))
+        }
+
+        # Sumas acumuladas por serie; cada serie empieza con una fila de ceros para
+        # no arrastrar el redondeo de las anteriores
+        if columnas_suma is None:
+            columnas_suma = [c for c in COLUMNAS_SUMA if c in df.columns]
+        self.columnas_suma = list(columnas_suma)
+        valores = self.datos[self.columnas_suma].to_numpy(dtype=np.float64)
+        self._acumuladas = np.zeros((len(valores) + len(inicios), len(self.columnas_suma)))
+        for posicion, (inicio, fin) in enumerate(zip(inicios, fines)):
+            np.cumsum(valores[inicio:fin], axis=0,
+                      out=self._acumuladas[inicio + posicion + 1:fin + posicion + 1])
+        self._rollups = {}
+
+    def __len__(self):
+        return len(self.datos)
+
+    @property
+    def indice(self):
+        """MultiIndex ordenado (region, type, Date) de las filas indexadas."""
+        return pd.MultiIndex.from_frame(self.datos[CLAVES_CONSULTA + [COLUMNA_FECHA]])
+
+    # ------------------------------------------------------------------
+    # Búsquedas
+    # ------------------------------------------------------------------
+    def _series(self, region, tipo):
+        """Claves (región, tipo) que cumplen los filtros (None = todas; valor o lista)."""
+        if region is not None and tipo is not None and isinstance(region, str) and isinstance(tipo, str):
+            return [(region, tipo)] if (region, tipo) in self.rangos else []
+        regiones = None if region is None else {region} if isinstance(region, str) else set(region)
+        tipos = None if tipo is None else {tipo} if isinstance(tipo, str) else set(tipo)
+        return [clave for clave in self.rangos
+                if (regiones is None or clave[0] in regiones) and (tipos is None or clave[1] in tipos)]
+
+    def _rango(self, clave, desde, hasta):
+        """Filas [a, b) de la serie 'clave' con fecha entre desde y hasta (incluidas)."""
+        inicio, fin, _ = self.rangos[clave]
+        fechas = self._fechas[inicio:fin]
+        a = 0 if desde is None else int(np.searchsorted(fechas, pd.Timestamp(desde).value, 'left'))
+        b = len(fechas) if hasta is None else int(np.searchsorted(fechas, pd.Timestamp(hasta).value, 'right'))
+        return inicio + a, inicio + max(a, b)
+
+    def consultar(self, region=None, tipo=None, desde=None, hasta=None, columnas=None):
+        """
+        Filas de las regiones y tipos indicados con fecha entre 'desde' y 'hasta' (incluidas).
+
+        region y tipo admiten un valor, una lista o None (todos). El resultado
+        está ordenado por (region, type, Date) y conserva el índice original.
+        """
+        datos = self.datos if columnas is None else self.datos[columnas]
+        tramos = [self._rango(clave, desde, hasta) for clave in self._series(region, tipo)]
+        if len(tramos) == 1:
+            return datos.iloc[tramos[0][0]:tramos[0][1]]
+        if not tramos:
+            return datos.iloc[:0]
+        return datos.iloc[np.concatenate([np.arange(a, b) for a, b in tramos])]
+
+    def punto(self, region, tipo, fecha):
+        """Fila de una región, tipo y fecha concretos (KeyError si no existe)."""
+        if (region, tipo) not in self.rangos:
+            raise KeyError((region, tipo))
+        a, b = self._rango((region, tipo), fecha, fecha)
+        if a == b:
+            raise KeyError((region, tipo, fecha))
+        return self.datos.iloc[a]
+
+    def agregar(self, region=None, tipo=None, desde=None, hasta=None, estadistico='suma'):
+        """
+        Suma o media de las columnas de suma por serie región × tipo en un rango de fechas.
+
+        Se calcula con las sumas acumuladas, sin recorrer las filas. Devuelve un
+        DataFrame indexado por (region, type) con la columna 'filas' y una
+        columna por variable.
+        """
+        if estadistico not in ('suma', 'media'):
+            raise ValueError("estadistico debe ser 'suma' o 'media'")
+
+        claves = self._series(region, tipo)
+        filas = np.zeros(len(claves), dtype=np.int64)
+        sumas = np.zeros((len(claves), len(self.columnas_suma)))
+        for i, clave in enumerate(claves):
+            a, b = self._rango(clave, desde, hasta)
+            # En la tabla acumulada la serie n está desplazada n filas (los ceros de las anteriores)
+            desplazamiento = self.rangos[clave][2]
+            sumas[i] = self._acumuladas[b + desplazamiento] - self._acumuladas[a + desplazamiento]
+            filas[i] = b - a
+
+        if estadistico == 'media':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                sumas = sumas / filas[:, None]
+        indice = pd.MultiIndex.from_tuples(claves, names=CLAVES_CONSULTA)
+        resultado = pd.DataFrame(sumas, index=indice, columns=self.columnas_suma)
+        resultado.insert(0, 'filas', filas)
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Agregados precalculados
+    # ------------------------------------------------------------------
+    def rollup(self, niveles=('region', 'type'), periodo='semana'):
+        """
+        Sumas y filas de las columnas de suma por los niveles y el periodo indicados.
+
+        Parámetros:
+        - niveles: Claves que se conservan (p. ej. ('type',) suma todas las regiones)
+        - periodo: 'semana', 'mes' o 'anio'
+
+        El resultado (indexado por niveles + Date, ordenado) se calcula una vez
+        y queda en caché; sus filas se consultan con .loc sobre el índice
+        ordenado, también por búsqueda binaria.
+        """
+        if periodo not in FRECUENCIAS:
+            raise ValueError(f"periodo debe ser uno de {list(FRECUENCIAS)}")
+        clave = (tuple(niveles), periodo)
+        if clave not in self._rollups:
+            fechas = self.datos[COLUMNA_FECHA]
+            if FRECUENCIAS[periodo] is not None:
+                fechas = fechas.dt.to_period(FRECUENCIAS[periodo]).dt.start_time
+            grupos = [self.datos[n] for n in niveles] + [fechas]
+            agrupado = self.datos[self.columnas_suma].groupby(grupos, observed=True, sort=True)
+            tabla = agrupado.sum()
+            tabla.insert(0, 'filas', agrupado.size())
+            self._rollups[clave] = tabla
+        return self._rollups[clave]
+
+
+def indice_consultas(df, columnas_suma=None):
+    """
+    Devuelve el IndiceConsultas de df, construyéndolo solo la primera vez.
+
+    Se reutiliza mientras el mismo objeto DataFrame siga vivo, así que varios
+    consumidores del dataset limpio comparten el índice. El DataFrame no debe
+    modificarse en el sitio después de indexarlo.
+    """
+    referencia, indice = _INDICES.get(id(df), (None, None))
+    if referencia is not None and referencia() is df and (columnas_suma is None
+                                                          or indice.columnas_suma == list(columnas_suma)):
+        return indice
+    indice = IndiceConsultas(df, columnas_suma)
+    clave = id(df)
+    _INDICES[clave] = (weakref.ref(df, lambda _: _INDICES.pop(clave, None)), indice)
+    return indice
+
+
+def cargar_indice_limpio(ruta_limpio=RUTA_LIMPIO):
+    """Carga el dataset limpio (caché columnar, dataset particionado o CSV) y lo indexa."""
+    return indice_consultas(cargar_datos_limpios(ruta_limpio))
@@ -0,0 +1,251 @@
+import weakref
+
+import numpy as np
+import pandas as pd
+
+METODOS = ('pearson', 'spearman', 'kendall')
+
+# Columnas derivadas en la limpieza que repiten una original (derivada -> original)
+COLUMNAS_DERIVADAS = {'total_bags': 'Total Bags', 'total_volume': 'Total Volume'}
+
+# Servicios ya construidos, por DataFrame (id -> (referencia débil, servicio))
+_SERVICIOS = {}
+
+
+def columnas_numericas(df):
+    """Columnas numéricas (sin booleanas) en el orden del DataFrame."""
+    return [c for c in df.columns
+            if pd.api.types.is_numeric_dtype(df[c]) and not pd.api.types.is_bool_dtype(df[c])]
+
+
+def sin_derivadas(columnas):
+    """Quita las columnas derivadas cuya columna original también está en la lista."""
+    columnas = list(columnas)
+    return [c for c in columnas if COLUMNAS_DERIVADAS.get(c) not in columnas]
+
+
+# ==============================================================================
+# I. CO-MOMENTOS FUSIONABLES (PEARSON POR BLOQUES)
+# ==============================================================================
+class MotorCorrelaciones:
+    """
+    Correlación de Pearson acumulada por bloques con co-momentos fusionables.
+
+    Para cada par de columnas (i, j) se guardan las filas con ambas no nulas,
+    la media de i en esas filas, la suma de cuadrados centrada de i y el
+    co-momento centrado de (i, j). Cada bloque se resume con unos pocos
+    productos de matrices (sobre los valores desplazados a la media del
+    bloque, para no perder precisión) y se fusiona con la fórmula de Chan, así
+    que añadir semanas nuevas no obliga a releer el histórico y dos motores de
+    bloques distintos se combinan con fusionar().
+
+    Los nulos se excluyen por pares, como en DataFrame.corr().
+
+    Parámetros:
+    - columnas: Columnas numéricas que se correlacionan
+    """
+
+    def __init__(self, columnas):
+        self.columnas = list(columnas)
+        k = len(self.columnas)
+        self.n = np.zeros((k, k))
+        self.media = np.zeros((k, k))
+        self.m2 = np.zeros((k, k))
+        self.comomento = np.zeros((k, k))
+        self.filas = 0
+
+    def actualizar(self, bloque):
+        """Añade un bloque (DataFrame con las columnas del motor o matriz de valores)."""
+        if isinstance(bloque, pd.DataFrame):
+            bloque = bloque[self.columnas].to_numpy(dtype=np.float64)
+        valores = np.asarray(bloque, dtype=np.float64)
+        if len(valores) == 0:
+            return self
+
+        validos = ~np.isnan(valores)
+        pesos = validos.astype(np.float64)
+        conteos = pesos.sum(axis=0)
+        desplazamiento = np.divide(np.nansum(valores, axis=0), conteos,
+                                   out=np.zeros(len(self.columnas)), where=conteos > 0)
+        x = np.where(validos, valores - desplazamiento, 0.0)
+
+        # sumas[i, j]: suma de la columna i en las filas donde i y j son válidas
+        k = len(self.columnas)
+        if validos.all():
+            # Sin nulos todos los pares usan todas las filas
+            n = np.full((k, k), float(len(valores)))
+            sumas = np.repeat(x.sum(axis=0)[:, None], k, axis=1)
+            cuadrados = np.repeat((x * x).sum(axis=0)[:, None], k, axis=1)
+        else:
+            n = pesos.T @ pesos
+            sumas = x.T @ pesos
+            cuadrados = (x * x).T @ pesos
+        media = np.divide(sumas, n, out=np.zeros_like(n), where=n > 0)
+        m2 = cuadrados - sumas * media
+        comomento = x.T @ x - sumas * media.T
+
+        self._fusionar(n, media + desplazamiento[:, None], m2, comomento)
+        self.filas += len(valores)
+        return self
+
+    def _fusionar(self, n_b, media_b, m2_b, comomento_b):
+        n = self.n + n_b
+        delta = media_b - self.media
+        peso = np.divide(self.n * n_b, n, out=np.zeros_like(n), where=n > 0)
+        self.media = self.media + np.divide(delta * n_b, n, out=np.zeros_like(n), where=n > 0)
+        self.m2 = self.m2 + m2_b + delta ** 2 * peso
+        # El desplazamiento de la media de j en el par (i, j) es delta[j, i]
+        self.comomento = self.comomento + comomento_b + delta * delta.T * peso
+        self.n = n
+
+    def fusionar(self, otro):
+        """Fusiona otro motor con las mismas columnas (p. ej. de otro fichero o proceso)."""
+        if otro.columnas != self.columnas:
+            raise ValueError("Solo se pueden fusionar motores con las mismas columnas")
+        self._fusionar(otro.n, otro.media, otro.m2, otro.comomento)
+        self.filas += otro.filas
+        return self
+
+    def matriz(self, columnas=None, min_periodos=1):
+        """Matriz de correlación (DataFrame) de todas las columnas o de un subconjunto."""
+        divisor = np.sqrt(self.m2 * self.m2.T)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            correlacion = np.where((self.n >= min_periodos) & (divisor > 0), self.comomento / divisor, np.nan)
+        resultado = pd.DataFrame(correlacion, index=self.columnas, columns=self.columnas)
+        if columnas is not None:
+            columnas = [c for c in columnas if c in self.columnas]
+            resultado = resultado.loc[columnas, columnas]
+        return resultado
+
+    # ------------------------------------------------------------------
+    # Persistencia (estado JSON, p. ej. en pipeline_incremental)
+    # ------------------------------------------------------------------
+    def estado(self):
+        """Diccionario serializable en JSON con los co-momentos acumulados."""
+        return {
+            'columnas': self.columnas,
+            'filas': self.filas,
+            'n': self.n.tolist(),
+            'media': self.media.tolist(),
+            'm2': self.m2.tolist(),
+            'comomento': self.comomento.tolist(),
+        }
+
+    @classmethod
+    def desde_estado(cls, estado):
+        motor = cls(estado['columnas'])
+        motor.filas = estado['filas']
+        for clave in ('n', 'media', 'm2', 'comomento'):
+            setattr(motor, clave, np.array(estado[clave], dtype=np.float64))
+        return motor
+
+
+def correlacion_por_bloques(bloques, columnas=None):
+    """
+    MotorCorrelaciones de un iterable de bloques (p. ej. cargar_datos_por_bloques()).
+
+    Sin 'columnas' se usan las numéricas del primer bloque. Solo se mantiene
+    un bloque en memoria a la vez.
+    """
+    motor = None
+    for bloque in bloques:
+        if motor is None:
+            motor = MotorCorrelaciones(columnas or columnas_numericas(bloque))
+        motor.actualizar(bloque)
+    return motor if motor is not None else MotorCorrelaciones(columnas or [])
+
+
+# ==============================================================================
+# II. SERVICIO DE CORRELACIONES POR DATAFRAME
+# ==============================================================================
+class ServicioCorrelaciones:
+    """
+    Matrices de correlación de un DataFrame, calculadas una vez por método.
+
+    Las columnas numéricas se convierten una sola vez a una matriz float64 y
+    cada método calcula la matriz completa la primera vez que se pide; los
+    heatmaps que usan subconjuntos de columnas reciben un corte de esa matriz
+    en lugar de recalcularla.
+
+    Métodos:
+    - pearson: co-momentos de MotorCorrelaciones (igual que DataFrame.corr())
+    - spearman: Pearson sobre los rangos (promedio en empates); con nulos, los
+      rangos de cada par se calculan solo sobre sus filas comunes (como
+      DataFrame.corr(method='spearman'))
+    - kendall: DataFrame.corr(method='kendall') sobre la matriz float64
+
+    Parámetros:
+    - df: DataFrame con los datos (no debe modificarse después)
+    - columnas: Columnas disponibles (por defecto todas las numéricas)
+    """
+
+    def __init__(self, df, columnas=None):
+        self.columnas = list(columnas) if columnas is not None else columnas_numericas(df)
+        self._valores = df[self.columnas].to_numpy(dtype=np.float64)
+        self._matrices = {}
+
+    def matriz(self, metodo='pearson', columnas=None, sin_duplicadas=False):
+        """
+        Matriz de correlación con el método indicado.
+
+        Parámetros:
+        - metodo: 'pearson', 'spearman' o 'kendall'
+        - columnas: Subconjunto (y orden) de columnas; las que no existen se ignoran
+        - sin_duplicadas: Quita las columnas derivadas que repiten una original
+          (total_bags, total_volume)
+        """
+        if metodo not in METODOS:
+            raise ValueError(f"metodo debe ser uno de {list(METODOS)}")
+        if metodo not in self._matrices:
+            self._matrices[metodo] = self._calcular(metodo)
+
+        completa = self._matrices[metodo]
+        if columnas is None and not sin_duplicadas:
+            return completa
+        columnas = [c for c in (self.columnas if columnas is None else columnas) if c in self.columnas]
+        if sin_duplicadas:
+            columnas = sin_derivadas(columnas)
+        return completa.loc[columnas, columnas]
+
+    def _calcular(self, metodo):
+        if metodo == 'kendall':
+            return pd.DataFrame(self._valores, columns=self.columnas).corr(method='kendall')
+        if metodo == 'spearman':
+            return self._spearman()
+        return MotorCorrelaciones(self.columnas).actualizar(self._valores).matriz()
+
+    def _spearman(self):
+        # Rangos por columna: exactos para los pares en los que ninguna tiene nulos
+        valores = self._valores
+        rangos = pd.DataFrame(valores).rank().to_numpy(dtype=np.float64)
+        matriz = MotorCorrelaciones(self.columnas).actualizar(rangos).matriz().to_numpy(copy=True)
+
+        # Un par con nulos se vuelve a rankear sobre sus filas con ambos valores
+        nulos = np.isnan(valores)
+        con_nulos = np.flatnonzero(nulos.any(axis=0))
+        for i in con_nulos:
+            for j in range(len(self.columnas)):
+                if i == j or (j < i and j in con_nulos):
+                    continue
+                validas = ~(nulos[:, i] | nulos[:, j])
+                par = pd.DataFrame(valores[validas][:, [i, j]]).rank().to_numpy(dtype=np.float64)
+                matriz[i, j] = matriz[j, i] = MotorCorrelaciones([i, j]).actualizar(par).matriz().iat[0, 1]
+        return pd.DataFrame(matriz, index=self.columnas, columns=self.columnas)
+
+
+def correlaciones(df, columnas=None):
+    """
+    Devuelve el ServicioCorrelaciones de df, construyéndolo solo la primera vez.
+
+    Se reutiliza mientras el mismo objeto DataFrame siga vivo, así que la
+    exploración y los gráficos comparten las matrices. El DataFrame no debe
+    modificarse en el sitio después.
+    """
+    referencia, servicio = _SERVICIOS.get(id(df), (None, None))
+    if referencia is not None and referencia() is df and (columnas is None
+                                                          or servicio.columnas == list(columnas)):
+        return servicio
+    servicio = ServicioCorrelaciones(df, columnas)
+    clave = id(df)
+    _SERVICIOS[clave] = (weakref.ref(df, lambda _: _SERVICIOS.pop(clave, None)), servicio)
+    return servicio
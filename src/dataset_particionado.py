@@ -0,0 +1,298 @@
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.cache_datos import _pyarrow_disponible
+
+# Columnas de partición por defecto (directorios year=.../type=...)
+PARTICIONES = ['year', 'type']
+COMPRESION = 'zstd'
+
+ARCHIVO_MANIFIESTO = '_manifiesto.json'
+
+
+# ==============================================================================
+# I. ESCRITURA
+# ==============================================================================
+def _valor_json(valor):
+    """Convierte mínimos/máximos a tipos serializables en JSON."""
+    if isinstance(valor, pd.Timestamp):
+        return valor.isoformat()
+    if isinstance(valor, np.generic):
+        return valor.item()
+    return valor
+
+
+def _estadisticas(df, claves, columnas):
+    """Mínimo y máximo de cada columna por partición, en un solo groupby."""
+    # Las categóricas sin orden no admiten min/max: se comparan sus valores
+    valores = df[claves + columnas].astype({
+        col: df[col].cat.categories.dtype for col in columnas if isinstance(df[col].dtype, pd.CategoricalDtype)
+    })
+    tabla = valores.groupby(claves, observed=True, sort=True)[columnas].agg(['min', 'max'])
+    return {
+        clave if isinstance(clave, tuple) else (clave,): {
+            col: [_valor_json(fila[(col, 'min')]), _valor_json(fila[(col, 'max')])] for col in columnas
+        }
+        for clave, fila in tabla.iterrows()
+    }
+
+
+def _escribir_parte(tabla, indices, ruta, compresion):
+    import pyarrow.parquet as pq
+
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    pq.write_table(tabla.take(indices), ruta, compression=compresion, write_statistics=True)
+
+
+def _guardar_manifiesto(directorio, manifiesto):
+    ruta = Path(directorio) / ARCHIVO_MANIFIESTO
+    temporal = ruta.with_suffix('.json.tmp')
+    temporal.write_text(json.dumps(manifiesto, indent=2, ensure_ascii=False), encoding='utf-8')
+    temporal.replace(ruta)
+
+
+def _particionar_bloque(df, claves, destino, nombre, compresion, pool):
+    """Escribe un bloque (un fichero por partición) y devuelve sus entradas del manifiesto."""
+    import pyarrow as pa
+
+    faltan = [c for c in claves if c not in df.columns]
+    if faltan:
+        raise KeyError(f"Faltan las columnas de partición {faltan}")
+    columnas = [c for c in df.columns if c not in claves]
+    tabla = pa.Table.from_pandas(df[columnas], preserve_index=False)
+    grupos = df.groupby(claves, observed=True, sort=True).indices
+    estadisticas = _estadisticas(df, claves, columnas)
+
+    tareas, ficheros = [], []
+    for clave, indices in grupos.items():
+        clave = clave if isinstance(clave, tuple) else (clave,)
+        relativa = Path(*[f'{col}={valor}' for col, valor in zip(claves, clave)]) / nombre
+        tareas.append((indices, destino / relativa))
+        ficheros.append({
+            'ruta': relativa.as_posix(),
+            'particion': {col: _valor_json(valor) for col, valor in zip(claves, clave)},
+            'filas': int(len(indices)),
+            'estadisticas': estadisticas[clave],
+        })
+    list(pool.map(lambda tarea: _escribir_parte(tabla, tarea[0], tarea[1], compresion), tareas))
+    return ficheros
+
+
+def escribir_dataset_particionado(datos, directorio, particiones=PARTICIONES, por_region=False,
+                                  compresion=COMPRESION, procesos=None, modo='sobrescribir'):
+    """
+    Escribe un DataFrame (o un iterable de bloques) como dataset Parquet con
+    particiones estilo Hive.
+
+    Cada combinación de valores de las columnas de partición va a su propio
+    directorio (p. ej. year=2016/type=organic/) con ficheros Parquet
+    comprimidos que no repiten esas columnas. El fichero _manifiesto.json de
+    la raíz guarda, por fichero, su partición, su número de filas y el mínimo
+    y máximo de cada columna, para descartar ficheros sin abrirlos.
+
+    Parámetros:
+    - datos: DataFrame o iterable de DataFrames (p. ej. los lotes de un plan
+      perezoso); cada bloque se escribe en cuanto llega, sin reunirlos en memoria
+    - directorio: Raíz del dataset
+    - particiones: Columnas de partición (en orden de anidamiento)
+    - por_region: Si es True añade 'region' como último nivel de partición
+    - compresion: Códec de Parquet ('zstd', 'snappy', 'gzip'...)
+    - procesos: Hilos de escritura (None = núcleos disponibles); pyarrow libera
+      el GIL al comprimir y escribir, así que las particiones se escriben en paralelo
+    - modo: 'sobrescribir' (reemplaza el dataset de forma atómica) o 'anexar'
+      (añade ficheros nuevos a cada partición, p. ej. en la ejecución incremental)
+
+    Devuelve el manifiesto.
+    """
+    if modo not in ('sobrescribir', 'anexar'):
+        raise ValueError("modo debe ser 'sobrescribir' o 'anexar'")
+    claves = list(particiones) + (['region'] if por_region and 'region' not in particiones else [])
+
+    directorio = Path(directorio)
+    previo = leer_manifiesto(directorio) if modo == 'anexar' and es_dataset_particionado(directorio) else None
+    if previo is not None and previo['particiones'] != claves:
+        raise ValueError(f"El dataset existente está particionado por {previo['particiones']}, no por {claves}")
+    # Al sobrescribir se escribe en un directorio temporal que sustituye al final al anterior
+    destino = directorio if previo is not None else directorio.with_name(directorio.name + '.tmp')
+    if destino != directorio and destino.exists():
+        shutil.rmtree(destino)
+    escritura = 0 if previo is None else previo['escrituras']
+
+    bloques = [datos] if isinstance(datos, pd.DataFrame) else datos
+    manifiesto = dict(previo) if previo is not None else {'particiones': claves, 'filas': 0, 'ficheros': []}
+    with ThreadPoolExecutor(max_workers=procesos or os.cpu_count() or 1) as pool:
+        for numero, df in enumerate(bloques):
+            if 'columnas' not in manifiesto:
+                manifiesto['tipos_particion'] = {col: str(df[col].dtype) for col in claves if col in df}
+                manifiesto['columnas'] = list(df.columns)
+                manifiesto['columnas_fecha'] = [
+                    c for c in df.columns if pd.api.types.is_datetime64_any_dtype(df[c])
+                ]
+            nombre = f'parte-{escritura:05d}-{numero:04d}.parquet'
+            manifiesto['ficheros'] = manifiesto['ficheros'] + _particionar_bloque(
+                df, claves, destino, nombre, compresion, pool
+            )
+            manifiesto['filas'] += int(len(df))
+
+    manifiesto.setdefault('tipos_particion', {})
+    manifiesto.setdefault('columnas', [])
+    manifiesto.setdefault('columnas_fecha', [])
+    manifiesto['compresion'] = compresion
+    manifiesto['escrituras'] = escritura + 1
+    destino.mkdir(parents=True, exist_ok=True)
+    _guardar_manifiesto(destino, manifiesto)
+
+    if destino != directorio:
+        if directorio.exists():
+            shutil.rmtree(directorio)
+        destino.rename(directorio)
+    return manifiesto
+
+
+def guardar_dataset_limpio(datos, ruta, modo='sobrescribir', **opciones):
+    """
+    Guarda el dataset limpio (DataFrame o iterable de bloques): como dataset
+    particionado o, si la ruta termina en .csv (o no hay pyarrow), como un
+    único CSV. Con modo='anexar' añade las filas a lo ya escrito. Devuelve la
+    ruta escrita.
+
+    'opciones' se pasan a escribir_dataset_particionado (p. ej. por_region=True).
+    """
+    ruta = Path(ruta)
+    if ruta.suffix != '.csv' and _pyarrow_disponible():
+        escribir_dataset_particionado(datos, ruta, modo=modo, **opciones)
+        return ruta
+
+    ruta = ruta.with_suffix('.csv')
+    # Al anexar se respeta el orden de columnas del CSV ya escrito
+    columnas = pd.read_csv(ruta, nrows=0).columns if modo == 'anexar' and ruta.exists() else None
+    bloques = [datos] if isinstance(datos, pd.DataFrame) else datos
+    for df in bloques:
+        if columnas is None:
+            df.to_csv(ruta, index=False)
+            columnas = df.columns
+        else:
+            df.reindex(columns=columnas).to_csv(ruta, mode='a', header=False, index=False)
+    return ruta
+
+
+# ==============================================================================
+# II. LECTURA CON PODA DE PARTICIONES Y COLUMNAS
+# ==============================================================================
+def es_dataset_particionado(ruta):
+    return (Path(ruta) / ARCHIVO_MANIFIESTO).exists()
+
+
+def leer_manifiesto(directorio):
+    return json.loads((Path(directorio) / ARCHIVO_MANIFIESTO).read_text(encoding='utf-8'))
+
+
+def _normalizar(valor, es_fecha):
+    return pd.Timestamp(valor) if es_fecha and valor is not None else valor
+
+
+def _condicion_compatible(condicion, minimo, maximo, es_fecha):
+    """¿Puede haber filas que cumplan la condición en un fichero con ese [mínimo, máximo]?"""
+    minimo, maximo = _normalizar(minimo, es_fecha), _normalizar(maximo, es_fecha)
+    if isinstance(condicion, tuple):
+        desde, hasta = (_normalizar(v, es_fecha) for v in condicion)
+        return (desde is None or maximo >= desde) and (hasta is None or minimo <= hasta)
+    valores = condicion if isinstance(condicion, (list, set)) else [condicion]
+    return any(minimo <= _normalizar(v, es_fecha) <= maximo for v in valores)
+
+
+def seleccionar_ficheros(manifiesto, filtros=None):
+    """
+    Entradas del manifiesto cuyos ficheros pueden contener filas que cumplan los filtros.
+
+    Las columnas de partición se comparan con el valor del directorio y el
+    resto con el mínimo y máximo guardados, sin abrir ningún fichero.
+    """
+    filtros = filtros or {}
+    fechas = set(manifiesto['columnas_fecha'])
+    seleccion = []
+    for fichero in manifiesto['ficheros']:
+        compatible = True
+        for col, condicion in filtros.items():
+            if col in fichero['particion']:
+                valor = fichero['particion'][col]
+                compatible = _condicion_compatible(condicion, valor, valor, col in fechas)
+            elif col in fichero['estadisticas']:
+                compatible = _condicion_compatible(condicion, *fichero['estadisticas'][col], col in fechas)
+            if not compatible:
+                break
+        if compatible:
+            seleccion.append(fichero)
+    return seleccion
+
+
+def expresion_filtros(filtros, fechas=(), campos=None):
+    """
+    Filtros como expresión de pyarrow.dataset para filtrar las filas al leer.
+
+    'campos' permite sustituir cada columna por otra expresión (p. ej. las
+    columnas ya derivadas de un plan perezoso); por defecto, el campo físico.
+    """
+    import pyarrow.dataset as ds
+
+    expresion = None
+    for col, condicion in filtros.items():
+        campo = ds.field(col) if campos is None else campos[col]
+        if isinstance(condicion, tuple):
+            desde, hasta = (_normalizar(v, col in fechas) for v in condicion)
+            partes = ([campo >= desde] if desde is not None else []) + ([campo <= hasta] if hasta is not None else [])
+        else:
+            valores = condicion if isinstance(condicion, (list, set)) else [condicion]
+            partes = [campo.isin([_normalizar(v, col in fechas) for v in valores])]
+        for parte in partes:
+            expresion = parte if expresion is None else expresion & parte
+    return expresion
+
+
+def leer_dataset_particionado(directorio, columnas=None, filtros=None):
+    """
+    Lee un dataset escrito con escribir_dataset_particionado.
+
+    Parámetros:
+    - directorio: Raíz del dataset
+    - columnas: Columnas a leer (None = todas); el resto no se lee de disco
+    - filtros: Diccionario columna → condición: un valor (igualdad), una lista
+      (pertenencia) o una tupla (desde, hasta) con extremos incluidos o None.
+      Ej.: {'year': [2016, 2017], 'type': 'organic', 'Date': ('2016-06-01', None)}
+
+    Solo se abren los ficheros de las particiones que pueden cumplir los
+    filtros (según el manifiesto) y, dentro de ellos, pyarrow descarta grupos
+    de filas por sus estadísticas.
+    """
+    import pyarrow.dataset as ds
+
+    directorio = Path(directorio)
+    manifiesto = leer_manifiesto(directorio)
+    filtros = filtros or {}
+    columnas = list(manifiesto['columnas']) if columnas is None else list(columnas)
+    desconocidas = [c for c in columnas + list(filtros) if c not in manifiesto['columnas']]
+    if desconocidas:
+        raise KeyError(f"Columnas que no están en el dataset: {desconocidas}")
+
+    ficheros = [str(directorio / f['ruta']) for f in seleccionar_ficheros(manifiesto, filtros)]
+    if not ficheros:
+        return pd.DataFrame(columns=columnas)
+
+    dataset = ds.dataset(ficheros, format='parquet', partition_base_dir=str(directorio),
+                         partitioning=ds.partitioning(flavor='hive'))
+    # Las columnas de partición ya están filtradas al elegir los ficheros
+    filtros_filas = {c: v for c, v in filtros.items() if c not in manifiesto['particiones']}
+    expresion = expresion_filtros(filtros_filas, set(manifiesto['columnas_fecha']))
+    tabla = dataset.to_table(columns=columnas, filter=expresion)
+    df = tabla.to_pandas()
+    # Los valores de partición se infieren de los directorios: se restaura su tipo original
+    for col, tipo in manifiesto['tipos_particion'].items():
+        if col in df.columns:
+            df[col] = df[col].astype(tipo)
+    return df
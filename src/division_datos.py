@@ -0,0 +1,133 @@
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# I. DIVISIONES EN MEMORIA (DEVUELVEN POSICIONES DE FILA, NO COPIAS)
+# ==============================================================================
+def division_temporal(fechas, proporcion_test=0.2):
+    """
+    Reserva para test las últimas semanas (por fecha, no por fila): ninguna fila
+    de entrenamiento es posterior a una de test.
+    """
+    fechas = pd.to_datetime(pd.Series(fechas)).to_numpy()
+    unicas = np.unique(fechas)
+    n_test = max(1, int(np.ceil(len(unicas) * proporcion_test)))
+    corte = unicas[-n_test]
+    return np.flatnonzero(fechas < corte), np.flatnonzero(fechas >= corte)
+
+
+def divisiones_origen_movil(fechas, n_divisiones=5, semanas_test=4, semanas_train=None):
+    """
+    Divisiones de origen móvil (rolling-origin) sobre las fechas.
+
+    En cada división el test son las 'semanas_test' fechas siguientes al origen
+    y el entrenamiento todas las anteriores (o solo las últimas 'semanas_train'
+    si se indica, ventana deslizante). Los orígenes avanzan hasta la última fecha.
+
+    Genera tuplas (idx_train, idx_test) de posiciones.
+    """
+    fechas = pd.to_datetime(pd.Series(fechas)).to_numpy()
+    unicas, posicion_fecha = np.unique(fechas, return_inverse=True)
+    n_fechas = len(unicas)
+    primer_origen = n_fechas - n_divisiones * semanas_test
+    if primer_origen < 1:
+        raise ValueError(
+            f"No hay fechas suficientes ({n_fechas}) para {n_divisiones} divisiones de {semanas_test} semanas"
+        )
+
+    # Un único argsort permite obtener cada rango de fechas como un corte contiguo
+    orden = np.argsort(posicion_fecha, kind='stable')
+    limites = np.searchsorted(posicion_fecha[orden], np.arange(n_fechas + 1))
+
+    for i in range(n_divisiones):
+        origen = primer_origen + i * semanas_test
+        inicio_train = 0 if semanas_train is None else max(0, origen - semanas_train)
+        idx_train = orden[limites[inicio_train]:limites[origen]]
+        idx_test = orden[limites[origen]:limites[origen + semanas_test]]
+        yield np.sort(idx_train), np.sort(idx_test)
+
+
+def division_por_grupos(grupos, proporcion_test=0.2, semilla=42):
+    """
+    Separa grupos completos (p. ej. regiones): ningún grupo aparece a la vez en
+    train y test. La proporción se aplica sobre el número de grupos.
+    """
+    grupos = np.asarray(grupos)
+    unicos, codigos = np.unique(grupos, return_inverse=True)
+    rng = np.random.default_rng(semilla)
+    n_test = max(1, int(np.ceil(len(unicos) * proporcion_test)))
+    es_test = np.zeros(len(unicos), dtype=bool)
+    es_test[rng.choice(len(unicos), n_test, replace=False)] = True
+    en_test = es_test[codigos]
+    return np.flatnonzero(~en_test), np.flatnonzero(en_test)
+
+
+def aplicar_division(X, y, idx_train, idx_test):
+    """Materializa una división de posiciones sobre X (DataFrame o matriz dispersa) e y."""
+    def filas(datos, idx):
+        return datos.iloc[idx] if hasattr(datos, 'iloc') else datos[idx]
+    return filas(X, idx_train), filas(X, idx_test), filas(y, idx_train), filas(y, idx_test)
+
+
+# ==============================================================================
+# II. DIVISIÓN EN STREAMING A FICHEROS
+# ==============================================================================
+def _en_test_por_grupo(valores, proporcion_test):
+    """Asignación determinista grupo → test mediante un hash estable (crc32) del grupo."""
+    unicos, codigos = np.unique(np.asarray(valores).astype(str), return_inverse=True)
+    cubetas = np.array([zlib.crc32(u.encode('utf-8')) % 10_000 for u in unicos])
+    return (cubetas < proporcion_test * 10_000)[codigos]
+
+
+def escribir_division_por_bloques(bloques, directorio, criterio='fecha', fecha_corte=None,
+                                  columna_grupo='region', proporcion_test=0.2):
+    """
+    Divide un flujo de bloques en train/test y escribe cada parte por trozos en disco.
+
+    Parámetros:
+    - bloques: Iterable de DataFrames (p. ej. cargar_datos_por_bloques())
+    - directorio: Carpeta de salida; se crean train/ y test/ con un fichero por bloque
+    - criterio: 'fecha' (test = filas con Date >= fecha_corte) o 'grupo'
+      (test = grupos cuyo hash cae en la proporción indicada; estable entre ejecuciones)
+
+    En ningún momento se mantiene en memoria más de un bloque. Se escribe en
+    Parquet si pyarrow está disponible y en CSV si no. Devuelve el número de
+    filas escritas en cada parte.
+    """
+    if criterio == 'fecha' and fecha_corte is None:
+        raise ValueError("criterio='fecha' necesita fecha_corte")
+    if criterio not in ('fecha', 'grupo'):
+        raise ValueError("criterio debe ser 'fecha' o 'grupo'")
+
+    try:
+        import pyarrow  # noqa: F401
+        extension = 'parquet'
+    except ImportError:
+        extension = 'csv'
+
+    directorio = Path(directorio)
+    for parte in ('train', 'test'):
+        (directorio / parte).mkdir(parents=True, exist_ok=True)
+
+    filas = {'train': 0, 'test': 0}
+    for numero, bloque in enumerate(bloques):
+        if criterio == 'fecha':
+            en_test = (pd.to_datetime(bloque['Date']) >= pd.Timestamp(fecha_corte)).to_numpy()
+        else:
+            en_test = _en_test_por_grupo(bloque[columna_grupo], proporcion_test)
+
+        for parte, mascara in (('train', ~en_test), ('test', en_test)):
+            trozo = bloque[mascara]
+            if trozo.empty:
+                continue
+            ruta = directorio / parte / f'parte_{numero:05d}.{extension}'
+            if extension == 'parquet':
+                trozo.to_parquet(ruta, index=False)
+            else:
+                trozo.to_csv(ruta, index=False)
+            filas[parte] += len(trozo)
+
+    return filas
@@ -0,0 +1,356 @@
+import warnings
+import weakref
+
+import numpy as np
+import pandas as pd
+
+COLUMNAS_DESCOMPOSICION = ['AveragePrice', 'Total Volume']
+COMPONENTES = ('observado', 'tendencia', 'estacional', 'residuo')
+MODELOS = ('aditivo', 'multiplicativo')
+TENDENCIAS = ('centrada', 'causal')
+
+# Semanas por ciclo estacional (los datos son semanales)
+PERIODO_SEMANAS = 52
+
+# Descomposiciones ya calculadas, por DataFrame (id -> (referencia débil, {parámetros: resultado}))
+_DESCOMPOSICIONES = {}
+
+
+# ==============================================================================
+# I. OPERACIONES VECTORIZADAS SOBRE EL EJE TEMPORAL
+# ==============================================================================
+# Todas trabajan sobre el último eje de un array (..., semanas), así que se
+# aplican a la vez a todas las series región × tipo y a todas las variables.
+
+def _interpolar(valores):
+    """Rellena los huecos por interpolación lineal; los extremos repiten el valor más cercano."""
+    semanas = valores.shape[-1]
+    posiciones = np.arange(semanas)
+    validos = ~np.isnan(valores)
+
+    previo = np.maximum.accumulate(np.where(validos, posiciones, -1), axis=-1)
+    siguiente = np.minimum.accumulate(np.where(validos, posiciones, semanas)[..., ::-1], axis=-1)[..., ::-1]
+    previo, siguiente = (np.where(previo >= 0, previo, siguiente),
+                         np.where(siguiente < semanas, siguiente, previo))
+    # Las series sin ningún valor quedan fuera de rango: se recortan y siguen siendo NaN
+    previo, siguiente = np.clip(previo, 0, semanas - 1), np.clip(siguiente, 0, semanas - 1)
+
+    valor_previo = np.take_along_axis(valores, previo, axis=-1)
+    valor_siguiente = np.take_along_axis(valores, siguiente, axis=-1)
+    distancia = siguiente - previo
+    peso = np.divide(posiciones - previo, distancia, out=np.zeros(distancia.shape), where=distancia > 0)
+    return valor_previo + peso * (valor_siguiente - valor_previo)
+
+
+def _rellenar_hacia_delante(valores):
+    """Rellena los huecos con el último valor observado; antes del primero quedan a NaN."""
+    semanas = valores.shape[-1]
+    previo = np.maximum.accumulate(np.where(~np.isnan(valores), np.arange(semanas), -1), axis=-1)
+    rellenado = np.take_along_axis(valores, np.maximum(previo, 0), axis=-1)
+    return np.where(previo >= 0, rellenado, np.nan)
+
+
+def _media_movil_causal(valores, periodo):
+    """
+    Media de las últimas 'periodo' semanas (incluida la actual), con sumas acumuladas.
+
+    Solo usa semanas pasadas: al principio de la serie promedia las que haya y
+    antes de la primera observación queda a NaN.
+    """
+    semanas = valores.shape[-1]
+    validos = ~np.isnan(valores)
+    acumulada = np.zeros(valores.shape[:-1] + (semanas + 1,))
+    conteos = np.zeros(valores.shape[:-1] + (semanas + 1,))
+    np.cumsum(np.where(validos, valores, 0.0), axis=-1, out=acumulada[..., 1:])
+    np.cumsum(validos, axis=-1, out=conteos[..., 1:])
+    inicio = np.maximum(np.arange(1, semanas + 1) - periodo, 0)
+    suma = acumulada[..., 1:] - acumulada[..., inicio]
+    n = conteos[..., 1:] - conteos[..., inicio]
+    return np.divide(suma, n, out=np.full(valores.shape, np.nan), where=n > 0)
+
+
+def _media_movil_centrada(valores, periodo):
+    """
+    Media móvil centrada de 'periodo' semanas (2×periodo si es par), con sumas acumuladas.
+
+    Las primeras y últimas periodo // 2 semanas quedan a NaN.
+    """
+    semanas = valores.shape[-1]
+    mitad = periodo // 2
+    resultado = np.full(valores.shape, np.nan)
+    if semanas <= 2 * mitad:
+        return resultado
+
+    acumulada = np.zeros(valores.shape[:-1] + (semanas + 1,))
+    np.cumsum(valores, axis=-1, out=acumulada[..., 1:])
+    centro = slice(mitad, semanas - mitad)
+    if periodo % 2:
+        suma = acumulada[..., periodo:] - acumulada[..., :-periodo]
+    else:
+        # Pesos 1/2 en los extremos de la ventana de periodo + 1 semanas
+        suma = (acumulada[..., periodo:semanas] - acumulada[..., 1:semanas - periodo + 1]
+                + 0.5 * (valores[..., :semanas - periodo] + valores[..., periodo:]))
+    resultado[..., centro] = suma / periodo
+    return resultado
+
+
+def _extrapolar_lineal(tendencia, puntos):
+    """Prolonga la tendencia en los extremos con la recta ajustada a sus 'puntos' primeros/últimos valores."""
+    validas = np.flatnonzero(~np.isnan(tendencia.reshape(-1, tendencia.shape[-1])).all(axis=0))
+    if len(validas) == 0:
+        # Serie demasiado corta para la media móvil: la tendencia es su media
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return np.repeat(np.nanmean(tendencia, axis=-1, keepdims=True), tendencia.shape[-1], axis=-1)
+
+    resultado = tendencia.copy()
+    inicio, fin = validas[0], validas[-1] + 1
+    posiciones = np.arange(tendencia.shape[-1])
+    for tramo, destino in ((slice(inicio, min(inicio + puntos, fin)), slice(0, inicio)),
+                           (slice(max(fin - puntos, inicio), fin), slice(fin, None))):
+        x = posiciones[tramo]
+        y = tendencia[..., tramo]
+        x_media, y_media = x.mean(), y.mean(axis=-1, keepdims=True)
+        varianza = ((x - x_media) ** 2).sum()
+        pendiente = ((x - x_media) * (y - y_media)).sum(axis=-1, keepdims=True) / varianza if varianza else 0.0
+        resultado[..., destino] = y_media + pendiente * (posiciones[destino] - x_media)
+    return resultado
+
+
+def _indices_estacionales(desviaciones, periodo, neutro):
+    """
+    Media de las desviaciones por posición dentro del ciclo (semana % periodo).
+
+    Se centran para que su media sea 'neutro' (0 aditivo, 1 multiplicativo);
+    las posiciones sin datos toman ese valor.
+    """
+    semanas = desviaciones.shape[-1]
+    ciclos = -(-semanas // periodo)
+    relleno = np.full(desviaciones.shape[:-1] + (ciclos * periodo - semanas,), np.nan)
+    por_ciclo = np.concatenate([desviaciones, relleno], axis=-1).reshape(desviaciones.shape[:-1] + (ciclos, periodo))
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        indices = np.nanmean(por_ciclo, axis=-2)
+        media = np.nanmean(indices, axis=-1, keepdims=True)
+    indices = indices - media if neutro == 0 else indices / media
+    return np.where(np.isnan(indices), neutro, indices)
+
+
+# ==============================================================================
+# II. DESCOMPOSICIÓN DE TODAS LAS SERIES REGIÓN × TIPO
+# ==============================================================================
+class DescomposicionEstacional:
+    """
+    Tendencia y estacionalidad de todas las series región × tipo a la vez.
+
+    El DataFrame limpio se convierte en un cubo denso (variable, región, tipo,
+    semana) y todas las operaciones se hacen sobre el eje de las semanas con
+    numpy, sin recorrer las series en Python:
+    1. Los huecos de cada serie se rellenan por interpolación lineal.
+    2. Tendencia: media móvil centrada de 'periodo' semanas (2×52 para datos
+       semanales), prolongada en los extremos con una recta ajustada a las
+       periodo // 2 semanas más cercanas.
+    3. Estacionalidad: media, por semana del ciclo, de las desviaciones
+       respecto a la tendencia (solo semanas observadas), centrada.
+    4. Residuo: lo observado menos (o entre) tendencia y estacionalidad.
+
+    Es la descomposición clásica por medias móviles (como seasonal_decompose
+    de statsmodels), aplicada por serie. Las semanas sin dato conservan NaN en
+    'observado' y 'residuo'; las combinaciones región × tipo que no existen
+    quedan enteras a NaN.
+
+    La media centrada usa hasta periodo // 2 semanas futuras, así que la
+    tendencia de una semana cambia al llegar datos nuevos. Con
+    metodo_tendencia='causal' los huecos se rellenan con el último valor y la
+    tendencia es la media de las 'periodo' semanas anteriores: cada semana
+    solo depende de las pasadas (es la que usan las variables de Machine
+    Learning de PipelineTransformacion).
+
+    Parámetros:
+    - df: Dataset limpio con region, type, Date y las columnas pedidas
+    - columnas: Variables a descomponer
+    - periodo: Semanas por ciclo estacional
+    - modelo: 'aditivo' (x = T + S + R) o 'multiplicativo' (x = T · S · R)
+    - metodo_tendencia: 'centrada' (descomposición clásica) o 'causal'
+    """
+
+    def __init__(self, df, columnas=None, periodo=PERIODO_SEMANAS, modelo='aditivo',
+                 metodo_tendencia='centrada'):
+        if modelo not in MODELOS:
+            raise ValueError(f"modelo debe ser uno de {list(MODELOS)}")
+        if metodo_tendencia not in TENDENCIAS:
+            raise ValueError(f"metodo_tendencia debe ser uno de {list(TENDENCIAS)}")
+        self.columnas = list(columnas or [c for c in COLUMNAS_DESCOMPOSICION if c in df.columns])
+        self.periodo = periodo
+        self.modelo = modelo
+        self.metodo_tendencia = metodo_tendencia
+
+        region = pd.Categorical(df['region'])
+        tipo = pd.Categorical(df['type'])
+        fechas = pd.to_datetime(df['Date'])
+        inicio = fechas.min()
+        self.regiones, self.tipos = region.categories, tipo.categories
+        semana = np.rint((fechas - inicio).to_numpy() / np.timedelta64(7, 'D')).astype(np.int64)
+        self.fechas = pd.date_range(inicio, periods=int(semana.max()) + 1, freq='7D', name='Date')
+
+        # Cubo denso: media de las filas de cada celda (normalmente una)
+        forma = (len(self.regiones), len(self.tipos), len(self.fechas))
+        celda = np.ravel_multi_index((region.codes, tipo.codes, semana), forma)
+        valores = df[self.columnas].to_numpy(dtype=np.float64)
+        self.observado = np.full((len(self.columnas),) + forma, np.nan)
+        for i in range(len(self.columnas)):
+            validos = ~np.isnan(valores[:, i])
+            conteos = np.bincount(celda[validos], minlength=np.prod(forma))
+            sumas = np.bincount(celda[validos], weights=valores[validos, i], minlength=np.prod(forma))
+            with np.errstate(invalid='ignore', divide='ignore'):
+                self.observado[i] = (sumas / conteos).reshape(forma)
+        self._descomponer()
+
+    def _descomponer(self):
+        multiplicativo = self.modelo == 'multiplicativo'
+        if self.metodo_tendencia == 'causal':
+            self.tendencia = _media_movil_causal(_rellenar_hacia_delante(self.observado), self.periodo)
+        else:
+            tendencia = _media_movil_centrada(_interpolar(self.observado), self.periodo)
+            self.tendencia = _extrapolar_lineal(tendencia, max(self.periodo // 2, 2))
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            desviaciones = self.observado / self.tendencia if multiplicativo else self.observado - self.tendencia
+            self.indices_estacionales = _indices_estacionales(desviaciones, self.periodo, 1.0 if multiplicativo else 0.0)
+            posicion = np.arange(len(self.fechas)) % self.periodo
+            self.estacional = self.indices_estacionales[..., posicion]
+            if multiplicativo:
+                self.residuo = self.observado / (self.tendencia * self.estacional)
+            else:
+                self.residuo = self.observado - self.tendencia - self.estacional
+
+        # Las series que no existen no tienen tendencia ni estacionalidad
+        sin_datos = np.isnan(self.observado).all(axis=-1, keepdims=True)
+        self.tendencia = np.where(sin_datos, np.nan, self.tendencia)
+        self.estacional = np.where(sin_datos, np.nan, self.estacional)
+
+    # ------------------------------------------------------------------
+    # Consultas
+    # ------------------------------------------------------------------
+    def cubo(self, componente, columna):
+        """Array (región, tipo, semana) de un componente de una variable."""
+        if componente not in COMPONENTES:
+            raise ValueError(f"componente debe ser uno de {list(COMPONENTES)}")
+        return getattr(self, componente)[self.columnas.index(columna)]
+
+    def componentes(self, region, tipo, columna='AveragePrice'):
+        """Observado, tendencia, estacional y residuo de una serie, indexados por fecha."""
+        r, t = self.regiones.get_loc(region), self.tipos.get_loc(tipo)
+        return pd.DataFrame({c: self.cubo(c, columna)[r, t] for c in COMPONENTES}, index=self.fechas)
+
+    def media(self, componente, columna='AveragePrice', por_tipo=False):
+        """
+        Media de un componente sobre todas las series existentes en cada semana.
+
+        Tendencia y estacionalidad están definidas en todas las semanas de una
+        serie, así que su media no salta cuando falta alguna observación.
+        Devuelve una Series por fecha o, con por_tipo=True, un DataFrame con
+        una columna por tipo.
+        """
+        valores = self.cubo(componente, columna)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            if por_tipo:
+                return pd.DataFrame(np.nanmean(valores, axis=0).T, index=self.fechas,
+                                    columns=pd.Index(self.tipos, name='type'))
+            return pd.Series(np.nanmean(valores, axis=(0, 1)), index=self.fechas, name=componente)
+
+    def perfil_estacional(self, columna='AveragePrice'):
+        """
+        Índice estacional medio por tipo en cada semana del ciclo.
+
+        El índice está fechado con las semanas del primer ciclo, de modo que
+        se puede leer por mes. Con menos de un ciclo completo de datos el
+        perfil no está definido y todos sus valores son NaN.
+        """
+        indices = self.indices_estacionales[self.columnas.index(columna)]
+        existentes = ~np.isnan(self.cubo('observado', columna)).all(axis=-1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            perfil = np.nanmean(np.where(existentes[..., None], indices, np.nan), axis=0)
+        if len(self.fechas) < self.periodo:
+            perfil = np.full(perfil.shape, np.nan)
+        ciclo = pd.date_range(self.fechas[0], periods=self.periodo, freq='7D', name='Date')
+        return pd.DataFrame(perfil.T, index=ciclo, columns=pd.Index(self.tipos, name='type'))
+
+    def fuerza_estacional(self, columna='AveragePrice'):
+        """
+        Fuerza de la estacionalidad por región y tipo: 1 - Var(R) / Var(S + R), entre 0 y 1.
+
+        En el modelo multiplicativo se calcula sobre los logaritmos.
+        """
+        estacional, residuo = self.cubo('estacional', columna), self.cubo('residuo', columna)
+        if self.modelo == 'multiplicativo':
+            with np.errstate(invalid='ignore', divide='ignore'):
+                estacional, residuo = np.log(estacional), np.log(residuo)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            fuerza = 1 - np.nanvar(residuo, axis=-1) / np.nanvar(estacional + residuo, axis=-1)
+        return pd.DataFrame(np.clip(fuerza, 0, 1), index=pd.Index(self.regiones, name='region'),
+                            columns=pd.Index(self.tipos, name='type'))
+
+    def _celdas(self, df):
+        """Códigos de región y tipo (-1 si no existen) y semana desde la primera fecha de cada fila."""
+        region = pd.Categorical(df['region'], categories=self.regiones).codes
+        tipo = pd.Categorical(df['type'], categories=self.tipos).codes
+        semana = np.rint((pd.to_datetime(df['Date']) - self.fechas[0]).to_numpy()
+                         / np.timedelta64(7, 'D')).astype(np.int64)
+        return region, tipo, semana
+
+    def valores_filas(self, df, componente, columna):
+        """Valor del componente en la celda (region, type, Date) de cada fila de df (NaN si no existe)."""
+        region, tipo, semana = self._celdas(df)
+        dentro = (region >= 0) & (tipo >= 0) & (semana >= 0) & (semana < len(self.fechas))
+        resultado = np.full(len(df), np.nan)
+        resultado[dentro] = self.cubo(componente, columna)[region[dentro], tipo[dentro], semana[dentro]]
+        return resultado
+
+    def prolongar_filas(self, df, columna):
+        """
+        Tendencia y estacionalidad de cada fila de df, también fuera de las semanas ajustadas.
+
+        Sirve para aplicar la descomposición ajustada a lotes nuevos: después
+        de la última semana la tendencia es la última de su serie (antes de la
+        primera, la primera) y la estacionalidad es el índice de la semana del
+        ciclo. Las regiones o tipos desconocidos, o series sin datos, dan NaN.
+        Devuelve (tendencia, estacional).
+        """
+        region, tipo, semana = self._celdas(df)
+        conocida = (region >= 0) & (tipo >= 0)
+        r, t = region[conocida], tipo[conocida]
+        i = self.columnas.index(columna)
+        existentes = ~np.isnan(self.observado[i]).all(axis=-1)
+
+        # _interpolar prolonga cada serie con su primer y último valor
+        tendencia = _interpolar(self.tendencia[i])[r, t, np.clip(semana[conocida], 0, len(self.fechas) - 1)]
+        estacional = self.indices_estacionales[i][r, t, semana[conocida] % self.periodo]
+        estacional = np.where(existentes[r, t], estacional, np.nan)
+
+        resultado = np.full((2, len(df)), np.nan)
+        resultado[0, conocida], resultado[1, conocida] = tendencia, estacional
+        return resultado[0], resultado[1]
+
+
+def descomposicion_estacional(df, columnas=None, periodo=PERIODO_SEMANAS, modelo='aditivo',
+                              metodo_tendencia='centrada'):
+    """
+    Devuelve la DescomposicionEstacional de df, calculándola solo la primera vez.
+
+    Se reutiliza mientras el mismo objeto DataFrame siga vivo (una por
+    combinación de parámetros), así que los gráficos que la usan comparten el
+    cálculo. El DataFrame no debe modificarse en el sitio después.
+    """
+    clave_parametros = (tuple(columnas) if columnas is not None else None, periodo, modelo, metodo_tendencia)
+    referencia, resultados = _DESCOMPOSICIONES.get(id(df), (None, None))
+    if referencia is None or referencia() is not df:
+        resultados = {}
+        clave = id(df)
+        _DESCOMPOSICIONES[clave] = (weakref.ref(df, lambda _: _DESCOMPOSICIONES.pop(clave, None)), resultados)
+    if clave_parametros not in resultados:
+        resultados[clave_parametros] = DescomposicionEstacional(df, columnas, periodo, modelo, metodo_tendencia)
+    return resultados[clave_parametros]
@@ -1,16 +1,30 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns 
-# Importaciones necesarias para Detección de Patrones/Clustering
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.decomposition import PCA 
+
+# matplotlib, seaborn y sklearn se importan dentro de las funciones que los usan:
+# explorar_datos (solo pandas) no debe pagar su tiempo de importación.
+from src.reduccion_datos import muestra_estratificada
+from src.perfil_datos import perfilar
+from src.consultas_datos import indice_consultas
+from src.correlaciones import correlaciones
 
 # -----------------------------------------------------------
 # 1. EXPLORACIÓN BÁSICA (PUNTOS 1-4)
 # -----------------------------------------------------------
 
-def explorar_datos(df):
+def explorar_datos(df, ruta_informe=None, modo_grande=False):
+    """
+    Muestra las primeras filas, dimensiones, tipos, nulos y estadísticas.
+
+    Todo sale de un único perfil calculado en una pasada (perfil_datos.perfilar)
+    en lugar de repetir isnull(), info() y describe() sobre todo el DataFrame,
+    y el mismo perfil alimenta la salida por pantalla y el informe. Los
+    cuartiles son exactos; con modo_grande=True se toman del sketch del perfil
+    y son aproximados (error relativo ≤ 1%). Con ruta_informe (.json o .html)
+    el perfil se guarda además como informe estructurado.
+    """
+    perfil = perfilar(df, cuantiles_exactos=not modo_grande)
+    columnas = perfil.tabla_columnas()
+
     print("=" * 25 ,"Primeras filas" ,"=" * 25)
     print(df.head())
 
@@ -18,46 +32,54 @@ def explorar_datos(df):
     print(df.shape)
 
     print("=" * 25 ,"Tipos de datos" ,"=" * 25)
-    print(df.dtypes)
-
-    df.info()
+    print(columnas[['tipo', 'no_nulos', 'memoria_bytes', 'cardinalidad']].to_string(na_rep=''))
+    print(f"Memoria total: {perfil.informe()['memoria_total_bytes'] / 1024 ** 2:.2f} MB")
     
-    print("=" * 25 ,"Estadísticas" ,"=" * 25)
-    print(df.describe())
+    if perfil.exacto:
+        print("=" * 25 ,"Estadísticas" ,"=" * 25)
+    else:
+        print("=" * 25 ,f"Estadísticas (cuartiles aproximados, error relativo ≤ {perfil.alfa:.0%})" ,"=" * 25)
+    print(perfil.describe())
 
     print("=" * 25 ,"Valores nulos por columna" ,"=" * 25)
-    print(df.isnull().sum())
+    print(columnas['nulos'])
     
     print("\nValores faltantes por columna:")
-    missing_values = df.isnull().sum()
-    missing_percentage = (df.isnull().sum() / len(df)) * 100
-
     missing_info = pd.DataFrame({
-    'Valores Faltantes': missing_values,
-    '% Faltantes': missing_percentage
+    'Valores Faltantes': columnas['nulos'].astype(int),
+    '% Faltantes': columnas['pct_nulos'].astype(float)
     })
 
     missing_info = missing_info[missing_info['Valores Faltantes'] > 0].sort_values(by='% Faltantes', ascending=False)
     print(missing_info)
+
+    if ruta_informe:
+        print(f"💾 Informe de exploración guardado en '{perfil.guardar(ruta_informe)}'")
+    return perfil
     
 # -----------------------------------------------------------
 # 2. ANÁLISIS EDA AVANZADO (PUNTO 5)
 # -----------------------------------------------------------
 
-def analisis_eda(df):
+def analisis_eda(df, modo_grande=False):
     """
     Realiza el Análisis Exploratorio de Datos (EDA) avanzado:
     1. Matriz de Correlación (Heatmap).
     2. Comparación de distribuciones (Violin Plot).
     3. Relaciones entre variables clave (Pairplot).
+
+    Con modo_grande=True el pairplot usa una muestra estratificada por tipo.
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     print("\n\n" + "=" * 25 , "5. ANÁLISIS EXPLORATORIO DE DATOS (EDA) AVANZADO" , "=" * 25)
 
     # 1. Matriz de Correlación (Heatmap)
     print("\n--- 1. Matriz de Correlación y Heatmap ---")
     
     numerical_cols = df.select_dtypes(include=['number']).columns.drop('Unnamed: 0', errors='ignore')
-    corr_matrix = df[numerical_cols].corr()
+    corr_matrix = correlaciones(df).matriz(columnas=numerical_cols)
     
     plt.figure(figsize=(12, 10))
     sns.heatmap(
@@ -88,7 +110,13 @@ def analisis_eda(df):
     
     cols_for_pairplot = ['AveragePrice', 'Total Volume', 'Small Bags', 'year']
     
-    sns.pairplot(df, vars=cols_for_pairplot, hue='type', diag_kind='kde')
+    df_pairplot = df
+    if modo_grande:
+        df_pairplot, error = muestra_estratificada(df[cols_for_pairplot + ['type']], 'type')
+        print(f"Modo datos grandes: pairplot sobre {len(df_pairplot)} filas "
+              f"(error de la distribución ≤ {error:.3f}, DKW 95%)")
+    
+    sns.pairplot(df_pairplot, vars=cols_for_pairplot, hue='type', diag_kind='kde')
     plt.suptitle('Pairplot de Variables Clave Segmentado por Tipo', y=1.02, fontsize=16, fontweight='bold')
     plt.show()
     
@@ -98,14 +126,61 @@ def analisis_eda(df):
 # 3. DETECCIÓN DE PATRONES Y AGRUPACIONES (PUNTO 5.2/6)
 # -----------------------------------------------------------
 
-def deteccion_patrones(df):
+def deteccion_patrones(df, modo='medias', ventana=8, procesos=None):
     """
     Realiza la detección de patrones avanzados:
     1. Clustering visual (KMeans + PCA) para detectar grupos de regiones.
     2. FacetGrid para comparar distribuciones de precio en distintas categorías.
+
+    Parámetros:
+    - modo: 'medias' (K=3 sobre la media de precio y volumen de cada región),
+      'perfiles' (una serie semanal de precio y volumen por región) o 'semanal'
+      (un vector por región × tipo × semana con las últimas 'ventana' semanas).
+      Los dos últimos usan MiniBatchKMeans, PCA aleatorizada/incremental y K
+      elegido automáticamente; el modelo ajustado se guarda en caché.
+    - procesos: Procesos para evaluar los candidatos de K
     """
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     print("\n\n" + "=" * 25 , "6. DETECCIÓN DE PATRONES Y AGRUPACIONES (CLUSTERING)" , "=" * 25)
 
+    if modo == 'medias':
+        _clustering_medias(df)
+    elif modo in ('perfiles', 'semanal'):
+        _clustering_perfiles(df, modo, ventana, procesos)
+    else:
+        raise ValueError("modo debe ser 'medias', 'perfiles' o 'semanal'")
+
+    # 4. FacetGrid: Comparar distribuciones de precio en grupos clave
+    print("\n--- 2. FacetGrid: Comparación de Precios por Región y Tipo ---")
+    
+    # Seleccionamos un subconjunto de regiones para una visualización clara
+    regiones_clave = ['California', 'NewYork', 'TotalUS', 'Boston', 'Seattle']
+    df_sub = indice_consultas(df).consultar(region=regiones_clave)
+    
+    # Usamos FacetGrid para ver el histograma de AveragePrice segmentado por 'region' y 'type'
+    g = sns.FacetGrid(df_sub, col="region", row="type", margin_titles=True, height=3)
+    
+    g.map_dataframe(sns.histplot, x="AveragePrice", bins=15, kde=True)
+    
+    g.set_axis_labels("Precio Promedio", "Frecuencia")
+    g.set_titles(col_template="{col_name} Región", row_template="{row_name} Tipo")
+    plt.suptitle('FacetGrid: Distribución del Precio Promedio en Regiones Clave por Tipo', y=1.05, fontsize=16, fontweight='bold')
+    plt.tight_layout()
+    plt.show()
+    # 
+
+    print("\n✅ Detección de patrones y FacetGrid completados.")
+
+
+def _clustering_medias(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import KMeans
+    from sklearn.decomposition import PCA
+
     # 1. Preparación de datos para Clustering (Buscando grupos de regiones)
     df_agrupado = df.groupby('region')[['AveragePrice', 'Total Volume']].mean().reset_index()
     
@@ -143,25 +218,46 @@ def deteccion_patrones(df):
     plt.xlabel(f'PCA Componente 1 ({pca.explained_variance_ratio_[0]*100:.2f}%)')
     plt.ylabel(f'PCA Componente 2 ({pca.explained_variance_ratio_[1]*100:.2f}%)')
     plt.show()
-    # 
+    #
 
-    # 4. FacetGrid: Comparar distribuciones de precio en grupos clave
-    print("\n--- 2. FacetGrid: Comparación de Precios por Región y Tipo ---")
-    
-    # Seleccionamos un subconjunto de regiones para una visualización clara
-    regiones_clave = ['California', 'NewYork', 'TotalUS', 'Boston', 'Seattle']
-    df_sub = df[df['region'].isin(regiones_clave)]
-    
-    # Usamos FacetGrid para ver el histograma de AveragePrice segmentado por 'region' y 'type'
-    g = sns.FacetGrid(df_sub, col="region", row="type", margin_titles=True, height=3)
-    
-    g.map_dataframe(sns.histplot, x="AveragePrice", bins=15, kde=True)
-    
-    g.set_axis_labels("Precio Promedio", "Frecuencia")
-    g.set_titles(col_template="{col_name} Región", row_template="{row_name} Tipo")
-    plt.suptitle('FacetGrid: Distribución del Precio Promedio en Regiones Clave por Tipo', y=1.05, fontsize=16, fontweight='bold')
-    plt.tight_layout()
-    plt.show()
-    # 
 
-    print("\n✅ Detección de patrones y FacetGrid completados.")
\ No newline at end of file
+def _clustering_perfiles(df, modo, ventana, procesos):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from src.clustering_regiones import ajustar_clustering, perfiles_region, perfiles_semanales
+
+    if modo == 'perfiles':
+        X, indice = perfiles_region(df)
+        claves = indice.to_frame(index=False)
+        descripcion = "perfiles semanales por región"
+    else:
+        X, claves = perfiles_semanales(df, ventana=ventana)
+        descripcion = f"ventanas de {ventana} semanas por región × tipo"
+
+    modelo = ajustar_clustering(X, procesos=procesos)
+    claves['Cluster'] = modelo.etiquetas_
+
+    print(f"\n--- 1. Clustering de {descripcion} ({len(X)} vectores de {X.shape[1]} variables) ---")
+    if modelo.puntuaciones_k is not None:
+        print(f"K elegido automáticamente: {modelo.k_}")
+        print(modelo.puntuaciones_k.round(3))
+    print(f"✅ Se detectaron {modelo.k_} grupos. Distribución:")
+    print(claves['Cluster'].value_counts().sort_index())
+    if modo == 'semanal':
+        # Cluster más frecuente de cada región a lo largo de las semanas
+        dominante = claves.groupby('region', observed=True)['Cluster'].agg(lambda c: c.mode().iat[0])
+        print("\nCluster dominante por región:")
+        print(dominante.value_counts().sort_index())
+
+    componentes = modelo.transform(X)[:, :2]
+    claves['PCA1'], claves['PCA2'] = componentes[:, 0], componentes[:, 1]
+    # Con muchos vectores se dibuja una muestra: la nube de puntos no cambia de forma
+    datos_grafico = claves.sample(min(len(claves), 5000), random_state=42)
+
+    plt.figure(figsize=(10, 7))
+    sns.scatterplot(x='PCA1', y='PCA2', hue='Cluster', data=datos_grafico, palette='viridis',
+                    style='Cluster', s=100 if len(datos_grafico) < 500 else 15)
+    plt.title(f'Clustering de {descripcion} (Visualización PCA)', fontsize=16, fontweight='bold')
+    plt.xlabel(f'PCA Componente 1 ({modelo.varianza_explicada[0]*100:.2f}%)')
+    plt.ylabel(f'PCA Componente 2 ({modelo.varianza_explicada[1]*100:.2f}%)')
+    plt.show()
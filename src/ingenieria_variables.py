@@ -0,0 +1,161 @@
+import numpy as np
+import pandas as pd
+
+# ==============================================================================
+# I. REGISTRO DE VARIABLES DERIVADAS
+# ==============================================================================
+# nombre -> (entradas, función, intermedia). Las entradas pueden ser columnas del
+# DataFrame u otras variables registradas; las intermedias no se devuelven como
+# columnas pero se comparten entre variables (p. ej. la fecha parseada una vez).
+REGISTRO_VARIABLES = {}
+
+
+def registrar_variable(nombre, entradas, intermedia=False):
+    """Decorador que registra una variable derivada y las entradas que necesita."""
+    def decorador(funcion):
+        REGISTRO_VARIABLES[nombre] = (tuple(entradas), funcion, intermedia)
+        return funcion
+    return decorador
+
+
+@registrar_variable('_fecha', ['Date'], intermedia=True)
+def _fecha(v):
+    return pd.to_datetime(v['Date'])
+
+
+@registrar_variable('type_encoded', ['type'], intermedia=True)
+def _type_encoded(v):
+    # Mismo criterio que LabelEncoder: categorías en orden alfabético
+    return pd.Categorical(v['type'], categories=sorted(pd.unique(v['type']))).codes
+
+
+@registrar_variable('bags_ratio', ['Total Bags', 'Total Volume'])
+def _bags_ratio(v):
+    return v['Total Bags'] / (v['Total Volume'] + 1)
+
+
+@registrar_variable('price_per_volume', ['AveragePrice', 'Total Volume'])
+def _price_per_volume(v):
+    return v['AveragePrice'] / (v['Total Volume'] + 1)
+
+
+@registrar_variable('small_bag_dominance', ['Small Bags', 'Total Bags'])
+def _small_bag_dominance(v):
+    return v['Small Bags'] / (v['Total Bags'] + 1)
+
+
+@registrar_variable('large_bag_dominance', ['Large Bags', 'Total Bags'])
+def _large_bag_dominance(v):
+    return v['Large Bags'] / (v['Total Bags'] + 1)
+
+
+@registrar_variable('month', ['_fecha'])
+def _month(v):
+    return v['_fecha'].dt.month
+
+
+@registrar_variable('quarter', ['_fecha'])
+def _quarter(v):
+    return v['_fecha'].dt.quarter
+
+
+@registrar_variable('week_of_year', ['_fecha'])
+def _week_of_year(v):
+    return v['_fecha'].dt.isocalendar().week
+
+
+@registrar_variable('total_plu_volume', ['4046', '4225', '4770'])
+def _total_plu_volume(v):
+    return v['4046'] + v['4225'] + v['4770']
+
+
+@registrar_variable('price_category', ['AveragePrice'])
+def _price_category(v):
+    return pd.cut(
+        v['AveragePrice'],
+        bins=[0, 1.0, 1.5, 2.0, float('inf')],
+        labels=['Bajo', 'Medio', 'Alto', 'Premium']
+    )
+
+
+@registrar_variable('type_price_interaction', ['type_encoded', 'AveragePrice'])
+def _type_price_interaction(v):
+    return v['type_encoded'] * v['AveragePrice']
+
+
+def variables_disponibles(intermedias=False):
+    """Nombres de las variables registradas, en orden de registro."""
+    return [nombre for nombre, (_, _, intermedia) in REGISTRO_VARIABLES.items()
+            if intermedias or not intermedia]
+
+
+# ==============================================================================
+# II. MOTOR DE CÁLCULO PEREZOSO
+# ==============================================================================
+class MotorVariables:
+    """
+    Calcula variables derivadas bajo demanda sobre un DataFrame.
+
+    motor['month'] calcula la variable (y sus dependencias) la primera vez y la
+    memoriza; las intermedias como la fecha parseada se calculan una sola vez
+    aunque varias variables las usen. Nada se añade al DataFrame hasta llamar
+    a anadir(), que inserta todas las columnas pedidas en una única concatenación.
+
+    Una columna que ya existe en el DataFrame manda sobre la variable
+    registrada del mismo nombre: se devuelve tal cual y no se recalcula.
+
+    Parámetros:
+    - df: DataFrame de entrada
+    - precalculadas: Valores ya conocidos (p. ej. {'type_encoded': ...} del
+      LabelEncoder ajustado) que sustituyen a la versión registrada
+    """
+
+    def __init__(self, df, precalculadas=None):
+        self.df = df
+        self._valores = dict(precalculadas or {})
+
+    def __contains__(self, nombre):
+        return nombre in self._valores or nombre in self.df.columns or self._se_puede_calcular(nombre)
+
+    def __getitem__(self, nombre):
+        if nombre in self._valores:
+            return self._valores[nombre]
+        if nombre in self.df.columns:
+            return self.df[nombre]
+        if nombre in REGISTRO_VARIABLES:
+            entradas, funcion, _ = REGISTRO_VARIABLES[nombre]
+            faltan = [e for e in entradas if e not in self]
+            if faltan:
+                raise KeyError(f"La variable '{nombre}' necesita {faltan}")
+            valor = funcion(self)
+            self._valores[nombre] = valor
+            return valor
+        raise KeyError(f"Variable desconocida: '{nombre}'")
+
+    def _se_puede_calcular(self, nombre):
+        if nombre not in REGISTRO_VARIABLES:
+            return False
+        entradas = REGISTRO_VARIABLES[nombre][0]
+        return all(e in self for e in entradas)
+
+    def calcular(self, nombres=None):
+        """
+        Devuelve {nombre: valores} de las variables pedidas.
+
+        Con nombres=None se calculan todas las registradas cuyas entradas existen
+        (p. ej. sin 'Date' se omiten las temporales, como hacía el código original)
+        y que no son ya columnas del DataFrame.
+        """
+        if nombres is None:
+            nombres = [n for n in variables_disponibles() if n not in self.df.columns and n in self]
+        return {nombre: self[nombre] for nombre in nombres}
+
+    def anadir(self, nombres=None):
+        """Devuelve df con las variables pedidas añadidas en una sola concatenación."""
+        # Las que ya son columnas se conservan como están en lugar de duplicarlas
+        valores = {n: v for n, v in self.calcular(nombres).items() if n not in self.df.columns}
+        nuevas = pd.DataFrame(
+            {n: (v if isinstance(v, pd.Series) else np.asarray(v)) for n, v in valores.items()},
+            index=self.df.index
+        )
+        return pd.concat([self.df, nuevas], axis=1)
@@ -0,0 +1,314 @@
+import cProfile
+import functools
+import json
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Instrumentación activa del proceso (None = desactivada, los decoradores no miden nada)
+_ACTIVA = None
+
+PREFIJO_METRICAS = 'aguacates_etapa'
+
+
+# ==============================================================================
+# I. DESTINOS DE LAS MÉTRICAS
+# ==============================================================================
+class SinkMemoria:
+    """Guarda los registros en una lista (p. ej. para el resumen JSON de main)."""
+
+    def __init__(self):
+        self.registros = []
+
+    def emitir(self, registro):
+        self.registros.append(registro)
+
+
+class SinkJsonLineas:
+    """Añade cada registro como una línea JSON al fichero indicado."""
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    def emitir(self, registro):
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(registro, ensure_ascii=False) + '\n')
+
+
+class SinkPrometheus:
+    """
+    Fichero de texto en formato de exposición de Prometheus (textfile collector).
+
+    Conserva la última medición de cada etapa y un contador de ejecuciones, y
+    reescribe el fichero completo de forma atómica en cada registro.
+    """
+
+    METRICAS = [
+        ('segundos', 'segundos', 'Tiempo de reloj de la última ejecución'),
+        ('cpu_segundos', 'cpu_segundos', 'Tiempo de CPU de la última ejecución'),
+        ('pico_memoria_mb', 'pico_memoria_bytes', 'Pico de memoria de Python (tracemalloc)'),
+        ('rss_pico_mb', 'rss_pico_bytes', 'Pico de RSS del proceso al terminar la etapa'),
+        ('filas_entrada', 'filas_entrada', 'Filas de entrada'),
+        ('filas_salida', 'filas_salida', 'Filas de salida'),
+    ]
+
+    def __init__(self, ruta):
+        self.ruta = Path(ruta)
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        self.ultimos = {}
+        self.ejecuciones = {}
+
+    def emitir(self, registro):
+        etapa = registro['etapa']
+        self.ultimos[etapa] = registro
+        self.ejecuciones[etapa] = self.ejecuciones.get(etapa, 0) + 1
+        self._escribir()
+
+    def _escribir(self):
+        lineas = []
+        for clave, nombre, ayuda in self.METRICAS:
+            metrica = f'{PREFIJO_METRICAS}_{nombre}'
+            lineas += [f'# HELP {metrica} {ayuda}', f'# TYPE {metrica} gauge']
+            for etapa, registro in self.ultimos.items():
+                valor = registro.get(clave)
+                if valor is None:
+                    continue
+                if nombre.endswith('_bytes'):
+                    valor = valor * 1024 ** 2
+                lineas.append(f'{metrica}{{etapa="{etapa}"}} {valor:.6g}')
+        metrica = f'{PREFIJO_METRICAS}_ejecuciones_total'
+        lineas += [f'# HELP {metrica} Ejecuciones de la etapa', f'# TYPE {metrica} counter']
+        lineas += [f'{metrica}{{etapa="{etapa}"}} {n}' for etapa, n in self.ejecuciones.items()]
+
+        temporal = self.ruta.with_suffix(self.ruta.suffix + '.tmp')
+        temporal.write_text('\n'.join(lineas) + '\n', encoding='utf-8')
+        temporal.replace(self.ruta)
+
+
+# ==============================================================================
+# II. MEDICIÓN DE ETAPAS
+# ==============================================================================
+def _rss_pico_mb():
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss está en KB en Linux y en bytes en macOS
+    return pico / 1024 ** 2 if sys.platform == 'darwin' else pico / 1024
+
+
+# Medidas de pico abiertas en cualquier hilo. tracemalloc guarda un único pico
+# por proceso: antes de reiniciarlo se apunta en todas las medidas abiertas
+_MEDIDAS_PICO = []
+_CERROJO_PICO = threading.Lock()
+
+
+class MedidaPico:
+    """
+    Pico de memoria de tracemalloc de un bloque, válido con medidas anidadas.
+
+    Al crearse reinicia el pico de tracemalloc, pero antes lo anota en las
+    demás medidas abiertas, así que una medida interna (o la de otro hilo) no
+    borra el pico de la externa. Se usa como contexto o con terminar();
+    pico_mb es el pico por encima de la memoria al empezar.
+    """
+
+    def __init__(self):
+        with _CERROJO_PICO:
+            actual, pico = tracemalloc.get_traced_memory()
+            for medida in _MEDIDAS_PICO:
+                medida.pico = max(medida.pico, pico)
+            tracemalloc.reset_peak()
+            self.inicial = self.pico = actual
+            self.pico_mb = None
+            _MEDIDAS_PICO.append(self)
+
+    def terminar(self):
+        """Cierra la medida y devuelve el pico en MB."""
+        with _CERROJO_PICO:
+            if self in _MEDIDAS_PICO:
+                self.pico = max(self.pico, tracemalloc.get_traced_memory()[1])
+                _MEDIDAS_PICO.remove(self)
+                self.pico_mb = (self.pico - self.inicial) / 1024 ** 2
+        return self.pico_mb
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excepcion):
+        self.terminar()
+
+
+def _contar_filas(valor):
+    """Filas de un DataFrame/array, o del primer elemento de una tupla de resultados."""
+    if isinstance(valor, tuple) and valor:
+        valor = valor[0]
+    forma = getattr(valor, 'shape', None)
+    return int(forma[0]) if forma else None
+
+
+class Instrumentacion:
+    """
+    Mide etapas del pipeline y envía un registro por etapa a los sinks.
+
+    Cada registro incluye tiempo de reloj y de CPU, pico de memoria de Python
+    (tracemalloc, relativo al inicio de la etapa), pico de RSS del proceso,
+    filas de entrada y salida y la etapa padre si está anidada. Las etapas
+    anidadas se miden correctamente: el pico de una etapa interna también
+    cuenta para la externa. Cada hilo tiene su propia pila de etapas, así que
+    las etapas de un hilo secundario no se anidan en las del principal.
+
+    Parámetros:
+    - sinks: Lista de destinos con un método emitir(registro)
+    - medir_memoria: Si es True activa tracemalloc (ralentiza la ejecución)
+    - dir_perfiles: Si se indica, cada etapa de primer nivel se ejecuta bajo
+      cProfile y su perfil se guarda en dir_perfiles/<etapa>.prof
+    """
+
+    def __init__(self, sinks=None, medir_memoria=True, dir_perfiles=None):
+        self.sinks = list(sinks or [])
+        self.medir_memoria = medir_memoria
+        self.dir_perfiles = Path(dir_perfiles) if dir_perfiles else None
+        self._hilo = threading.local()
+
+    @property
+    def _pila(self):
+        pila = getattr(self._hilo, 'pila', None)
+        if pila is None:
+            pila = self._hilo.pila = []
+        return pila
+
+    @contextmanager
+    def etapa(self, nombre, filas_entrada=None):
+        """
+        Mide el bloque 'with' como una etapa. Devuelve el registro, en el que se
+        puede fijar registro['filas_salida'] antes de salir.
+        """
+        registro = {
+            'etapa': nombre,
+            'inicio': datetime.now(timezone.utc).isoformat(timespec='milliseconds'),
+            'padre': self._pila[-1]['registro']['etapa'] if self._pila else None,
+            'filas_entrada': filas_entrada,
+            'filas_salida': None,
+        }
+        marco = self._entrar(registro)
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield registro
+        except BaseException as e:
+            registro['error'] = f'{type(e).__name__}: {e}'
+            raise
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 6)
+            registro['cpu_segundos'] = round(time.process_time() - inicio_cpu, 6)
+            self._salir(marco)
+            for sink in self.sinks:
+                sink.emitir(registro)
+
+    def _entrar(self, registro):
+        marco = {'registro': registro, 'perfil': None, 'memoria': None, 'iniciado_aqui': False}
+        if self.medir_memoria:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                marco['iniciado_aqui'] = True
+            marco['memoria'] = MedidaPico()
+        if self.dir_perfiles is not None and not any(m['perfil'] for m in self._pila):
+            perfil = cProfile.Profile()
+            try:
+                perfil.enable()
+                marco['perfil'] = perfil
+            except ValueError:
+                # Ya hay otro perfilador activo (p. ej. la etapa de otro hilo)
+                pass
+        self._pila.append(marco)
+        return marco
+
+    def _salir(self, marco):
+        self._pila.pop()
+        registro = marco['registro']
+        if marco['perfil'] is not None:
+            marco['perfil'].disable()
+            self.dir_perfiles.mkdir(parents=True, exist_ok=True)
+            ruta = self.dir_perfiles / f"{registro['etapa']}.prof"
+            marco['perfil'].dump_stats(ruta)
+            registro['perfil'] = str(ruta)
+        if marco['memoria'] is not None:
+            registro['pico_memoria_mb'] = round(marco['memoria'].terminar(), 3)
+            if marco['iniciado_aqui']:
+                tracemalloc.stop()
+        else:
+            registro['pico_memoria_mb'] = None
+        rss = _rss_pico_mb()
+        registro['rss_pico_mb'] = None if rss is None else round(rss, 1)
+
+    def emitir_externos(self, registros):
+        """
+        Envía a los sinks registros medidos en otro proceso (p. ej. un worker del
+        pool de gráficos). Los que no tienen padre cuelgan de la etapa actual.
+        """
+        padre = self._pila[-1]['registro']['etapa'] if self._pila else None
+        for registro in registros:
+            if registro.get('padre') is None:
+                registro['padre'] = padre
+            for sink in self.sinks:
+                sink.emitir(registro)
+
+
+def configurar_instrumentacion(sinks=None, medir_memoria=True, dir_perfiles=None):
+    """Activa la instrumentación para todo el proceso y la devuelve."""
+    global _ACTIVA
+    _ACTIVA = Instrumentacion(sinks, medir_memoria, dir_perfiles)
+    return _ACTIVA
+
+
+def desactivar_instrumentacion():
+    global _ACTIVA
+    _ACTIVA = None
+
+
+def instrumentacion_activa():
+    return _ACTIVA
+
+
+@contextmanager
+def etapa(nombre, filas_entrada=None):
+    """Como Instrumentacion.etapa, sobre la instrumentación activa (sin efecto si no hay)."""
+    if _ACTIVA is None:
+        yield {}
+        return
+    with _ACTIVA.etapa(nombre, filas_entrada) as registro:
+        yield registro
+
+
+def instrumentar(nombre=None):
+    """
+    Decorador que mide cada llamada como una etapa con el nombre de la función.
+
+    Las filas de entrada se toman del primer argumento y las de salida del
+    resultado (o de su primer elemento si es una tupla). Sin instrumentación
+    activa la función se llama directamente.
+    """
+    def decorador(funcion):
+        nombre_etapa = nombre or funcion.__name__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if _ACTIVA is None:
+                return funcion(*args, **kwargs)
+            entrada = _contar_filas(args[0]) if args else None
+            with _ACTIVA.etapa(nombre_etapa, entrada) as registro:
+                resultado = funcion(*args, **kwargs)
+                registro['filas_salida'] = _contar_filas(resultado)
+            return resultado
+        return envoltura
+    return decorador
+
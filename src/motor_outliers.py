@@ -0,0 +1,253 @@
+import numpy as np
+import pandas as pd
+
+# Columnas y agrupación por defecto del método IQR por grupos
+COLUMNAS_IQR = ['AveragePrice', 'Total Volume']
+GRUPOS_IQR = ['region', 'type']
+
+FACTOR_IQR = 1.5
+
+# Desplazamiento que mantiene ordenadas las claves de los cubos del sketch:
+# negativos < 0 < positivos
+_DESPLAZAMIENTO_CLAVE = 1 << 15
+
+
+def _grupos(grupos, por_anio):
+    grupos = list(grupos)
+    if por_anio and 'year' not in grupos:
+        grupos.append('year')
+    return grupos
+
+
+def _claves_grupo(df, grupos):
+    """Claves de grupo como arrays planos (evita categorías no observadas entre bloques)."""
+    return [np.asarray(df[g]) for g in grupos]
+
+
+def _limites_desde_cuartiles(cuartiles, columnas, factor):
+    """Construye la tabla de límites a partir de un DataFrame con columnas (col, 0.25/0.75)."""
+    partes = {}
+    for col in columnas:
+        Q1 = cuartiles[(col, 0.25)]
+        Q3 = cuartiles[(col, 0.75)]
+        IQR = Q3 - Q1
+        partes[(col, 'Q1')] = Q1
+        partes[(col, 'Q3')] = Q3
+        partes[(col, 'inferior')] = Q1 - factor * IQR
+        partes[(col, 'superior')] = Q3 + factor * IQR
+    limites = pd.DataFrame(partes)
+    limites.columns = pd.MultiIndex.from_tuples(limites.columns, names=['columna', 'estadistico'])
+    return limites
+
+
+# ==============================================================================
+# I. LÍMITES IQR EXACTOS POR GRUPO (EN MEMORIA)
+# ==============================================================================
+def calcular_limites_iqr(df, columnas=None, grupos=GRUPOS_IQR, por_anio=False, factor=FACTOR_IQR):
+    """
+    Calcula los límites IQR de cada columna por grupo en una sola pasada groupby.
+
+    Parámetros:
+    - df: DataFrame con los datos
+    - columnas: Columnas numéricas a analizar (por defecto AveragePrice y Total Volume)
+    - grupos: Columnas de agrupación (por defecto region × type)
+    - por_anio: Si es True añade 'year' a la agrupación
+    - factor: Multiplicador del IQR para los límites
+
+    Devuelve un DataFrame indexado por grupo con columnas (columna, Q1/Q3/inferior/superior).
+    """
+    columnas = [col for col in (columnas or COLUMNAS_IQR) if col in df.columns]
+    grupos = _grupos(grupos, por_anio)
+
+    cuartiles = (
+        df[columnas]
+        .groupby(_claves_grupo(df, grupos))
+        .quantile([0.25, 0.75])
+        .unstack()
+    )
+    cuartiles.index.names = grupos
+    return _limites_desde_cuartiles(cuartiles, columnas, factor)
+
+
+def mascara_dentro_limites(df, limites, columnas=None):
+    """
+    Devuelve un array booleano con True para las filas dentro de los límites de su grupo.
+
+    Las filas de grupos sin límites calculados se conservan; las que tienen
+    valores nulos en las columnas analizadas se descartan (como en eliminar_outliers).
+    """
+    grupos = list(limites.index.names)
+    if columnas is None:
+        columnas = list(limites.columns.get_level_values('columna').unique())
+
+    claves = _claves_grupo(df, grupos)
+    if len(grupos) == 1:
+        posiciones = limites.index.get_indexer(claves[0])
+    else:
+        posiciones = limites.index.get_indexer(pd.MultiIndex.from_arrays(claves))
+    conocido = posiciones >= 0
+    posiciones = np.where(conocido, posiciones, 0)
+
+    mascara = np.ones(len(df), dtype=bool)
+    for col in columnas:
+        valores = df[col].to_numpy()
+        inferior = limites[(col, 'inferior')].to_numpy()[posiciones]
+        superior = limites[(col, 'superior')].to_numpy()[posiciones]
+        dentro = (valores >= inferior) & (valores <= superior)
+        mascara &= dentro | (~conocido & ~pd.isna(valores))
+    return mascara
+
+
+def eliminar_outliers_por_grupo(df, columnas=None, grupos=GRUPOS_IQR, por_anio=False, factor=FACTOR_IQR):
+    """
+    Versión por grupos de eliminar_outliers: cada región × tipo (y opcionalmente
+    año) tiene sus propios límites IQR.
+    """
+    print("\n--- Tratamiento de Outliers por Grupo (Método IQR) ---")
+    columnas = [col for col in (columnas or COLUMNAS_IQR) if col in df.columns]
+    grupos = _grupos(grupos, por_anio)
+
+    limites = calcular_limites_iqr(df, columnas, grupos, factor=factor)
+    df_limpio = df[mascara_dentro_limites(df, limites, columnas)]
+
+    print(f"Límites calculados para {len(limites)} grupos ({' × '.join(grupos)}).")
+    print(f"Se eliminaron {df.shape[0] - df_limpio.shape[0]} filas por outliers en {columnas}.")
+    return df_limpio
+
+
+# ==============================================================================
+# II. MODO STREAMING: SKETCH DE CUANTILES FUSIONABLE
+# ==============================================================================
+class SketchCuantilesPorGrupo:
+    """
+    Sketch de cuantiles fusionable (estilo DDSketch) para cada grupo y columna.
+
+    Cada valor se asigna a un cubo logarítmico de razón gamma = (1+alfa)/(1-alfa);
+    el sketch solo guarda el número de valores por (grupo, cubo). Los cuantiles
+    interpolan entre rangos vecinos como DataFrame.quantile y están a un error
+    relativo máximo 'alfa' del cuantil exacto (ver cuantiles()), la memoria
+    depende del rango de valores (no del número de filas) y dos sketches se
+    fusionan sumando sus conteos.
+
+    Parámetros:
+    - columnas: Columnas numéricas a resumir
+    - grupos: Columnas de agrupación ([] = un único grupo con todas las filas)
+    - por_anio: Si es True añade 'year' a la agrupación
+    - alfa: Error relativo máximo de los cuantiles (por defecto 1%)
+    """
+
+    def __init__(self, columnas=None, grupos=GRUPOS_IQR, por_anio=False, alfa=0.01):
+        self.columnas = list(columnas or COLUMNAS_IQR)
+        self.grupos = _grupos(grupos, por_anio)
+        self.alfa = alfa
+        self.gamma = (1 + alfa) / (1 - alfa)
+        self._log_gamma = np.log(self.gamma)
+        self.conteos = {col: None for col in self.columnas}
+
+    def _claves(self, valores):
+        claves = np.zeros(len(valores), dtype=np.int64)
+        positivo = valores > 0
+        negativo = valores < 0
+        with np.errstate(divide='ignore'):
+            claves[positivo] = np.ceil(np.log(valores[positivo]) / self._log_gamma) + _DESPLAZAMIENTO_CLAVE
+            claves[negativo] = -(np.ceil(np.log(-valores[negativo]) / self._log_gamma) + _DESPLAZAMIENTO_CLAVE)
+        return claves
+
+    def _valor_clave(self, claves):
+        claves = np.asarray(claves, dtype=np.float64)
+        signo = np.sign(claves)
+        exponente = np.abs(claves) - _DESPLAZAMIENTO_CLAVE
+        valores = 2 * self.gamma ** exponente / (self.gamma + 1)
+        return np.where(claves == 0, 0.0, signo * valores)
+
+    def actualizar(self, bloque):
+        """Añade un bloque de datos al sketch."""
+        claves_grupo = _claves_grupo(bloque, self.grupos)
+        for col in self.columnas:
+            valores = bloque[col].to_numpy(dtype=np.float64)
+            validos = ~np.isnan(valores)
+            datos = {g: c[validos] for g, c in zip(self.grupos, claves_grupo)}
+            datos['clave'] = self._claves(valores[validos])
+            nuevos = pd.DataFrame(datos).value_counts()
+            actuales = self.conteos[col]
+            self.conteos[col] = nuevos if actuales is None else actuales.add(nuevos, fill_value=0)
+        return self
+
+    def fusionar(self, otro):
+        """Fusiona otro sketch con los mismos parámetros en este."""
+        if otro.grupos != self.grupos or otro.alfa != self.alfa:
+            raise ValueError("Solo se pueden fusionar sketches con los mismos grupos y alfa")
+        for col in self.columnas:
+            a, b = self.conteos[col], otro.conteos.get(col)
+            if b is not None:
+                self.conteos[col] = b if a is None else a.add(b, fill_value=0)
+        return self
+
+    def cuantiles(self, q):
+        """
+        Devuelve un DataFrame (grupos × columnas) con el cuantil aproximado q.
+
+        Como DataFrame.quantile (interpolación lineal), con h = q · (n - 1) el
+        cuantil se interpola entre los valores de rango floor(h) y floor(h) + 1.
+        Cada uno se estima con error relativo ≤ alfa y, al interpolar dos
+        valores del mismo signo, el resultado conserva esa cota frente a
+        quantile() y a calcular_limites_iqr.
+        """
+        resultado = {}
+        for col in self.columnas:
+            conteos = self.conteos[col]
+            if conteos is None:
+                continue
+            conteos = conteos.sort_index()
+            if not self.grupos:
+                acumulado = conteos.to_numpy().cumsum()
+                total = acumulado[-1]
+                h = q * (total - 1)
+                bajo = np.floor(h)
+                claves = conteos.index.get_level_values('clave')
+                valores = self._valor_clave([claves[np.argmax(acumulado > bajo)],
+                                             claves[np.argmax(acumulado > min(bajo + 1, total - 1))]])
+                resultado[col] = pd.Series([valores[0] + (h - bajo) * (valores[1] - valores[0])])
+                continue
+            por_grupo = conteos.groupby(level=self.grupos, sort=False)
+            acumulado = por_grupo.cumsum()
+            total = por_grupo.transform('sum')
+            h = q * (total - 1)
+            bajo = np.floor(h)
+            valor_bajo = self._primer_valor(conteos, acumulado > bajo)
+            valor_alto = self._primer_valor(conteos, acumulado > np.minimum(bajo + 1, total - 1))
+            peso = (h - bajo).droplevel('clave').groupby(level=self.grupos, sort=False).first()
+            resultado[col] = valor_bajo + peso.loc[valor_bajo.index] * (valor_alto - valor_bajo)
+        return pd.DataFrame(resultado)
+
+    def _primer_valor(self, conteos, alcanzado):
+        """Valor del primer cubo de cada grupo en el que 'alcanzado' es cierto."""
+        filas = conteos[alcanzado]
+        claves = pd.Series(filas.index.get_level_values('clave').to_numpy(), index=filas.index.droplevel('clave'))
+        primeros = claves.groupby(level=self.grupos, sort=False).first()
+        return pd.Series(self._valor_clave(primeros.to_numpy()), index=primeros.index)
+
+    def limites(self, factor=FACTOR_IQR):
+        """Límites IQR aproximados con el mismo formato que calcular_limites_iqr."""
+        q1, q3 = self.cuantiles(0.25), self.cuantiles(0.75)
+        cuartiles = pd.concat({0.25: q1, 0.75: q3}, axis=1).swaplevel(axis=1)
+        return _limites_desde_cuartiles(cuartiles, list(q1.columns), factor)
+
+
+def calcular_limites_por_bloques(bloques, columnas=None, grupos=GRUPOS_IQR, por_anio=False,
+                                 alfa=0.01, factor=FACTOR_IQR):
+    """
+    Calcula límites IQR por grupo sobre datos que no caben en memoria.
+
+    Parámetros:
+    - bloques: Iterable de DataFrames (p. ej. cargar_datos_por_bloques())
+    - alfa: Error relativo máximo de los cuartiles estimados frente a los
+      interpolados de calcular_limites_iqr
+
+    Devuelve la tabla de límites y el sketch, que puede fusionarse con otros
+    (p. ej. calculados en paralelo sobre distintos ficheros).
+    """
+    sketch = SketchCuantilesPorGrupo(columnas, grupos, por_anio, alfa)
+    for bloque in bloques:
+        sketch.actualizar(bloque)
+    return sketch.limites(factor), sketch
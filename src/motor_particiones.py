@@ -0,0 +1,213 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.motor_outliers import COLUMNAS_IQR, FACTOR_IQR
+
+CLAVES_PARTICION = ['region', 'type']
+
+# Vistas de las columnas compartidas en cada proceso trabajador
+_VISTAS_PROCESO = None
+_SEGMENTOS_PROCESO = None
+
+
+# ==============================================================================
+# I. COLUMNAS EN MEMORIA COMPARTIDA
+# ==============================================================================
+def _crear_segmento(array):
+    segmento = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=segmento.buf)[:] = array
+    return segmento
+
+
+def _vistas(esquema, segmentos):
+    """Arrays numpy sobre los segmentos compartidos (sin copiar)."""
+    return {
+        col: np.ndarray((filas,), dtype=np.dtype(tipo), buffer=segmento.buf)
+        for (col, _, _, tipo, filas, _), segmento in zip(esquema, segmentos)
+    }
+
+
+def _adjuntar(esquema):
+    """Inicializador de los trabajadores: abre los segmentos una vez por proceso."""
+    global _VISTAS_PROCESO, _SEGMENTOS_PROCESO
+    _SEGMENTOS_PROCESO = [shared_memory.SharedMemory(name=nombre) for _, _, nombre, _, _, _ in esquema]
+    _VISTAS_PROCESO = _vistas(esquema, _SEGMENTOS_PROCESO)
+
+
+def _construir_particion(vistas, esquema, inicio, fin):
+    """DataFrame de una partición a partir de las vistas: cada columna es un corte contiguo."""
+    columnas = {}
+    for col, clase, _, _, _, categorias in esquema:
+        valores = vistas[col][inicio:fin]
+        if clase == 'categoria':
+            columnas[col] = pd.Categorical.from_codes(valores, categories=categorias)
+        elif clase == 'fecha':
+            columnas[col] = valores.view(categorias)
+        else:
+            columnas[col] = valores
+    return pd.DataFrame(columnas, copy=False)
+
+
+def _ejecutar_particion(tarea, funcion, esquema, args):
+    clave, inicio, fin = tarea
+    return funcion(clave, _construir_particion(_VISTAS_PROCESO, esquema, inicio, fin), *args)
+
+
+# ==============================================================================
+# II. MOTOR DE EJECUCIÓN POR PARTICIONES
+# ==============================================================================
+class MotorParticiones:
+    """
+    Ejecuta funciones de análisis por partición (p. ej. región × tipo) en un pool de procesos.
+
+    El DataFrame se ordena una vez por las claves y cada columna se copia a un
+    segmento de memoria compartida, así que cada partición es un rango
+    contiguo de filas. Los trabajadores abren los segmentos al arrancar y
+    construyen cada partición como vistas, sin que el DataFrame se serialice
+    por tarea: solo viajan la función, la clave y el rango de filas.
+
+    Las columnas de texto o categóricas se comparten como códigos enteros y
+    las fechas como int64.
+
+    Parámetros:
+    - df: DataFrame con los datos
+    - claves: Columnas que definen las particiones
+    - columnas: Columnas disponibles en cada partición (por defecto todas)
+    - procesos: Procesos del pool (None = núcleos disponibles, 1 = en este proceso)
+
+    Se usa como gestor de contexto para liberar la memoria compartida:
+
+        with MotorParticiones(df) as motor:
+            resumen = motor.ejecutar(resumen_precio)
+    """
+
+    def __init__(self, df, claves=CLAVES_PARTICION, columnas=None, procesos=None):
+        if df.empty:
+            raise ValueError("No se puede particionar un DataFrame vacío")
+        self.claves = list(claves)
+        columnas = list(columnas or df.columns)
+        columnas += [c for c in self.claves if c not in columnas]
+        self.procesos = procesos or os.cpu_count() or 1
+
+        # Orden estable por los códigos de las claves y límites de cada partición
+        codigos = [pd.Categorical(df[c]) for c in self.claves]
+        orden = np.lexsort([c.codes for c in reversed(codigos)])
+        ordenados = np.column_stack([c.codes[orden] for c in codigos])
+        cambios = np.flatnonzero(np.any(ordenados[1:] != ordenados[:-1], axis=1)) + 1
+        inicios = np.concatenate([[0], cambios])
+        fines = np.concatenate([cambios, [len(df)]])
+        indice = pd.MultiIndex.from_arrays(
+            [c.categories[ordenados[inicios, i]] for i, c in enumerate(codigos)], names=self.claves
+        )
+        self.particiones = pd.DataFrame({'inicio': inicios, 'fin': fines}, index=indice)
+
+        self.esquema, self._segmentos = [], []
+        for col in columnas:
+            serie = df[col]
+            if pd.api.types.is_datetime64_any_dtype(serie):
+                valores, clase, extra = serie.to_numpy()[orden].view('int64'), 'fecha', serie.to_numpy().dtype
+            elif pd.api.types.is_numeric_dtype(serie) and not isinstance(serie.dtype, pd.CategoricalDtype):
+                valores, clase, extra = serie.to_numpy()[orden], 'numerica', None
+            else:
+                categorica = pd.Categorical(serie)
+                valores, clase, extra = categorica.codes[orden], 'categoria', categorica.categories
+            valores = np.ascontiguousarray(valores)
+            segmento = _crear_segmento(valores)
+            self._segmentos.append(segmento)
+            self.esquema.append((col, clase, segmento.name, valores.dtype.str, len(valores), extra))
+        self._vistas = _vistas(self.esquema, self._segmentos)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+    def cerrar(self):
+        """Libera los segmentos de memoria compartida."""
+        self._vistas = None
+        for segmento in self._segmentos:
+            segmento.close()
+            segmento.unlink()
+        self._segmentos = []
+
+    def particion(self, clave):
+        """Copia de una partición concreta (p. ej. ('Albany', 'organic'))."""
+        inicio, fin = self.particiones.loc[clave, ['inicio', 'fin']]
+        # Copia: las vistas dejan de ser válidas al cerrar el motor
+        return _construir_particion(self._vistas, self.esquema, int(inicio), int(fin)).copy()
+
+    def ejecutar(self, funcion, *args):
+        """
+        Aplica funcion(clave, df_particion, *args) a cada partición y combina los resultados.
+
+        La función debe estar definida a nivel de módulo (se envía por nombre a
+        los trabajadores). Según lo que devuelva, el resultado es:
+        - dict o Series → DataFrame con una fila por partición
+        - DataFrame → concatenación con las claves como niveles extra del índice
+        - escalar → Series indexada por partición
+        """
+        tareas = [(clave, int(inicio), int(fin))
+                  for clave, inicio, fin in self.particiones[['inicio', 'fin']].itertuples()]
+        procesos = min(self.procesos, len(tareas)) or 1
+
+        if procesos == 1:
+            resultados = [funcion(clave, _construir_particion(self._vistas, self.esquema, inicio, fin), *args)
+                          for clave, inicio, fin in tareas]
+        else:
+            # Varias particiones por envío para amortizar la comunicación
+            tamano_lote = max(1, len(tareas) // (procesos * 4))
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_adjuntar,
+                                     initargs=(self.esquema,)) as pool:
+                resultados = list(pool.map(_ejecutar_particion, tareas, repeat(funcion),
+                                           repeat(self.esquema), repeat(args), chunksize=tamano_lote))
+        return self._combinar(resultados)
+
+    def _combinar(self, resultados):
+        indice = self.particiones.index
+        if resultados and all(isinstance(r, pd.DataFrame) for r in resultados):
+            # copy(): en este proceso los resultados pueden ser vistas de la memoria compartida
+            return pd.concat(resultados, keys=list(indice), names=self.claves).copy()
+        if resultados and all(isinstance(r, (dict, pd.Series)) for r in resultados):
+            combinado = pd.DataFrame([dict(r) for r in resultados], index=indice)
+            if isinstance(combinado.columns[0], tuple):
+                combinado.columns = pd.MultiIndex.from_tuples(combinado.columns, names=['columna', 'estadistico'])
+            return combinado
+        return pd.Series(resultados, index=indice)
+
+
+def analizar_por_particion(df, funcion, *args, claves=CLAVES_PARTICION, columnas=None, procesos=None):
+    """Atajo: crea el motor, ejecuta la función y libera la memoria compartida."""
+    with MotorParticiones(df, claves, columnas, procesos) as motor:
+        return motor.ejecutar(funcion, *args)
+
+
+# ==============================================================================
+# III. ANÁLISIS POR PARTICIÓN INCLUIDOS
+# ==============================================================================
+def resumen_precio(clave, df):
+    """Filas, precio medio, cuartiles/IQR del precio y volumen total de la partición."""
+    q1, mediana, q3 = np.quantile(df['AveragePrice'], [0.25, 0.5, 0.75])
+    return {
+        'filas': len(df),
+        'precio_medio': float(df['AveragePrice'].mean()),
+        'precio_mediana': float(mediana),
+        'IQR': float(q3 - q1),
+        'volumen_total': float(df['Total Volume'].sum()),
+    }
+
+
+def limites_iqr(clave, df, columnas=COLUMNAS_IQR, factor=FACTOR_IQR):
+    """Límites IQR de la partición con el formato de motor_outliers.calcular_limites_iqr."""
+    fila = {}
+    for col in columnas:
+        q1, q3 = df[col].quantile([0.25, 0.75])
+        iqr = q3 - q1
+        fila.update({(col, 'Q1'): q1, (col, 'Q3'): q3,
+                     (col, 'inferior'): q1 - factor * iqr, (col, 'superior'): q3 + factor * iqr})
+    return fila
@@ -0,0 +1,348 @@
+import html
+import json
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.motor_outliers import SketchCuantilesPorGrupo
+
+CUANTILES = [0.25, 0.5, 0.75]
+
+# Error relativo de los cuantiles (sketch fusionable de motor_outliers)
+ALFA_CUANTILES = 0.01
+
+# Valores distintos que se cuentan por columna categórica antes de truncar
+MAX_CATEGORIAS = 10_000
+
+
+# ==============================================================================
+# I. ESTADÍSTICAS FUSIONABLES POR COLUMNA
+# ==============================================================================
+class PerfilDatos:
+    """
+    Perfil de un DataFrame (o de un flujo de bloques) calculado en una pasada.
+
+    Por cada bloque se hace una sola lectura de cada columna: nulos y memoria
+    de todo el bloque, y una única matriz float64 con las columnas numéricas
+    de la que salen conteo, media, varianza (fórmula de Chan), mínimo, máximo
+    y el sketch de cuantiles (las columnas enteras con pocos valores
+    distintos, como el año, guardan conteos exactos y sus cuantiles son
+    exactos). Todas las estadísticas se fusionan sumando, así que dos perfiles
+    de bloques distintos se combinan con fusionar() y el resultado no depende
+    de cómo se partieron los datos (salvo el error relativo 'alfa' de los
+    cuantiles).
+
+    Con cuantiles_exactos=True y un único bloque (un DataFrame en memoria) los
+    cuartiles se calculan además exactos sobre la misma matriz float64, con la
+    interpolación de pandas, así que describe() coincide con df.describe() sin
+    volver a leer los datos. Si después se añade otro bloque o se fusiona otro
+    perfil, se vuelve a los cuantiles del sketch.
+
+    Parámetros:
+    - alfa: Error relativo máximo de los cuantiles
+    - cuantiles_exactos: Cuartiles exactos mientras el perfil tenga un solo bloque
+    - max_categorias: Valores distintos que se cuentan por columna no numérica;
+      por encima la cardinalidad se indica como mínima
+    """
+
+    def __init__(self, alfa=ALFA_CUANTILES, max_categorias=MAX_CATEGORIAS, cuantiles_exactos=False):
+        self.alfa = alfa
+        self.max_categorias = max_categorias
+        self.cuantiles_exactos = cuantiles_exactos
+        self.filas = 0
+        self.bloques = 0
+        self.columnas = {}
+        self.sketch = None
+
+    # ------------------------------------------------------------------
+    # Actualización
+    # ------------------------------------------------------------------
+    def actualizar(self, bloque):
+        """Añade un bloque de datos al perfil."""
+        self.filas += len(bloque)
+        self.bloques += 1
+        if self.bloques > 1:
+            self._descartar_cuantiles_exactos()
+        nulos = bloque.isna().sum()
+        memoria = bloque.memory_usage(index=False, deep=True)
+
+        for col in bloque.columns:
+            estado = self.columnas.setdefault(col, {'tipos': [], 'nulos': 0, 'memoria_bytes': 0})
+            tipo = str(bloque[col].dtype)
+            if tipo not in estado['tipos']:
+                estado['tipos'].append(tipo)
+            estado['nulos'] += int(nulos[col])
+            estado['memoria_bytes'] += int(memoria[col])
+
+        numericas = [c for c in bloque.columns
+                     if pd.api.types.is_numeric_dtype(bloque[c]) and not pd.api.types.is_bool_dtype(bloque[c])]
+        fechas = [c for c in bloque.columns if pd.api.types.is_datetime64_any_dtype(bloque[c])]
+        resto = [c for c in bloque.columns if c not in numericas and c not in fechas]
+
+        if numericas:
+            self._actualizar_numericas(bloque[numericas], len(bloque) - nulos[numericas].to_numpy())
+        for col in fechas:
+            self._actualizar_fechas(col, bloque[col])
+        for col in resto:
+            self._actualizar_categoricas(col, bloque[col])
+        return self
+
+    def _actualizar_numericas(self, numericas, n):
+        valores = numericas.to_numpy(dtype=np.float64)
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            warnings.simplefilter('ignore', RuntimeWarning)
+            media = np.nansum(valores, axis=0) / n
+            m2 = np.nansum((valores - media) ** 2, axis=0)
+            minimo, maximo = np.nanmin(valores, axis=0), np.nanmax(valores, axis=0)
+            exactos = (np.nanquantile(valores, CUANTILES, axis=0)
+                       if self.cuantiles_exactos and self.bloques == 1 else None)
+
+        for i, col in enumerate(numericas.columns):
+            self._fusionar_momentos(self.columnas[col], {
+                'n': int(n[i]), 'media': float(media[i]), 'm2': float(m2[i]),
+                'minimo': float(minimo[i]), 'maximo': float(maximo[i]),
+            })
+            if exactos is not None:
+                self.columnas[col]['cuantiles'] = dict(zip(CUANTILES, exactos[:, i].tolist()))
+
+        # Columnas enteras (año, códigos...): conteo exacto mientras tengan pocos valores
+        for col in numericas.columns:
+            if pd.api.types.is_integer_dtype(numericas[col]):
+                self._acumular_exactos(self.columnas[col], numericas[col].value_counts())
+
+        if self.sketch is None:
+            self.sketch = SketchCuantilesPorGrupo(list(numericas.columns), grupos=[], alfa=self.alfa)
+        nuevas = [c for c in numericas.columns if c not in self.sketch.conteos]
+        for col in nuevas:
+            self.sketch.columnas.append(col)
+            self.sketch.conteos[col] = None
+        self.sketch.actualizar(numericas)
+
+    @staticmethod
+    def _fusionar_momentos(estado, nuevo):
+        """Combina conteo, media y suma de cuadrados (Chan et al.) y extremos."""
+        if nuevo['n'] == 0:
+            return
+        n_a = estado.get('n', 0)
+        if n_a == 0:
+            estado.update(nuevo)
+            return
+        n = n_a + nuevo['n']
+        delta = nuevo['media'] - estado['media']
+        estado['media'] += delta * nuevo['n'] / n
+        estado['m2'] += nuevo['m2'] + delta ** 2 * n_a * nuevo['n'] / n
+        estado['n'] = n
+        estado['minimo'] = min(estado['minimo'], nuevo['minimo'])
+        estado['maximo'] = max(estado['maximo'], nuevo['maximo'])
+
+    def _acumular_exactos(self, estado, conteos):
+        if estado.get('exactos_desbordados'):
+            return
+        previos = estado.get('valores_exactos')
+        conteos = conteos if previos is None else previos.add(conteos, fill_value=0)
+        if len(conteos) > self.max_categorias:
+            estado.pop('valores_exactos', None)
+            estado['exactos_desbordados'] = True
+        else:
+            estado['valores_exactos'] = conteos
+
+    @staticmethod
+    def _cuantil_exacto(conteos, q):
+        """Cuantil con interpolación lineal (como pandas) a partir de conteos por valor."""
+        conteos = conteos.sort_index()
+        valores = conteos.index.to_numpy(dtype=np.float64)
+        acumulado = conteos.to_numpy().cumsum()
+        posicion = q * (acumulado[-1] - 1)
+        bajo, alto = (valores[np.searchsorted(acumulado, p, side='right')]
+                      for p in (np.floor(posicion), np.ceil(posicion)))
+        return float(bajo + (posicion - np.floor(posicion)) * (alto - bajo))
+
+    def _actualizar_fechas(self, col, valores):
+        estado = self.columnas[col]
+        validos = valores.dropna()
+        if validos.empty:
+            return
+        minimo, maximo = validos.min(), validos.max()
+        estado['minimo'] = minimo if 'minimo' not in estado else min(estado['minimo'], minimo)
+        estado['maximo'] = maximo if 'maximo' not in estado else max(estado['maximo'], maximo)
+
+    def _actualizar_categoricas(self, col, valores):
+        estado = self.columnas[col]
+        conteos = valores.value_counts(dropna=True)
+        conteos = conteos[conteos > 0]
+        conteos.index = conteos.index.astype(object)
+        previos = estado.get('conteos')
+        conteos = conteos if previos is None else previos.add(conteos, fill_value=0)
+        if len(conteos) > self.max_categorias:
+            conteos = conteos.nlargest(self.max_categorias)
+            estado['truncada'] = True
+        estado['conteos'] = conteos
+
+    def _descartar_cuantiles_exactos(self):
+        # Los cuartiles exactos de un bloque no se pueden combinar con otro
+        for estado in self.columnas.values():
+            estado.pop('cuantiles', None)
+
+    @property
+    def exacto(self):
+        """True si los cuartiles de describe() e informe() son exactos."""
+        return all('cuantiles' in e or 'valores_exactos' in e
+                   for e in self.columnas.values() if 'n' in e)
+
+    def fusionar(self, otro):
+        """Fusiona otro perfil (p. ej. de otro fichero o proceso) en este."""
+        self._descartar_cuantiles_exactos()
+        self.filas += otro.filas
+        self.bloques += otro.bloques
+        for col, nuevo in otro.columnas.items():
+            estado = self.columnas.setdefault(col, {'tipos': [], 'nulos': 0, 'memoria_bytes': 0})
+            estado['tipos'] += [t for t in nuevo['tipos'] if t not in estado['tipos']]
+            estado['nulos'] += nuevo['nulos']
+            estado['memoria_bytes'] += nuevo['memoria_bytes']
+            if 'n' in nuevo:
+                self._fusionar_momentos(estado, {k: nuevo[k] for k in ('n', 'media', 'm2', 'minimo', 'maximo')})
+                if nuevo.get('exactos_desbordados'):
+                    estado.pop('valores_exactos', None)
+                    estado['exactos_desbordados'] = True
+                elif 'valores_exactos' in nuevo:
+                    self._acumular_exactos(estado, nuevo['valores_exactos'])
+            elif 'conteos' in nuevo:
+                previos = estado.get('conteos')
+                estado['conteos'] = nuevo['conteos'] if previos is None else previos.add(nuevo['conteos'], fill_value=0)
+                estado['truncada'] = estado.get('truncada', False) or nuevo.get('truncada', False)
+            elif 'minimo' in nuevo:
+                for clave, funcion in (('minimo', min), ('maximo', max)):
+                    estado[clave] = nuevo[clave] if clave not in estado else funcion(estado[clave], nuevo[clave])
+        if otro.sketch is not None:
+            if self.sketch is None:
+                self.sketch = SketchCuantilesPorGrupo(list(otro.sketch.columnas), grupos=[], alfa=self.alfa)
+            for col in otro.sketch.columnas:
+                if col not in self.sketch.conteos:
+                    self.sketch.columnas.append(col)
+                    self.sketch.conteos[col] = None
+            self.sketch.fusionar(otro.sketch)
+        return self
+
+    # ------------------------------------------------------------------
+    # Resultados
+    # ------------------------------------------------------------------
+    def informe(self):
+        """Diccionario serializable con el perfil de cada columna."""
+        cuantiles = {}
+        if self.sketch is not None:
+            for q in CUANTILES:
+                fila = self.sketch.cuantiles(q)
+                cuantiles[q] = fila.iloc[0].to_dict() if not fila.empty else {}
+
+        columnas = {}
+        for col, estado in self.columnas.items():
+            info = {
+                'tipo': estado['tipos'][0] if len(estado['tipos']) == 1 else estado['tipos'],
+                'no_nulos': self.filas - estado['nulos'],
+                'nulos': estado['nulos'],
+                'pct_nulos': round(100 * estado['nulos'] / self.filas, 4) if self.filas else 0.0,
+                'memoria_bytes': estado['memoria_bytes'],
+            }
+            if 'n' in estado:
+                varianza = estado['m2'] / (estado['n'] - 1) if estado['n'] > 1 else float('nan')
+                info.update({
+                    'media': estado['media'], 'std': float(np.sqrt(varianza)),
+                    'min': estado['minimo'], 'max': estado['maximo'],
+                })
+                for q in CUANTILES:
+                    if 'cuantiles' in estado:
+                        valor = estado['cuantiles'][q]
+                    elif 'valores_exactos' in estado:
+                        valor = self._cuantil_exacto(estado['valores_exactos'], q)
+                    else:
+                        valor = self._acotar(cuantiles.get(q, {}).get(col), estado)
+                    info[f'{int(q * 100)}%'] = valor
+            elif 'conteos' in estado:
+                conteos = estado['conteos']
+                info['cardinalidad'] = int(len(conteos))
+                info['cardinalidad_minima'] = bool(estado.get('truncada', False))
+                if len(conteos):
+                    info['top'] = str(conteos.idxmax())
+                    info['frecuencia_top'] = int(conteos.max())
+            elif 'minimo' in estado:
+                info['min'] = str(estado['minimo'])
+                info['max'] = str(estado['maximo'])
+            columnas[col] = info
+
+        return {
+            'filas': self.filas,
+            'bloques': self.bloques,
+            'memoria_total_bytes': sum(e['memoria_bytes'] for e in self.columnas.values()),
+            'error_relativo_cuantiles': 0.0 if self.exacto else self.alfa,
+            'columnas': columnas,
+        }
+
+    @staticmethod
+    def _acotar(valor, estado):
+        # El representante del cubo del sketch puede salirse del rango observado
+        if valor is None or np.isnan(valor):
+            return valor
+        return float(min(max(valor, estado['minimo']), estado['maximo']))
+
+    def tabla_columnas(self):
+        """Resumen por columna (tipo, nulos, memoria, cardinalidad), al estilo de df.info()."""
+        informe = self.informe()['columnas']
+        tabla = pd.DataFrame(informe).T
+        campos = ['tipo', 'no_nulos', 'nulos', 'pct_nulos', 'memoria_bytes', 'cardinalidad']
+        tabla = tabla.reindex(columns=campos)
+        return tabla.astype({'no_nulos': 'int64', 'nulos': 'int64', 'pct_nulos': 'float64',
+                             'memoria_bytes': 'int64', 'cardinalidad': 'Int64'})
+
+    def describe(self):
+        """Estadísticas de las columnas numéricas con el formato de df.describe()."""
+        informe = self.informe()['columnas']
+        filas = {col: {'count': info['no_nulos'], 'mean': info['media'], 'std': info['std'],
+                       'min': info['min'], '25%': info['25%'], '50%': info['50%'],
+                       '75%': info['75%'], 'max': info['max']}
+                 for col, info in informe.items() if 'media' in info}
+        return pd.DataFrame(filas)
+
+    def guardar(self, ruta):
+        """Guarda el informe en JSON o HTML según la extensión de 'ruta'."""
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        if ruta.suffix.lower() in ('.html', '.htm'):
+            ruta.write_text(self.html(), encoding='utf-8')
+        else:
+            ruta.write_text(json.dumps(self.informe(), indent=2, ensure_ascii=False, default=str),
+                            encoding='utf-8')
+        return ruta
+
+    def html(self):
+        informe = self.informe()
+        cabecera = (f"<h1>Perfil de datos</h1><p>{informe['filas']} filas · "
+                    f"{len(informe['columnas'])} columnas · "
+                    f"{informe['memoria_total_bytes'] / 1024 ** 2:.2f} MB · "
+                    + ("cuantiles exactos</p>" if self.exacto else
+                       f"cuantiles con error relativo ≤ {html.escape(str(self.alfa))}</p>"))
+        return (
+            "<!DOCTYPE html><html><head><meta charset='utf-8'><title>Perfil de datos</title></head><body>"
+            + cabecera
+            + "<h2>Columnas</h2>" + self.tabla_columnas().to_html(na_rep='')
+            + "<h2>Estadísticas</h2>" + self.describe().to_html(float_format='{:.4g}'.format)
+            + "</body></html>"
+        )
+
+
+def perfilar(datos, alfa=ALFA_CUANTILES, max_categorias=MAX_CATEGORIAS, cuantiles_exactos=None):
+    """
+    Perfil de un DataFrame o de un iterable de bloques (p. ej. cargar_datos_por_bloques()).
+
+    Con bloques solo se mantiene uno en memoria a la vez. Por defecto los
+    cuartiles son exactos para un DataFrame y aproximados para bloques.
+    """
+    en_memoria = isinstance(datos, pd.DataFrame)
+    if cuantiles_exactos is None:
+        cuantiles_exactos = en_memoria
+    perfil = PerfilDatos(alfa, max_categorias, cuantiles_exactos)
+    bloques = [datos] if en_memoria else datos
+    for bloque in bloques:
+        perfil.actualizar(bloque)
+    return perfil
@@ -0,0 +1,215 @@
+import hashlib
+import json
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.carga_datos import cargar_datos_por_bloques, concatenar_bloques, obtener_ruta_csv, RUTA_LIMPIO
+from src.correlaciones import MotorCorrelaciones, columnas_numericas
+from src.dataset_particionado import guardar_dataset_limpio
+from src.limpieza_datos import PipelineLimpieza
+from src.transformacion_datos import PipelineTransformacion
+
+# Carpeta (junto al CSV de origen) donde se persiste el estado incremental
+DIR_ESTADO = '.estado'
+ARCHIVO_ESTADO = 'estado_incremental.json'
+ARCHIVO_PIPELINE = 'pipeline_transformacion.joblib'
+
+COLUMNAS_OUTLIERS = ['AveragePrice', 'Total Volume']
+
+# Bytes finales de lo ya leído cuyo hash se guarda para detectar si el CSV se reescribió
+BYTES_COLA = 4096
+
+# Precisión completa para lo que se añade al dataset limpio
+ESQUEMA_COMPLETO = {
+    col: 'float64' for col in [
+        "AveragePrice", "Total Volume", "4046", "4225", "4770",
+        "Total Bags", "Small Bags", "Large Bags", "XLarge Bags",
+    ]
+}
+
+
+# ==============================================================================
+# I. ESTADO PERSISTENTE
+# ==============================================================================
+def _rutas_estado(ruta_csv):
+    directorio = Path(ruta_csv).parent / DIR_ESTADO
+    return directorio / ARCHIVO_ESTADO, directorio / ARCHIVO_PIPELINE
+
+
+def cargar_estado(ruta_csv=None):
+    """Devuelve (estado, pipeline_transformacion) o (None, None) si no hay ejecución previa."""
+    ruta_estado, ruta_pipeline = _rutas_estado(obtener_ruta_csv(ruta_csv))
+    if not ruta_estado.exists() or not ruta_pipeline.exists():
+        return None, None
+    estado = json.loads(ruta_estado.read_text(encoding='utf-8'))
+    return estado, PipelineTransformacion.cargar(ruta_pipeline)
+
+
+def guardar_estado(estado, pipeline, ruta_csv=None):
+    ruta_estado, ruta_pipeline = _rutas_estado(obtener_ruta_csv(ruta_csv))
+    ruta_estado.parent.mkdir(parents=True, exist_ok=True)
+    pipeline.guardar(ruta_pipeline)
+    ruta_estado.write_text(json.dumps(estado, indent=2), encoding='utf-8')
+
+
+def _agregados_region_tipo(df):
+    """Sumas y conteos por región y tipo (se pueden acumular sumando)."""
+    agregados = df.groupby(
+        [np.asarray(df['region']), np.asarray(df['type'])]
+    ).agg(filas=('AveragePrice', 'size'),
+          suma_precio=('AveragePrice', 'sum'),
+          suma_volumen=('Total Volume', 'sum'))
+    agregados.index.names = ['region', 'type']
+    return agregados
+
+
+def _acumular_agregados(registros, nuevos):
+    previos = pd.DataFrame(registros).set_index(['region', 'type']) if registros else None
+    total = nuevos if previos is None else previos.add(nuevos, fill_value=0)
+    return total.reset_index().to_dict(orient='records')
+
+
+def agregados_estado(estado):
+    """Agregados acumulados por región y tipo, con el precio medio ya calculado."""
+    agregados = pd.DataFrame(estado['agregados']).set_index(['region', 'type'])
+    agregados['precio_medio'] = agregados['suma_precio'] / agregados['filas']
+    return agregados
+
+
+def correlacion_estado(estado, columnas=None):
+    """Matriz de correlación (Pearson) del histórico limpio a partir de los co-momentos guardados."""
+    return MotorCorrelaciones.desde_estado(estado['correlacion']).matriz(columnas)
+
+
+# ==============================================================================
+# II. EJECUCIÓN INCREMENTAL
+# ==============================================================================
+def _fin_filas_completas(ruta_csv):
+    """Posición justo después del último salto de línea del CSV (fin de la última fila completa)."""
+    with open(ruta_csv, 'rb') as f:
+        fin = f.seek(0, 2)
+        while fin > 0:
+            inicio = max(fin - 64 * 1024, 0)
+            f.seek(inicio)
+            salto = f.read(fin - inicio).rfind(b'\n')
+            if salto >= 0:
+                return inicio + salto + 1
+            fin = inicio
+    return 0
+
+
+def _posicion(ruta_csv, byte):
+    """Posición de lectura para el estado: el byte y el hash de los BYTES_COLA anteriores."""
+    with open(ruta_csv, 'rb') as f:
+        inicio = max(byte - BYTES_COLA, 0)
+        f.seek(inicio)
+        cola = hashlib.sha256(f.read(byte - inicio)).hexdigest()
+    return {'byte': byte, 'cola': cola}
+
+
+def _posicion_lectura(ruta_csv, estado):
+    """
+    Byte desde el que están las filas aún no leídas, o None si hay que releer el
+    CSV entero (estado sin posición, o CSV truncado o reescrito por delante de
+    ella; en ese caso la marca de agua sigue evitando duplicados).
+    """
+    posicion = estado.get('posicion')
+    if posicion is None:
+        return None
+    if Path(ruta_csv).stat().st_size < posicion['byte'] or _posicion(ruta_csv, posicion['byte']) != posicion:
+        print("⚠️  El CSV ha cambiado antes de la última posición leída: se relee entero")
+        return None
+    return posicion['byte']
+
+
+def _leer_filas_nuevas(ruta_csv, marca_agua, tamano_bloque, desde_byte=None, hasta_byte=None):
+    """
+    Lee el CSV por bloques conservando solo las filas posteriores a la marca de agua.
+
+    Con desde_byte solo se parsean los bytes añadidos desde la última ejecución.
+    """
+    for bloque in cargar_datos_por_bloques(ruta_csv, tamano_bloque, esquema=ESQUEMA_COMPLETO,
+                                           desde_byte=desde_byte, hasta_byte=hasta_byte):
+        if marca_agua is not None:
+            bloque = bloque[bloque['Date'] > marca_agua]
+        if not bloque.empty:
+            yield bloque
+
+
+def ejecutar_incremental(ruta_csv=None, ruta_limpio=RUTA_LIMPIO, reconstruir=False,
+                         tamano_bloque=100_000):
+    """
+    Procesa solo las semanas posteriores a la última ejecución.
+
+    La primera vez (o con reconstruir=True) limpia todo el histórico, fija los
+    límites IQR, ajusta el PipelineTransformacion y escribe el dataset limpio. En
+    las siguientes:
+    1. Lee solo los bytes añadidos al CSV desde la posición guardada (sin
+       parsear el histórico) y de ellos las filas con Date posterior a la
+       marca de agua. Si el CSV se reescribió, se relee entero y se filtra
+       por la marca de agua.
+    2. Las limpia con los límites IQR guardados.
+    3. Actualiza media/varianza (StandardScaler) y mín/máx (MinMaxScaler) con partial_fit.
+    4. Acumula los agregados por región y tipo y los co-momentos de la matriz de
+       correlación (correlacion_estado) sin releer el histórico.
+    5. Añade las filas al dataset limpio (un fichero nuevo por partición, o al
+       final del CSV).
+
+    Devuelve (df_nuevo_limpio, estado).
+    """
+    ruta_csv = obtener_ruta_csv(ruta_csv)
+    estado, pipeline = (None, None) if reconstruir else cargar_estado(ruta_csv)
+    completo = estado is None
+
+    marca_agua = None if completo else pd.Timestamp(estado['marca_agua'])
+    desde_byte = None if completo else _posicion_lectura(ruta_csv, estado)
+    hasta_byte = _fin_filas_completas(ruta_csv)
+    df_nuevo = concatenar_bloques(
+        _leer_filas_nuevas(ruta_csv, marca_agua, tamano_bloque, desde_byte, hasta_byte)
+    )
+
+    if df_nuevo.empty:
+        if estado is not None:
+            # Lo leído no tenía semanas nuevas: no se vuelve a parsear
+            estado['posicion'] = _posicion(ruta_csv, hasta_byte)
+            guardar_estado(estado, pipeline, ruta_csv)
+        desde = f"después de {marca_agua.date()}" if marca_agua is not None else f"en '{ruta_csv}'"
+        print(f"✓ Sin semanas nuevas {desde}")
+        return df_nuevo, estado
+
+    print(f"\n--- Procesamiento {'completo' if completo else 'incremental'}: {len(df_nuevo)} filas nuevas ---")
+    nueva_marca_agua = df_nuevo['Date'].max()
+
+    limites = None if completo else {col: tuple(v) for col, v in estado['limites'].items()}
+    limpieza = PipelineLimpieza(columnas_outliers=COLUMNAS_OUTLIERS, inplace=True,
+                                medir_memoria=False, limites=limites)
+    df_limpio = limpieza.ejecutar(df_nuevo)
+
+    if completo:
+        pipeline = PipelineTransformacion().fit(df_limpio)
+        guardar_dataset_limpio(df_limpio, ruta_limpio)
+        estado = {
+            'limites': {col: [float(v) for v in lim] for col, lim in limpieza.limites.items()},
+            'agregados': [],
+            'correlacion': MotorCorrelaciones(columnas_numericas(df_limpio)).estado(),
+            'filas_procesadas': 0,
+        }
+    else:
+        pipeline.scaler_std.partial_fit(df_limpio[PipelineTransformacion.COLUMNAS_STD])
+        pipeline.scaler_minmax.partial_fit(df_limpio[PipelineTransformacion.COLUMNAS_NORM])
+        guardar_dataset_limpio(df_limpio, ruta_limpio, modo='anexar')
+
+    estado['agregados'] = _acumular_agregados(estado['agregados'], _agregados_region_tipo(df_limpio))
+    if 'correlacion' in estado:
+        motor = MotorCorrelaciones.desde_estado(estado['correlacion'])
+        estado['correlacion'] = motor.actualizar(df_limpio).estado()
+    estado['filas_procesadas'] += len(df_limpio)
+    estado['marca_agua'] = nueva_marca_agua.isoformat()
+    estado['posicion'] = _posicion(ruta_csv, hasta_byte)
+    guardar_estado(estado, pipeline, ruta_csv)
+
+    print(f"✓ {len(df_limpio)} filas limpias añadidas a '{ruta_limpio}'")
+    print(f"✓ Marca de agua: {estado['marca_agua']}")
+    return df_limpio, estado
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+
+# Límites por defecto del modo de datos grandes
+PUNTOS_REJILLA_KDE = 1024
+PUNTOS_SERIE = 2000
+FILAS_POR_ESTRATO = 5000
+
+NIVEL_CONFIANZA = 0.95
+
+
+# ==============================================================================
+# I. HISTOGRAMAS Y KDE SOBRE DATOS AGRUPADOS EN BINS
+# ==============================================================================
+def histograma_binned(valores, bins=30):
+    """Devuelve (conteos, bordes) de un histograma calculado en una pasada con numpy."""
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    return np.histogram(valores, bins=bins)
+
+
+def ancho_banda_scott(valores):
+    """Ancho de banda de Scott (el que usa seaborn por defecto): std · n^(-1/5)."""
+    valores = np.asarray(valores, dtype=np.float64)
+    return np.std(valores, ddof=1) * len(valores) ** (-1 / 5)
+
+
+def kde_binned(valores, puntos=PUNTOS_REJILLA_KDE, ancho_banda=None):
+    """
+    Estimación de densidad gaussiana por binning al nodo más cercano y convolución FFT.
+
+    El coste es O(n + m log m) con m = puntos de la rejilla, en lugar de O(n · m).
+    Cada observación se desplaza como mucho medio bin, así que la diferencia
+    con la KDE exacta está acotada por (Δ/2) · max|K_h'| = Δ / (2 h² √(2πe)).
+
+    Devuelve (rejilla, densidad, error_maximo) con el error en unidades de densidad.
+    """
+    valores = np.asarray(valores, dtype=np.float64)
+    valores = valores[~np.isnan(valores)]
+    h = ancho_banda or ancho_banda_scott(valores)
+
+    minimo, maximo = valores.min() - 3 * h, valores.max() + 3 * h
+    rejilla = np.linspace(minimo, maximo, puntos)
+    delta = rejilla[1] - rejilla[0]
+
+    # Binning simple: cada observación suma 1 entero al nodo de la rejilla más cercano
+    conteos = np.bincount(np.rint((valores - minimo) / delta).astype(np.int64), minlength=puntos)[:puntos]
+
+    # Núcleo gaussiano muestreado sobre la rejilla y convolución circular con relleno
+    desplazamientos = np.arange(-puntos + 1, puntos) * delta
+    nucleo = np.exp(-0.5 * (desplazamientos / h) ** 2) / (h * np.sqrt(2 * np.pi))
+    tamano = 2 * puntos - 1 + puntos
+    convolucion = np.fft.irfft(np.fft.rfft(conteos, tamano) * np.fft.rfft(nucleo, tamano), tamano)
+    densidad = convolucion[puntos - 1:2 * puntos - 1] / len(valores)
+
+    error_maximo = delta / (2 * h ** 2 * np.sqrt(2 * np.pi * np.e))
+    return rejilla, densidad, error_maximo
+
+
+# ==============================================================================
+# II. SERIES TEMPORALES: LARGEST-TRIANGLE-THREE-BUCKETS
+# ==============================================================================
+def lttb(x, y, puntos=PUNTOS_SERIE):
+    """
+    Reduce una serie a 'puntos' puntos con el algoritmo LTTB (conserva picos y valles).
+
+    Devuelve (indices, error_maximo): las posiciones de los puntos conservados y
+    la mayor diferencia vertical entre la serie original y la interpolación
+    lineal de la reducida.
+    """
+    x_num = np.asarray(pd.to_numeric(pd.Series(x)), dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if puntos >= n or puntos < 3:
+        return np.arange(n), 0.0
+
+    indices = np.empty(puntos, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    bordes = np.linspace(1, n - 1, puntos - 1).astype(np.int64)
+
+    anterior = 0
+    for i in range(puntos - 2):
+        inicio, fin = bordes[i], bordes[i + 1]
+        siguiente_inicio, siguiente_fin = bordes[i + 1], (bordes[i + 2] if i + 2 < len(bordes) else n)
+        media_x = x_num[siguiente_inicio:siguiente_fin].mean()
+        media_y = y[siguiente_inicio:siguiente_fin].mean()
+
+        areas = np.abs(
+            (x_num[anterior] - media_x) * (y[inicio:fin] - y[anterior])
+            - (x_num[anterior] - x_num[inicio:fin]) * (media_y - y[anterior])
+        )
+        anterior = inicio + int(np.argmax(areas))
+        indices[i + 1] = anterior
+
+    error_maximo = float(np.max(np.abs(np.interp(x_num, x_num[indices], y[indices]) - y)))
+    return indices, error_maximo
+
+
+# ==============================================================================
+# III. MUESTREO ESTRATIFICADO
+# ==============================================================================
+def error_dkw(n, confianza=NIVEL_CONFIANZA):
+    """
+    Cota de Dvoretzky–Kiefer–Wolfowitz: con probabilidad 'confianza' la función de
+    distribución empírica de n muestras dista como mucho ε de la real.
+    """
+    return float(np.sqrt(np.log(2 / (1 - confianza)) / (2 * max(n, 1))))
+
+
+def muestra_estratificada(df, estratos, filas_por_estrato=FILAS_POR_ESTRATO, semilla=42):
+    """
+    Toma hasta 'filas_por_estrato' filas de cada combinación de 'estratos'.
+
+    Devuelve (muestra, error_maximo), con el error como cota DKW (95%) sobre
+    la distribución del estrato con menos filas muestreadas.
+    """
+    estratos = [estratos] if isinstance(estratos, str) else list(estratos)
+    grupos = df.groupby(estratos, observed=True, group_keys=False)
+    tamanos = grupos.size()
+    if tamanos.max() <= filas_por_estrato:
+        return df, 0.0
+
+    rng = np.random.default_rng(semilla)
+    # Orden aleatorio dentro de cada estrato y corte por posición: una sola pasada
+    aleatorio = pd.Series(rng.random(len(df)), index=df.index)
+    posicion = aleatorio.groupby([df[e] for e in estratos], observed=True).rank(method='first')
+    muestra = df[(posicion <= filas_por_estrato).to_numpy()]
+
+    n_min = int(np.minimum(tamanos, filas_por_estrato).min())
+    return muestra, error_dkw(n_min)
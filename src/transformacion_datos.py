@@ -1,107 +1,218 @@
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler, MinMaxScaler, LabelEncoder
-from sklearn.model_selection import train_test_split
 
-def transformar_preparar_datos(df):
+from src.estacionalidad import DescomposicionEstacional
+from src.ingenieria_variables import MotorVariables
+from src.division_datos import division_temporal, division_por_grupos, aplicar_division
+from src.instrumentacion import instrumentar
+
+# ==============================================================================
+# PIPELINE DE TRANSFORMACIÓN AJUSTABLE Y SERIALIZABLE
+# ==============================================================================
+class PipelineTransformacion:
+    """
+    Ajusta una vez escaladores, codificadores y regiones conocidas, y aplica la
+    misma transformación a cualquier lote nuevo en una sola llamada vectorizada.
+
+    Produce las mismas columnas que transformar_preparar_datos:
+    - *_std: StandardScaler sobre AveragePrice y Total Volume
+    - *_norm: MinMaxScaler sobre los códigos PLU
+    - type_encoded: LabelEncoder sobre 'type'
+    - region_*: One-Hot de 'region' (drop_first) con las regiones vistas en fit;
+      una región desconocida queda con todas sus columnas a False. Con
+      codificacion_region='categorica' no se crean columnas densas: 'region' se
+      conserva como categórica con las regiones de fit y preparar_para_ml la
+      convierte en códigos enteros o en una matriz dispersa CSR
+    - Variables de feature engineering (sin estado), calculadas con el registro
+      de ingenieria_variables; 'variables' limita cuáles se generan
+    - volume_trend / volume_seasonal: tendencia causal (media de las 52 semanas
+      anteriores) e índice estacional del volumen de la serie región × tipo,
+      ajustados en fit; transform solo los consulta, así que un lote nuevo
+      recibe la última tendencia de su serie y el índice de su semana del ciclo.
+      Con fit(df, idx_train) se ajustan solo con las filas de entrenamiento: las
+      semanas de test posteriores reciben la última tendencia y las regiones
+      que solo están en test quedan a NaN, sin información del test
+
+    Se guarda y recupera con guardar() / PipelineTransformacion.cargar().
+    """
+
+    COLUMNAS_STD = ['AveragePrice', 'Total Volume']
+    COLUMNAS_NORM = ['4046', '4225', '4770']
+
+    CODIFICACIONES_REGION = ('onehot', 'categorica')
+    VARIABLES_ESTACIONALES = ('volume_trend', 'volume_seasonal')
+
+    def __init__(self, codificacion_region='onehot', variables=None):
+        if codificacion_region not in self.CODIFICACIONES_REGION:
+            raise ValueError(f"codificacion_region debe ser una de {self.CODIFICACIONES_REGION}")
+        self.codificacion_region = codificacion_region
+        self.variables = variables
+        # sklearn se importa al crear el pipeline, no al importar el módulo
+        from sklearn.preprocessing import StandardScaler, MinMaxScaler, LabelEncoder
+        self.scaler_std = StandardScaler()
+        self.scaler_minmax = MinMaxScaler()
+        self.le_type = LabelEncoder()
+        self.regiones = None
+        self.estacionalidad = None
+
+    @property
+    def ajustado(self):
+        return self.regiones is not None
+
+    def fit(self, df, idx_train=None):
+        """
+        Ajusta el pipeline. idx_train (posiciones de fila de la división
+        train/test) limita a esas filas el ajuste de la estacionalidad, que de
+        otro modo usaría el volumen de las semanas y regiones de test.
+        """
+        self.scaler_std.fit(df[self.COLUMNAS_STD])
+        self.scaler_minmax.fit(df[self.COLUMNAS_NORM])
+        self.le_type.fit(df['type'])
+        self.regiones = list(pd.Categorical(df['region']).categories)
+        # Solo el volumen: descomponer el precio (el objetivo) filtraría información
+        if {'Date', 'type', 'Total Volume'} <= set(df.columns):
+            entrenamiento = df if idx_train is None else df.iloc[idx_train]
+            self.estacionalidad = DescomposicionEstacional(entrenamiento, ['Total Volume'],
+                                                           metodo_tendencia='causal')
+        return self
+
+    def transform(self, df):
+        if not self.ajustado:
+            raise ValueError("El pipeline no está ajustado: llama antes a fit()")
+
+        codificadas = {}
+
+        # 1. Estandarización y normalización
+        std = self.scaler_std.transform(df[self.COLUMNAS_STD])
+        for i, col in enumerate(self.COLUMNAS_STD):
+            codificadas[col + '_std'] = std[:, i]
+        norm = self.scaler_minmax.transform(df[self.COLUMNAS_NORM])
+        for i, col in enumerate(self.COLUMNAS_NORM):
+            codificadas[col + '_norm'] = norm[:, i]
+
+        # 2. Codificación de variables categóricas
+        codificadas['type_encoded'] = self.le_type.transform(df['type'])
+        if self.codificacion_region == 'categorica':
+            base = df.assign(region=pd.Categorical(df['region'], categories=self.regiones))
+            regiones = {}
+        else:
+            base = df.drop(columns=['region'])
+            regiones = self._one_hot_regiones(df['region'])
+
+        # 3. Feature engineering
+        registradas = self.variables
+        if registradas is not None:
+            registradas = [n for n in registradas if n not in self.VARIABLES_ESTACIONALES]
+        motor = MotorVariables(df, precalculadas={'type_encoded': codificadas['type_encoded']})
+        # Las variables que ya son columnas de df siguen en 'base' y no se duplican
+        derivadas = {n: v for n, v in motor.calcular(registradas).items() if n not in df.columns}
+        derivadas.update(self._variables_estacionales(df))
+
+        # Una sola concatenación en lugar de ir ensanchando el DataFrame columna a columna
+        return pd.concat([
+            base,
+            pd.DataFrame(codificadas, index=df.index),
+            pd.DataFrame(regiones, index=df.index),
+            pd.DataFrame(derivadas, index=df.index),
+        ], axis=1)
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def _variables_estacionales(self, df):
+        # Los pipelines guardados antes de existir estas variables no tienen 'estacionalidad'
+        estacionalidad = getattr(self, 'estacionalidad', None)
+        if estacionalidad is None or not {'Date', 'type'} <= set(df.columns):
+            return {}
+        tendencia, estacional = estacionalidad.prolongar_filas(df, 'Total Volume')
+        valores = dict(zip(self.VARIABLES_ESTACIONALES, (tendencia, estacional)))
+        return {n: v for n, v in valores.items() if self.variables is None or n in self.variables}
+
+    def _one_hot_regiones(self, region):
+        codigos = pd.Categorical(region, categories=self.regiones).codes
+        # drop_first: la primera región es la categoría de referencia
+        return {
+            f'region_{nombre}': codigos == i
+            for i, nombre in enumerate(self.regiones) if i > 0
+        }
+
+    def guardar(self, ruta):
+        """Guarda el pipeline ajustado en disco (joblib)."""
+        import joblib
+        ruta = Path(ruta)
+        ruta.parent.mkdir(parents=True, exist_ok=True)
+        joblib.dump(self, ruta)
+        return ruta
+
+    @classmethod
+    def cargar(cls, ruta):
+        import joblib
+        pipeline = joblib.load(ruta)
+        if not isinstance(pipeline, cls):
+            raise TypeError(f"{ruta} no contiene un {cls.__name__}")
+        return pipeline
+
+
+@instrumentar()
+def transformar_preparar_datos(df, pipeline=None, estrategia=None, grupos=None):
+    """
+    Estandariza, codifica y crea las variables derivadas para Machine Learning.
+
+    Parámetros:
+    - df: DataFrame limpio
+    - pipeline: PipelineTransformacion ya ajustado para reutilizarlo sin volver
+      a ajustar (p. ej. con datos semanales nuevos). Si es None se ajusta uno nuevo.
+    - estrategia, grupos: División que se usará después en preparar_para_ml;
+      si se indican, la estacionalidad del pipeline nuevo se ajusta solo con
+      las filas de entrenamiento de esa división
+
+    Devuelve (df_transformed, scaler_std, scaler_minmax, le_type).
+    """
     
     print("="*60)
     print("TRANSFORMACIÓN Y PREPARACIÓN DE DATOS")
     print("="*60)
     
-    df_transformed = df.copy()
-    
-    
+    if pipeline is None:
+        idx_train = None if estrategia is None else indices_division(df, estrategia, grupos)[0]
+        pipeline = PipelineTransformacion().fit(df, idx_train=idx_train)
+    df_transformed = pipeline.transform(df)
+    scaler_std, scaler_minmax, le_type = pipeline.scaler_std, pipeline.scaler_minmax, pipeline.le_type
     
     print("\n1. ESTANDARIZACIÓN Y NORMALIZACIÓN")
     print("-"*60)
-    
-    # Columnas numéricas para escalar
-    columnas_numericas = [
-        'AveragePrice', 'Total Volume', '4046', '4225', '4770',
-        'Total Bags', 'Small Bags', 'Large Bags', 'XLarge Bags'
-    ]
-    
-    # a) StandardScaler (media=0, desviación=1)
-    scaler_std = StandardScaler()
-    df_transformed[['AveragePrice_std', 'Total Volume_std']] = scaler_std.fit_transform(
-        df_transformed[['AveragePrice', 'Total Volume']]
-    )
     print("✓ Estandarización aplicada a AveragePrice y Total Volume")
     print(f"  - Media AveragePrice_std: {df_transformed['AveragePrice_std'].mean():.4f}")
     print(f"  - Std AveragePrice_std: {df_transformed['AveragePrice_std'].std():.4f}")
-    
-    # b) MinMaxScaler (rango 0-1) para otras variables
-    scaler_minmax = MinMaxScaler()
-    columnas_normalizar = ['4046', '4225', '4770']
-    df_transformed[[col + '_norm' for col in columnas_normalizar]] = scaler_minmax.fit_transform(
-        df_transformed[columnas_normalizar]
-    )
     print(f"\n✓ Normalización (0-1) aplicada a códigos PLU")
     print(f"  - Rango 4046_norm: [{df_transformed['4046_norm'].min():.2f}, {df_transformed['4046_norm'].max():.2f}]")
     
-    
-
-    
     print("\n\n2. CODIFICACIÓN DE VARIABLES CATEGÓRICAS")
     print("-"*60)
-    
-    # a) Label Encoding para 'type' (binaria: conventional/organic)
-    le_type = LabelEncoder()
-    df_transformed['type_encoded'] = le_type.fit_transform(df_transformed['type'])
     print("✓ Label Encoding aplicado a 'type':")
     print(f"  - conventional = {le_type.transform(['conventional'])[0]}")
     print(f"  - organic = {le_type.transform(['organic'])[0]}")
-    
-    # b) One-Hot Encoding para 'region' (múltiples categorías)
-    df_onehot = pd.get_dummies(df_transformed, columns=['region'], prefix='region', drop_first=True)
-    print(f"\n✓ One-Hot Encoding aplicado a 'region'")
-    print(f"  - Regiones originales: {df_transformed['region'].nunique()}")
-    print(f"  - Columnas creadas: {len([col for col in df_onehot.columns if col.startswith('region_')])}")
-    
-    # Actualizar dataframe
-    df_transformed = df_onehot
-    
-    
-    # 3. FEATURE ENGINEERING (Creación de nuevas variables)
+    if pipeline.codificacion_region == 'categorica':
+        print(f"\n✓ 'region' codificada como categórica ({len(pipeline.regiones)} categorías, sin columnas densas)")
+    else:
+        print(f"\n✓ One-Hot Encoding aplicado a 'region'")
+        print(f"  - Regiones originales: {df['region'].nunique()}")
+        print(f"  - Columnas creadas: {len([col for col in df_transformed.columns if col.startswith('region_')])}")
     
     print("\n\n3. FEATURE ENGINEERING - NUEVAS VARIABLES")
     print("-"*60)
-    
-    # Proporción de bolsas sobre volumen total
-    df_transformed['bags_ratio'] = df_transformed['Total Bags'] / (df_transformed['Total Volume'] + 1)
     print("✓ bags_ratio: Proporción de bolsas sobre volumen total")
-    
-    # Precio por unidad de volumen
-    df_transformed['price_per_volume'] = df_transformed['AveragePrice'] / (df_transformed['Total Volume'] + 1)
     print("✓ price_per_volume: Precio por unidad de volumen")
-    
-    # Dominancia de tamaño de bolsa
-    df_transformed['small_bag_dominance'] = df_transformed['Small Bags'] / (df_transformed['Total Bags'] + 1)
-    df_transformed['large_bag_dominance'] = df_transformed['Large Bags'] / (df_transformed['Total Bags'] + 1)
     print("✓ small/large_bag_dominance: Proporción de cada tipo de bolsa")
-    
-    # Variables temporales desde Date
-    if 'Date' in df_transformed.columns:
-        df_transformed['month'] = pd.to_datetime(df_transformed['Date']).dt.month
-        df_transformed['quarter'] = pd.to_datetime(df_transformed['Date']).dt.quarter
-        df_transformed['week_of_year'] = pd.to_datetime(df_transformed['Date']).dt.isocalendar().week
+    if 'month' in df_transformed.columns:
         print("✓ Variables temporales: month, quarter, week_of_year")
-    
-    # Volumen total de códigos PLU
-    df_transformed['total_plu_volume'] = df_transformed['4046'] + df_transformed['4225'] + df_transformed['4770']
     print("✓ total_plu_volume: Suma de todos los códigos PLU")
-    
-    # Categoría de precio
-    df_transformed['price_category'] = pd.cut(
-        df_transformed['AveragePrice'],
-        bins=[0, 1.0, 1.5, 2.0, float('inf')],
-        labels=['Bajo', 'Medio', 'Alto', 'Premium']
-    )
     print("✓ price_category: Categorización del precio en rangos")
-  
-    df_transformed['type_price_interaction'] = df_transformed['type_encoded'] * df_transformed['AveragePrice']
     print("✓ type_price_interaction: Interacción entre tipo y precio")
+    if 'volume_trend' in df_transformed.columns:
+        print("✓ volume_trend / volume_seasonal: Tendencia y estacionalidad del volumen de cada región y tipo")
     
     
     # RESUMEN FINAL
@@ -124,9 +235,70 @@ def transformar_preparar_datos(df):
     return df_transformed, scaler_std, scaler_minmax, le_type
 
 
-def preparar_para_ml(df_transformed, target_column='AveragePrice'):
+def matriz_regiones_sparse(region, drop_first=True):
+    """
+    One-Hot de una columna categórica como matriz CSR (una entrada no nula por fila).
+
+    Las filas con región desconocida (código -1) o de la categoría de referencia
+    (si drop_first) quedan vacías.
+    """
+    from scipy import sparse
+
+    codigos = np.asarray(region.cat.codes)
+    n_columnas = len(region.cat.categories) - int(drop_first)
+    columnas = codigos - int(drop_first)
+    filas = np.flatnonzero(columnas >= 0)
+    return sparse.csr_matrix(
+        (np.ones(len(filas), dtype=np.float64), (filas, columnas[filas])),
+        shape=(len(codigos), n_columnas)
+    )
+
+
+def indices_division(df, estrategia='aleatoria', grupos=None):
+    """
+    Posiciones (idx_train, idx_test) de la división train/test de preparar_para_ml.
+
+    Solo depende del número de filas, de 'Date' o de los grupos, así que da lo
+    mismo sobre el DataFrame limpio que sobre el transformado.
+    """
+    if estrategia == 'aleatoria':
+        from sklearn.model_selection import train_test_split
+        # Misma permutación que train_test_split(X, y, ...): solo depende del número de filas
+        return train_test_split(np.arange(len(df)), test_size=0.2, random_state=42)
+    if estrategia == 'temporal':
+        return division_temporal(df['Date'], proporcion_test=0.2)
+    if estrategia == 'grupos':
+        if grupos is None:
+            if 'region' not in df.columns:
+                raise ValueError("estrategia='grupos' necesita 'grupos' o la columna 'region'")
+            grupos = df['region']
+        return division_por_grupos(grupos, proporcion_test=0.2)
+    raise ValueError(f"Estrategia de división desconocida: {estrategia}")
+
+
+@instrumentar()
+def preparar_para_ml(df_transformed, target_column='AveragePrice', formato_region='codigos',
+                     estrategia='aleatoria', solo_indices=False, grupos=None):
     """
     Prepara el dataset para algoritmos de Machine Learning
+
+    Si 'region' llega como categórica (PipelineTransformacion con
+    codificacion_region='categorica'), formato_region decide cómo entra en X:
+    - 'codigos': una columna entera con el código de la región
+    - 'sparse': X es una matriz CSR [variables numéricas | One-Hot de región]
+
+    estrategia elige la división train/test (ver division_datos):
+    - 'aleatoria': train_test_split 80/20 (por defecto)
+    - 'temporal': el test son las últimas semanas de 'Date' (sin fuga de futuro)
+    - 'grupos': regiones completas en train o en test (grupos = Series de grupos;
+      por defecto la columna 'region' si sigue en el DataFrame)
+
+    Con solo_indices=True no se copian X ni y por partición: se devuelve
+    (X, y, idx_train, idx_test) con posiciones de fila.
+
+    volume_trend / volume_seasonal solo están libres de fuga si el pipeline se
+    ajustó con las filas de entrenamiento de la misma división
+    (transformar_preparar_datos(df, estrategia=...) o fit(df, idx_train)).
     """
     print("\n\n" + "="*60)
     print("PREPARACIÓN PARA MACHINE LEARNING")
@@ -134,28 +306,44 @@ def preparar_para_ml(df_transformed, target_column='AveragePrice'):
     
     # Eliminar columnas no necesarias
     columnas_drop = ['Date', 'type', 'price_category']  # Categóricas originales
-    df_ml = df_transformed.drop(columns=[col for col in columnas_drop if col in df_transformed.columns])
     
     # Separar features y target
-    if target_column in df_ml.columns:
-        X = df_ml.drop(columns=[target_column])
-        y = df_ml[target_column]
+    if target_column in df_transformed.columns:
+        # Se seleccionan las features de una vez en lugar de encadenar drops
+        columnas_features = [col for col in df_transformed.columns
+                             if col not in columnas_drop and col != target_column]
+        y = df_transformed[target_column]
+
+        region = df_transformed.get('region')
+        region_categorica = region is not None and isinstance(region.dtype, pd.CategoricalDtype)
+        if region_categorica and formato_region == 'sparse':
+            from scipy import sparse
+
+            columnas_features.remove('region')
+            numericas = df_transformed[columnas_features].to_numpy(dtype=np.float64, na_value=np.nan)
+            X = sparse.hstack(
+                [sparse.csr_matrix(numericas), matriz_regiones_sparse(region)], format='csr'
+            )
+            print(f"✓ Región como One-Hot dispersa: {X.nnz} valores no nulos")
+        else:
+            X = df_transformed[columnas_features]
+            if region_categorica:
+                X = X.assign(region=region.cat.codes)
+                print("✓ Región como códigos enteros")
         
         print(f"✓ Target: {target_column}")
         print(f"✓ Features: {X.shape[1]} variables")
         
        
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        idx_train, idx_test = indices_division(df_transformed, estrategia, grupos)
         
-        print(f"\n📦 División de datos:")
-        print(f"  - Train: {X_train.shape[0]} muestras")
-        print(f"  - Test: {X_test.shape[0]} muestras")
+        print(f"\n📦 División de datos ({estrategia}):")
+        print(f"  - Train: {len(idx_train)} muestras")
+        print(f"  - Test: {len(idx_test)} muestras")
         
-        return X_train, X_test, y_train, y_test
+        if solo_indices:
+            return X, y, idx_train, idx_test
+        return aplicar_division(X, y, idx_train, idx_test)
     else:
         print(f"⚠️ Columna target '{target_column}' no encontrada")
         return None
-
-
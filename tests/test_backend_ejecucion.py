@@ -0,0 +1,26 @@
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from src.backend_ejecucion import comparar_backends
+
+
+def _comprobar(resultado):
+    assert resultado['limites_iguales']
+    assert resultado['iguales'], resultado['diferencia']
+    assert resultado['filas_pandas'] == resultado['filas_arrow'] > 0
+
+
+def test_sin_filtros():
+    _comprobar(comparar_backends())
+
+
+def test_con_filtros_de_fecha_y_anio():
+    filtros = {'year': [2016, 2017], 'type': 'organic', 'Date': ('2016-06-01', None)}
+    _comprobar(comparar_backends(filtros=filtros))
+
+
+def test_varios_lotes():
+    resultado = comparar_backends(filas_lote=2000)
+    _comprobar(resultado)
+    assert resultado['lotes_arrow'] > 1